@@ -1,40 +1,480 @@
+import functools
+import hashlib
+import io
+import itertools
+import json
 import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+START = '2020-12-31 23:00:00'
+HOURS = 8760
+STEPS_PER_HOUR = 4
+METER_STEPS = HOURS * STEPS_PER_HOUR
+CHUNK_FILES = 256
+CHUNK_ROWS = 1024
+CHUNK_LINES = 672
+MANIFEST_VERSION = 1
+
 
-def read_join_datfiles(path_datfiles: str, output_path: str, name: str = 'production'):
+def read_join_datfiles(path_datfiles: str, output_path: str, name: str = 'production', workers: int = None,
+                       scenario_members: list = None, manifest_path: str = None):
     """
-    Creates a dataframe with columns from independent datfiles (highly customised).
+    Creates a dataframe with columns from independent datfiles (highly customised), one member per file in the
+    natural order of the names of the files (datscenario0.dat is member_1, datscenario1.dat member_2, etc.).
+    :param path_datfiles: path to the datfiles (time step and hourly production per line).
+    :param output_path: path to the folder where the csv files are saved.
+    :param name: name of the csv file (without extension).
+    :param workers: number of processes reading the datfiles (number of CPUs by default).
+    :param scenario_members: labels of the members (e.g. the columns of demand.csv) for which every datfile is also
+    saved as a generation scenario (generation_scenario_<i>.csv, with the production of the i-th datfile for all the
+    members), as expected by a stochastic configuration (no scenario files by default).
+    :param manifest_path: folder of the manifest of the datfiles already processed (see IncrementalProfiles), to only
+    process the changes since the previous run (everything is processed by default).
     """
+    tic = time.time()
     os.makedirs(output_path, exist_ok=True)
-    files = os.listdir(path_datfiles)
-    profiles = pd.DataFrame(index=pd.date_range(start='2020-12-31 23:00:00', periods=8760, freq='H'))
-    counter = 1
-    for file in files:
-        profiles['member_{}'.format(counter)] = pd.read_csv(os.path.join(path_datfiles, file), header=None, sep=' ')[2].values
-        counter += 1
+    files = sorted_files(path_datfiles)
+    index = pd.date_range(start=START, periods=HOURS, freq='H')
+    output_file = os.path.join(output_path, '{}.csv'.format(name))
+
+    if manifest_path is not None:
+        # The scenario files of the datfiles which changed are written before the manifest
+        write_derived = None
+        if scenario_members is not None:
+            write_derived = functools.partial(write_scenarios, members=scenario_members, output_path=output_path)
+        store = IncrementalProfiles(manifest_path, name, parse_datfile, HOURS, is_exact=True, labels=scenario_members)
+        store.update(files, output_file, workers, write_derived=write_derived)
+    else:
+        profiles = fill_array(read_datfiles(files, workers))
+        members = np.flatnonzero(np.any(profiles != 0, axis=0))
+        pd.DataFrame(profiles[:, members], index=index, columns=['member_{}'.format(j + 1) for j in members]).to_csv(
+            output_file
+        )
+        if scenario_members is not None:
+            write_scenarios(profiles, range(profiles.shape[1]), scenario_members, output_path)
+
+    tac = time.time()
+    print(f"{len(files)} datfiles processed in {(tac - tic):.2f} seconds ({len(files) / (tac - tic):.1f} files/s).")
+
 
-    filled_df = fill_nan(profiles)
-    dropped_df = filled_df.loc[:, (filled_df != 0).any(axis=0)]
-    dropped_df.to_csv(os.path.join(output_path, '{}.csv'.format(name)))
+def write_scenarios(profiles: np.ndarray, positions, members: list, output_path: str):
+    """
+    Saves the production of datfiles as generation scenarios (generation_scenario_<i>.csv, with the production of the
+    i-th datfile for all the members).
+    :param profiles: array (time x file) of the production.
+    :param positions: positions of the datfiles saved.
+    :param members: labels of the members.
+    :param output_path: path to the folder where the csv files are saved.
+    """
+    index = pd.date_range(start=START, periods=HOURS, freq='H')
+    for i in positions:
+        scenario = np.repeat(profiles[:, [i]], len(members), axis=1)
+        pd.DataFrame(scenario, index=index, columns=members).to_csv(
+            os.path.join(output_path, 'generation_scenario_{}.csv'.format(i + 1))
+        )
+
+
+def read_datfiles(paths: list, workers: int = None) -> np.ndarray:
+    """
+    Reads datfiles in a pool of processes.
+    :param paths: paths to the datfiles.
+    :param workers: number of processes (number of CPUs by default).
+    :return: array (time x file) of the production, in the order of the paths.
+    """
+    if not paths:
+        return np.empty((HOURS, 0))
+    workers = min(workers or os.cpu_count(), len(paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        profiles = list(executor.map(read_datfile, paths, chunksize=max(1, len(paths) // (4 * workers))))
+    return np.column_stack(profiles)
+
+
+def read_datfile(path: str) -> np.ndarray:
+    """
+    Reads the production of a datfile.
+    :param path: path to the datfile.
+    :return: hourly production.
+    """
+    with open(path, 'rb') as infile:
+        values = parse_datfile(infile.read())
+    if len(values) != HOURS:
+        raise ValueError('File "{}" has {} time steps instead of {}.'.format(path, len(values), HOURS))
+    return values
+
+
+def parse_datfile(data: bytes) -> np.ndarray:
+    """
+    Parses lines of a datfile, which have a fixed layout (time step and value separated by spaces).
+    :param data: lines of the datfile.
+    :return: values.
+    """
+    return np.loadtxt(io.BytesIO(data), usecols=1, dtype=float, ndmin=1)
 
 
-def join_data(path_csv: str, output_path: str, name: str = 'demand'):
+def sorted_files(path: str) -> list:
     """
-    Creates a dataframe with columns from independent csv files.
+    Paths to the files of a folder in the natural order of their names (e.g. file2 before file10), so that the
+    numbering of the members does not depend on the file system.
+    :param path: path to the folder.
+    :return: list of paths.
     """
+    def natural_key(file: str) -> list:
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', file)]
+
+    return [os.path.join(path, file) for file in sorted(os.listdir(path), key=natural_key)]
+
+
+def join_data(path_csv: str, output_path: str, name: str = 'demand', workers: int = None,
+              chunk_files: int = CHUNK_FILES, manifest_path: str = None):
+    """
+    Creates a dataframe with columns from independent csv files (15-minute meter data), averaged to hourly data.
+
+    The files are parsed, filled and averaged in a pool of processes, by chunks of files, and their hourly profiles are
+    gathered in a memory-mapped member matrix. The matrix is then written in chunks of rows, without the members whose
+    demand is always zero, so that the memory is bounded by the chunks for any number of meters. The members are
+    numbered in the natural order of the names of the files (demand_HS_1.csv is member_1, etc.).
+    :param path_csv: path to the meter files (one column of 15-minute values without header).
+    :param output_path: path to the folder where the csv file is saved.
+    :param name: name of the csv file (without extension).
+    :param workers: number of processes (number of CPUs by default).
+    :param chunk_files: number of files processed before their profiles are written to the member matrix.
+    :param manifest_path: folder of the manifest of the meter files already processed (see IncrementalProfiles), to
+    only process the changes since the previous run (everything is processed by default).
+    """
+    tic = time.time()
     os.makedirs(output_path, exist_ok=True)
-    files = os.listdir(path_csv)
-    profiles = pd.DataFrame(index=pd.date_range(start='2020-12-31 23:00:00', periods=35040, freq='15T'))
-    counter = 1
-    for file in files:
-        profiles['member_{}'.format(counter)] = pd.read_csv(os.path.join(path_csv, file), header=None).values
-        counter += 1
-
-    filled_df = fill_nan(profiles)
-    resampled_df = resample_data(filled_df, new_freq='H')
-    dropped_df = resampled_df.loc[:, (resampled_df != 0).any(axis=0)]
-    dropped_df.to_csv(os.path.join(output_path, '{}.csv'.format(name)))
+    files = sorted_files(path_csv)
+    index = pd.date_range(start=START, periods=HOURS, freq='H')
+    output_file = os.path.join(output_path, '{}.csv'.format(name))
+
+    if manifest_path is not None:
+        IncrementalProfiles(manifest_path, name, parse_meter, METER_STEPS, STEPS_PER_HOUR).update(
+            files, output_file, workers
+        )
+        tac = time.time()
+        print(f"{len(files)} meter files processed in {(tac - tic):.2f} seconds "
+              f"({len(files) / (tac - tic):.1f} files/s).")
+        return
+
+    with tempfile.TemporaryDirectory(dir=output_path) as directory, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        profiles = np.lib.format.open_memmap(os.path.join(directory, 'profiles.npy'), mode='w+', dtype=float,
+                                             shape=(len(index), len(files)), fortran_order=True)
+        is_kept = np.zeros(len(files), dtype=bool)
+        for start in range(0, len(files), chunk_files):
+            chunk = files[start:start + chunk_files]
+            for j, profile in enumerate(executor.map(process_meter, chunk), start=start):
+                profiles[:, j] = profile
+                is_kept[j] = np.any(profile != 0)
+
+        members = np.flatnonzero(is_kept)
+        columns = ['member_{}'.format(j + 1) for j in members]
+        for start in range(0, len(index), CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            pd.DataFrame(profiles[rows][:, members], index=index[rows], columns=columns).to_csv(
+                output_file, mode='w' if start == 0 else 'a', header=start == 0
+            )
+        del profiles
+
+    tac = time.time()
+    print(f"{len(files)} meter files processed in {(tac - tic):.2f} seconds ({len(files) / (tac - tic):.1f} files/s).")
+
+
+def process_meter(path: str) -> np.ndarray:
+    """
+    Reads a meter file and returns its hourly profile.
+    :param path: path to the meter file (one column of 15-minute values without header, possibly shorter than a year).
+    :return: hourly profile, filled (back fill and forward fill).
+    """
+    with open(path, 'rb') as infile:
+        values = parse_meter(infile.read())
+    if len(values) > METER_STEPS:
+        raise ValueError('File "{}" has {} time steps instead of {}.'.format(path, len(values), METER_STEPS))
+    values = np.concatenate([values, np.full(METER_STEPS - len(values), np.nan)])[:, None]
+    return resample_array(fill_array(values), STEPS_PER_HOUR)[:, 0]
+
+
+def parse_meter(data: bytes) -> np.ndarray:
+    """
+    Parses lines of a meter file (one value per line, a blank line being a missing reading).
+    :param data: lines of the meter file.
+    :return: values.
+    """
+    if not data.strip():
+        return np.full(len(data.splitlines()), np.nan)
+    return pd.read_csv(io.BytesIO(data), header=None, usecols=[0], dtype=float,
+                       skip_blank_lines=False).to_numpy()[:, 0]
+
+
+def fill_array(values: np.ndarray) -> np.ndarray:
+    """
+    Fills data naively (back fill and forward fill), like fill_nan, along the first axis of an array.
+    :param values: array (time x columns) with nan to fill.
+    :return: filled array.
+    """
+    steps = np.arange(len(values))[:, None]
+    is_valid = ~np.isnan(values)
+    # Position of the next valid value (back fill), then of the previous one (forward fill)
+    following = np.minimum.accumulate(np.where(is_valid, steps, len(values))[::-1], axis=0)[::-1]
+    filled = np.take_along_axis(np.vstack([values, np.full((1, values.shape[1]), np.nan)]), following, axis=0)
+    preceding = np.maximum.accumulate(np.where(~np.isnan(filled), steps, 0), axis=0)
+    return np.take_along_axis(filled, preceding, axis=0)
+
+
+def resample_array(values: np.ndarray, steps: int) -> np.ndarray:
+    """
+    Averages consecutive time steps of an array, like resample_data for a regular index aligned with the new
+    frequency (e.g. 15-minute data starting on the hour).
+    :param values: array (time x columns) whose length is a multiple of steps.
+    :param steps: number of time steps averaged (e.g. 4 from 15 minutes to 1 hour).
+    :return: averaged array.
+    """
+    return values.reshape(-1, steps, values.shape[1]).mean(axis=1)
+
+
+class IncrementalProfiles:
+    """
+    Incremental preprocessing of raw profiles (one file per member) into an input file (time x member).
+
+    The manifest of the raw files keeps their size, modification time and the hashes of their chunks of lines, and the
+    raw and processed (filled and averaged) profiles are kept in memory-mapped arrays next to it. An update only reads
+    the files whose size or modification time changed and only parses their chunks of lines whose hash changed (e.g.
+    the month appended to a meter file). The output file is then rewritten from the first chunk of rows which changed,
+    or entirely if the members changed (e.g. a new meter). The manifest is removed while the arrays and the outputs
+    are modified and written back once they match the raw files, so that an update which fails is followed by a full
+    one.
+    """
+
+    def __init__(self, path: str, name: str, parser, steps: int, steps_per_hour: int = 1,
+                 chunk_lines: int = CHUNK_LINES, is_exact: bool = False, labels: list = None):
+        """
+        Constructor.
+        :param path: folder of the manifest and of the arrays.
+        :param name: name of the output file (without extension).
+        :param parser: function parsing lines of a raw file into an array of values (e.g. parse_meter).
+        :param steps: number of time steps of the raw profiles (the raw files may be shorter).
+        :param steps_per_hour: number of time steps of the raw profiles averaged per hour.
+        :param chunk_lines: number of lines of the chunks of the raw files.
+        :param is_exact: flag to require raw files of exactly "steps" lines (e.g. datfiles).
+        :param labels: labels the outputs derived from the profiles depend on (e.g. the members of the scenario files),
+        recorded in the manifest: the derived outputs of all the files are written again when they change.
+        """
+        self.path = path
+        self.name = name
+        self.parser = parser
+        self.steps = steps
+        self.steps_per_hour = steps_per_hour
+        self.chunk_lines = chunk_lines
+        self.is_exact = is_exact
+        self.labels = None if labels is None else list(labels)
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest = self._read_manifest()
+        self.raw = None
+        self.profiles = None
+
+    def update(self, files: list, output_file: str, workers: int = None, write_derived=None) -> list:
+        """
+        Processes the changes of the raw files and patches the output file.
+        :param files: paths to the raw files, in the order of the members.
+        :param output_file: path to the output file.
+        :param workers: number of processes parsing the raw files (number of CPUs by default).
+        :param write_derived: function writing the outputs derived from the profiles, called with the processed
+        profiles (array time x file) and the positions of the members which changed before the manifest is written.
+        :return: positions of the members whose profile or position changed (all the members if the labels changed).
+        """
+        manifest_file = os.path.join(self.path, '{}.manifest.json'.format(self.name))
+        if os.path.isfile(manifest_file):
+            os.remove(manifest_file)
+        try:
+            moved = self._patch(files, output_file, workers)
+            if write_derived is not None:
+                write_derived(self.profiles, moved)
+        except Exception:
+            self.manifest = self._read_manifest()
+            raise
+        self._write_manifest()
+
+        return moved
+
+    def _patch(self, files: list, output_file: str, workers: int = None) -> list:
+        """
+        Updates the arrays, the entries of the manifest (in memory) and the output file from the raw files.
+        :return: positions of the members whose profile or position changed (all the members if the labels changed).
+        """
+        names = [os.path.basename(file) for file in files]
+        moved = [j for j, name in enumerate(names)
+                 if j >= len(self.manifest['files']) or self.manifest['files'][j]['name'] != name]
+        self._open_arrays(names)
+        previous = {entry['name']: entry for entry in self.manifest['files']}
+        entries = [previous.get(name, {'name': name, 'size': None, 'mtime_ns': None, 'chunks': [], 'is_kept': False})
+                   for name in names]
+
+        # Files whose size or modification time changed
+        scanned = []
+        for j, file in enumerate(files):
+            stat = os.stat(file)
+            if (entries[j]['size'], entries[j]['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+                scanned.append(j)
+        parsed_chunks = 0
+        if scanned:
+            tasks = [(files[j], entries[j]['chunks'], self.parser, self.chunk_lines) for j in scanned]
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(scanned))) as executor:
+                for j, (size, mtime_ns, hashes, runs, chunks, lines) in zip(scanned, executor.map(scan_file, tasks)):
+                    if lines > self.steps or (self.is_exact and lines != self.steps):
+                        raise ValueError('File "{}" has {} time steps instead of {}.'.format(
+                            files[j], lines, self.steps
+                        ))
+                    for k, values in runs.items():
+                        self.raw[k * self.chunk_lines:k * self.chunk_lines + len(values), j] = values
+                    self.raw[lines:, j] = np.nan
+                    entries[j].update(size=size, mtime_ns=mtime_ns, chunks=hashes)
+                    parsed_chunks += chunks
+
+        # Processed profiles of the files scanned and rows which changed
+        first_row = None
+        if scanned:
+            profiles = resample_array(fill_array(self.raw[:, scanned]), self.steps_per_hour)
+            previous_profiles = self.profiles[:, scanned]
+            is_changed = ~((profiles == previous_profiles) | (np.isnan(profiles) & np.isnan(previous_profiles)))
+            rows = np.flatnonzero(is_changed.any(axis=1))
+            first_row = rows[0] if len(rows) else None
+            moved = sorted(set(moved) | {j for i, j in enumerate(scanned) if is_changed[:, i].any()})
+            self.profiles[:, scanned] = profiles
+            for i, j in enumerate(scanned):
+                entries[j]['is_kept'] = bool(np.any(profiles[:, i] != 0))
+
+        if self.manifest.get('labels') != self.labels:
+            moved = list(range(len(names)))
+
+        columns = ['member_{}'.format(j + 1) for j, entry in enumerate(entries) if entry['is_kept']]
+        rewritten = self._write_output(output_file, columns, first_row)
+        self.raw.flush()
+        self.profiles.flush()
+        self.manifest['files'] = entries
+        self.manifest['labels'] = self.labels
+
+        print(f"{len(files)} files checked: {len(scanned)} read, {parsed_chunks} chunks parsed, "
+              f"{rewritten} rows written.")
+        return moved
+
+    def _open_arrays(self, names: list):
+        """
+        Opens the arrays of the raw and processed profiles, reordered (without parsing) if the files changed. The
+        manifest is reset if the arrays are missing.
+        """
+        paths = [os.path.join(self.path, '{}.{}.npy'.format(self.name, kind)) for kind in ['raw', 'profiles']]
+        if not all(os.path.isfile(path) for path in paths):
+            self.manifest['files'] = []
+        previous = [entry['name'] for entry in self.manifest['files']]
+        if previous == names and previous:
+            self.raw, self.profiles = [np.lib.format.open_memmap(path, mode='r+') for path in paths]
+            return
+
+        positions = {name: j for j, name in enumerate(previous)}
+        kept = [(j, positions[name]) for j, name in enumerate(names) if name in positions]
+        arrays = []
+        for path, rows in zip(paths, [self.steps, self.steps // self.steps_per_hour]):
+            array = np.lib.format.open_memmap('{}.tmp.npy'.format(path), mode='w+', dtype=float,
+                                              shape=(rows, len(names)), fortran_order=True)
+            array[:] = np.nan
+            if kept:
+                old = np.lib.format.open_memmap(path, mode='r')
+                for j, k in kept:
+                    array[:, j] = old[:, k]
+                del old
+            array.flush()
+            os.replace('{}.tmp.npy'.format(path), path)
+            arrays.append(array)
+        self.raw, self.profiles = arrays
+
+    def _write_output(self, output_file: str, columns: list, first_row) -> int:
+        """
+        Writes the output file from the chunk of rows of the first row which changed (entirely if the members changed
+        or if the output file was modified).
+        :return: number of rows written.
+        """
+        offsets = self.manifest['offsets']
+        is_patched = (self.manifest['columns'] == columns and len(offsets) > 0 and os.path.isfile(output_file) and
+                      os.path.getsize(output_file) == offsets[-1])
+        if is_patched and first_row is None:
+            return 0
+
+        index = pd.date_range(start=START, periods=len(self.profiles), freq='H')
+        members = [int(column.split('_')[1]) - 1 for column in columns]
+        start = first_row // CHUNK_ROWS if is_patched else 0
+        with open(output_file, 'r+b' if is_patched else 'wb') as outfile:
+            if is_patched:
+                outfile.seek(offsets[start])
+                outfile.truncate()
+                offsets = offsets[:start + 1]
+            else:
+                outfile.write(pd.DataFrame(index=index[:0], columns=columns).to_csv().encode())
+                offsets = [outfile.tell()]
+            for chunk in range(start * CHUNK_ROWS, len(index), CHUNK_ROWS):
+                rows = slice(chunk, chunk + CHUNK_ROWS)
+                data = pd.DataFrame(self.profiles[rows][:, members], index=index[rows], columns=columns)
+                outfile.write(data.to_csv(header=False).encode())
+                offsets.append(outfile.tell())
+
+        self.manifest['columns'] = columns
+        self.manifest['offsets'] = offsets
+        return len(index) - start * CHUNK_ROWS
+
+    def _read_manifest(self) -> dict:
+        """
+        Manifest of the previous run (empty if there is none or if its settings differ).
+        """
+        settings = {'version': MANIFEST_VERSION, 'steps': self.steps, 'steps_per_hour': self.steps_per_hour,
+                    'chunk_lines': self.chunk_lines, 'chunk_rows': CHUNK_ROWS}
+        try:
+            with open(os.path.join(self.path, '{}.manifest.json'.format(self.name))) as infile:
+                manifest = json.load(infile)
+            if all(manifest.get(key) == value for key, value in settings.items()):
+                return manifest
+        except (FileNotFoundError, ValueError):
+            pass
+        return dict(settings, files=[], columns=[], offsets=[])
+
+    def _write_manifest(self):
+        """
+        Writes the manifest (under a temporary name, then renamed).
+        """
+        path = os.path.join(self.path, '{}.manifest.json'.format(self.name))
+        with open('{}.tmp'.format(path), 'w') as outfile:
+            json.dump(self.manifest, outfile)
+        os.replace('{}.tmp'.format(path), path)
+
+
+def scan_file(task: tuple) -> tuple:
+    """
+    Hashes the chunks of lines of a raw file and parses the chunks whose hash changed (consecutive chunks at once).
+    :param task: path to the raw file, hashes of its chunks in the previous run, parser and number of lines of the
+    chunks.
+    :return: size and modification time of the file, hashes of its chunks, values of the runs of chunks parsed (by
+    position of their first chunk), number of chunks parsed and number of lines.
+    """
+    path, previous, parser, chunk_lines = task
+    stat = os.stat(path)
+    with open(path, 'rb') as infile:
+        lines = infile.read().splitlines(keepends=True)
+
+    hashes = [hashlib.sha256(b''.join(lines[start:start + chunk_lines])).hexdigest()
+              for start in range(0, len(lines), chunk_lines)]
+    changed = [k for k, digest in enumerate(hashes) if k >= len(previous) or previous[k] != digest]
+    runs = {}
+    for _, run in itertools.groupby(enumerate(changed), key=lambda position: position[1] - position[0]):
+        run = [k for _, k in run]
+        start, end = run[0] * chunk_lines, (run[-1] + 1) * chunk_lines
+        runs[run[0]] = parser(b''.join(lines[start:end]))
+        if len(runs[run[0]]) != len(lines[start:end]):
+            raise ValueError('Lines {} to {} of file "{}" are not valid.'.format(start + 1, end, path))
+    return stat.st_size, stat.st_mtime_ns, hashes, runs, len(changed), len(lines)
 
 
 def concatenate_data(iterable_path: list([str]), sheet_to_read: str, columns_to_read: list([str]),
@@ -138,11 +578,11 @@ if __name__ == "__main__":
 
     path_files = './hauts_sarts/demand_raw'
     output_path = './hauts_sarts/input'
-    join_data(path_files, output_path)
+    join_data(path_files, output_path, manifest_path='./hauts_sarts/preprocessing')
 
     path_files = './hauts_sarts/datfiles'
     output_path = './hauts_sarts/input'
-    read_join_datfiles(path_files, output_path)
+    read_join_datfiles(path_files, output_path, manifest_path='./hauts_sarts/preprocessing')
 
     # output_path = './example_merygrid/input'
     # path_constant = './data_merygrid/2021-'
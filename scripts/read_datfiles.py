@@ -1,8 +1,9 @@
 import pandas as pd
 
+from data_processing import HOURS, START, read_datfiles
+
 if __name__ == "__main__":
 
     paths = ['hauts_sarts/datfiles/datscenario{}.dat'.format(i) for i in range(25)]
-    production_profiles = pd.DataFrame()
-    for file in paths:
-        p_profile = pd.read_csv(file, header=None, sep=' ', squeeze=True)[2]
+    production_profiles = pd.DataFrame(read_datfiles(paths), index=pd.date_range(start=START, periods=HOURS, freq='H'),
+                                       columns=['scenario_{}'.format(i) for i in range(len(paths))])
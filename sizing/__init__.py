@@ -1,3 +1,3 @@
 from .core import OptimisationInputs
-from .models import Central, CentralDuals, Rural
+from .models import ADMM, Benders, Central, CentralDuals, CentralSparse, ProgressiveHedging, RollingHorizon, Rural
 from .utils import read_data, read_inputs, unstack_data
@@ -1,14 +1,135 @@
 import argparse
+import atexit
 import os
+import sys
 import time
+import warnings
 
-from . import OptimisationInputs, Central, CentralDuals, Rural
+import pandas as pd
+
+from . import OptimisationInputs, CentralSparse
+from .core import RESULT_FORMATS, RESULT_STORE_FILE, TRACE_FILE, ResultStore, Trace, store_results, trace
+from .core.trace import MEMORY_PROFILE_FILE
+from .core.model_cache import DEFAULT_CACHE_SIZE, ModelCache, inputs_digest
+from .models import LPWriter, MODELS, SparseProblem
+from .models.generic import DIRECT_SOLVER, FALLBACK_SOLVER, dual_families, model_size, result_variables, \
+    solve_portfolio, solve_sparse
+from .models.portfolio import PORTFOLIO, PORTFOLIO_HISTORY_FILE, PORTFOLIO_SOLVER
+from .models.results import LazyResults
+from .utils import read_inputs
+
+
+# Number of stages printed in the memory profile
+MEMORY_PROFILE_ROWS = 20
+# Models which accept the options of the solver portfolio
+PORTFOLIO_MODELS = ['central', 'central_dual', 'central_sparse', 'rural']
 
 
 class InvalidModelError(Exception):
     pass
 
 
+def selected_duals(args: argparse.Namespace) -> list:
+    """
+    Constraint families whose duals are extracted: those of the command line, else those of the configuration file,
+    else none.
+    :param args: arguments of the command line.
+    :return: names of the families (None for all the families).
+    """
+    duals = args.duals if args.duals is not None else read_inputs(args.input_parameters).get('duals')
+    if duals is None:
+        return []
+    duals = [duals] if isinstance(duals, str) else list(duals)
+
+    return None if 'all' in duals else duals
+
+
+def selected_outputs(args: argparse.Namespace) -> list:
+    """
+    Result variables which are persisted: those of the command line, else those of the configuration file, else all.
+    :param args: arguments of the command line.
+    :return: names of the variables (None for all the variables).
+    """
+    outputs = args.outputs if args.outputs is not None else read_inputs(args.input_parameters).get('outputs')
+    if outputs is None:
+        return None
+    outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+
+    return None if 'all' in outputs else result_variables(outputs)
+
+
+def selected_format(args: argparse.Namespace) -> tuple:
+    """
+    Format of the results and type of their values: those of the command line, else those of the configuration file,
+    else csv files of float64 values.
+    :param args: arguments of the command line.
+    :return: tuple (format, type of the values).
+    """
+    parameters = read_inputs(args.input_parameters)
+    file_format = args.results_format or parameters.get('results_format', 'csv')
+    dtype = 'float32' if args.is_float32 else parameters.get('results_dtype', 'float64')
+
+    return file_format, dtype
+
+
+def save_metadata(args: argparse.Namespace, timings: dict):
+    """
+    Saves the metadata of the run (hash of the inputs, model, solver and timings) in the result store, if the results
+    are stored in HDF5.
+    :param args: arguments of the command line.
+    :param timings: duration of every stage of the run in seconds.
+    """
+    file_format, dtype = selected_format(args)
+    if file_format != 'hdf5':
+        return
+    with ResultStore(os.path.join(args.output, RESULT_STORE_FILE), mode='a') as store:
+        store.set_metadata(
+            inputs_hash=inputs_digest(args.input_parameters, args.input_files).hexdigest(), model=args.model,
+            solver=args.solver, dtype=dtype, **{'{}_seconds'.format(stage): value for stage, value in timings.items()}
+        )
+
+
+def solve_cached(problem: SparseProblem, args: argparse.Namespace) -> str:
+    """
+    Solves a model loaded from the cache (matrix form) with the solver of the command line, as GenericModel.solve_model
+    does: "highs-direct" and "portfolio" fall back to FALLBACK_SOLVER if they are not installed.
+    :param problem: sparse problem.
+    :param args: arguments of the command line.
+    :return: name of the configuration which won the race of the solver portfolio (None for the other solvers).
+    """
+    solver_name = args.solver
+    if solver_name in (DIRECT_SOLVER, PORTFOLIO_SOLVER):
+        try:
+            if solver_name == DIRECT_SOLVER:
+                solve_sparse(problem, DIRECT_SOLVER)
+                return None
+            if problem.matrix is None:
+                problem.assemble()
+            history_path = args.portfolio_history or os.path.join(args.output, PORTFOLIO_HISTORY_FILE)
+            return solve_portfolio(problem, None, MODELS[args.model].__name__, history_path, args.portfolio_racers)
+        except (ImportError, NotImplementedError) as error:
+            warnings.warn('{} The model is solved with {} instead.'.format(error, FALLBACK_SOLVER))
+            solver_name = FALLBACK_SOLVER
+    solve_sparse(problem, solver_name)
+
+    return None
+
+
+def write_trace(run_trace: Trace, output_path: str):
+    """
+    Writes the performance trace of the run in the output path and prints the stages which allocated the most memory
+    (e.g. the variable and constraint families), if the memory is accounted.
+    :param run_trace: trace of the run.
+    :param output_path: output path for the results.
+    """
+    run_trace.write(os.path.join(output_path, TRACE_FILE))
+    if run_trace.memory:
+        profile = run_trace.memory_profile()
+        print(f"Memory allocated (MB) by the {min(len(profile), MEMORY_PROFILE_ROWS)} largest of {len(profile)} stages "
+              f"(all in {MEMORY_PROFILE_FILE}):")
+        print(profile.head(MEMORY_PROFILE_ROWS).to_string(float_format='{:.1f}'.format))
+
+
 if __name__ == "__main__":
 
     # Argument parsing
@@ -17,47 +138,265 @@ if __name__ == "__main__":
     parser.add_argument("-if", "--input_files", dest="input_files", help="Path to the input files (csv files)")
     parser.add_argument("-m", "--model", dest="model", help="Type of model to be run", default="central")
     parser.add_argument("-o", "--output_path", dest="output", help="Output path for the results.")
-    parser.add_argument("-s", "--solver", dest="solver", help="Solver name (cbc, cplex ...)", default="cbc")
+    parser.add_argument("-s", "--solver", dest="solver", default="cbc",
+                        help="Solver name (cbc, cplex ..., highs-direct to solve the model in-process with HiGHS "
+                             "without writing any file, or portfolio to race several solvers on disjoint cores and "
+                             "keep the first optimal solution). The matrix form of central_sparse is solved with HiGHS "
+                             "through SciPy for highs, the other solvers get it (and the models loaded from the cache) "
+                             "as a Pyomo model")
+    parser.add_argument("--portfolio-history", dest="portfolio_history",
+                        help="JSON file of the races of the solver portfolio, shared between runs to rank and prune "
+                             "its configurations ({} in the output path by default)".format(PORTFOLIO_HISTORY_FILE))
+    parser.add_argument("--portfolio-racers", dest="portfolio_racers", type=int,
+                        help="Number of configurations of the solver portfolio ({}) raced at once (as many as cores, "
+                             "at least two, by default)".format(', '.join(PORTFOLIO)))
     parser.add_argument("-v", "--verbose", dest="is_verbose", action="store_true", help="Verbose mode")
     parser.add_argument("--debug", dest="is_debug", action="store_true", help="Debug mode")
+    parser.add_argument("--duals", dest="duals", nargs="*",
+                        help="Constraint families whose duals are extracted, e.g. energy_balance_eqn "
+                             "local_exchanges_eqn, or all (the list \"duals\" of the configuration file, else none, "
+                             "by default)")
+    parser.add_argument("--outputs", dest="outputs", nargs="*",
+                        help="Result variables saved, e.g. optimal_capacity total_costs, or all (the list \"outputs\" "
+                             "of the configuration file, else all, by default)")
+    parser.add_argument("--results-format", dest="results_format", choices=RESULT_FORMATS,
+                        help="Format of the results: one csv file per result or a single HDF5 store (results.h5) "
+                             "(\"results_format\" of the configuration file, else csv, by default)")
+    parser.add_argument("--float32", dest="is_float32", action="store_true",
+                        help="Saves the values of the results as float32")
+    parser.add_argument("--no-trace", dest="is_no_trace", action="store_true",
+                        help="Does not write the performance trace of the run ({}: wall time, CPU time and peak memory "
+                             "of every stage and size of the model) in the output path".format(TRACE_FILE))
+    parser.add_argument("--memory-profile", dest="is_memory_profile", action="store_true",
+                        help="Accounts the memory allocated by every stage of the trace (every variable and constraint "
+                             "family, the duals, the results), prints the largest and saves them in {} (slows the "
+                             "run down)".format(MEMORY_PROFILE_FILE))
+    parser.add_argument("--write-lp", dest="write_lp",
+                        help="Streams the central model to this LP file (block by block) and exits without solving")
+    parser.add_argument("--lp-block-size", dest="lp_block_size", type=int, default=50,
+                        help="Number of members per block when streaming the LP file")
+    parser.add_argument("--gzip", dest="is_gzip", action="store_true", help="Compresses the streamed LP file")
+    parser.add_argument("--input-cache", dest="input_cache",
+                        help="Folder of the binary sidecars of the input files (built on first use, then memory-mapped "
+                             "instead of parsing the csv files)")
+    parser.add_argument("--cache", dest="cache_path",
+                        help="Folder of the cache of built models (matrix form, solved with HiGHS)")
+    parser.add_argument("--cache-size", dest="cache_size", type=float, default=DEFAULT_CACHE_SIZE,
+                        help="Maximum size of the cache in MB (least recently used models are evicted)")
+    parser.add_argument("--no-cache", dest="is_no_cache", action="store_true",
+                        help="Bypasses the cache (the model is built from the inputs and not stored)")
+    parser.add_argument("--clear-cache", dest="is_clear_cache", action="store_true",
+                        help="Removes all the models of the cache before running")
+    parser.add_argument("--periods", dest="periods", type=int,
+                        help="Aggregates the time series into this number of representative periods")
+    parser.add_argument("--period-length", dest="period_length", type=int,
+                        help="Number of time steps per representative period (one day by default)")
+    parser.add_argument("--no-extreme-periods", dest="is_no_extreme_periods", action="store_true",
+                        help="Does not keep the extreme periods as representative periods of their own")
+    parser.add_argument("--compare-full", dest="is_compare_full", action="store_true",
+                        help="Also solves the full model to report the speedup and the error of the aggregation")
+    parser.add_argument("--window", dest="window", type=int,
+                        help="Number of time steps kept from every window of the rolling horizon (one week by default)")
+    parser.add_argument("--look-ahead", dest="look_ahead", type=int,
+                        help="Number of time steps of look-ahead of every window of the rolling horizon (one day by "
+                             "default)")
+    parser.add_argument("--workers", dest="workers", type=int,
+                        help="Number of windows of the rolling horizon (independent windows), of Benders subproblems, "
+                             "of groups of members (ADMM) or of groups of scenarios (progressive hedging) solved in "
+                             "parallel (1 by default, one per scenario for progressive hedging)")
+    parser.add_argument("--block-length", dest="block_length", type=int,
+                        help="Number of time steps of every block of the Benders decomposition (one week by default)")
+    parser.add_argument("--tolerance", dest="tolerance", type=float, default=1e-3,
+                        help="Relative gap between the bounds (Benders), primal and dual residuals (ADMM) or relative "
+                             "deviation of the capacities of the scenarios (progressive hedging) at which the "
+                             "iterations stop")
+    parser.add_argument("--max-iterations", dest="max_iterations", type=int,
+                        help="Maximum number of iterations (50 for Benders, 500 for ADMM and 100 for progressive "
+                             "hedging by default)")
+    parser.add_argument("--warm-start", dest="warm_start",
+                        help="CSV file with the capacities (member x technology) evaluated at the first Benders "
+                             "iteration, e.g. optimal_capacity.csv of a previous run")
+    parser.add_argument("--rho", dest="rho", type=float,
+                        help="Initial penalty parameter of ADMM (the discounted average community import price by "
+                             "default) or multiple of the costs of the capacities used as penalty parameters of "
+                             "progressive hedging (1 by default)")
 
     args = parser.parse_args()
 
     # Prepare output path
     os.makedirs(args.output, exist_ok=True)
 
+    if args.model not in MODELS:
+        raise InvalidModelError("""The model selected ("{}") does not exist in the list of models. Please, select: "central",
+        "admm", "benders", "central_dual", "central_sparse", "progressive_hedging", "rolling" or "rural".""".format(args.model))
+
+    # Performance trace, written whatever the exit path
+    if not args.is_no_trace or args.is_memory_profile:
+        run_trace = Trace(memory=args.is_memory_profile, model=args.model, solver=args.solver,
+                          input_parameters=args.input_parameters, input_files=args.input_files, argv=sys.argv[1:])
+        run_trace.activate()
+        atexit.register(write_trace, run_trace, args.output)
+
+    # Cache of built models
+    cache, key = None, None
+    if args.cache_path:
+        cache = ModelCache(args.cache_path, max_size=args.cache_size)
+        if args.is_clear_cache:
+            cache.clear()
+        # The rolling horizon and the decompositions build one model per window, block, member or scenario, which
+        # are not cached
+        if args.is_no_cache or args.write_lp or args.model in ('rolling', 'benders', 'admm', 'progressive_hedging'):
+            cache = None
+
+    if cache is not None:
+        options = None
+        if args.periods:
+            options = {'periods': args.periods, 'period_length': args.period_length,
+                       'extreme_periods': not args.is_no_extreme_periods}
+        key = ModelCache.key(args.input_parameters, args.input_files, MODELS[args.model], options=options)
+        model = cache.load(key)
+        if model is not None:
+            if args.is_verbose:
+                print(f"Model {key} loaded from the cache.")
+            if trace.is_active():
+                trace.set_model_size(**model_size(model))
+            tic = time.time()
+            with trace.stage('solve'):
+                winner = solve_cached(model, args)
+                results = LazyResults(model, result_variables(selected_outputs(args)))
+                duals = {'dual{}'.format(name): model.get_duals(name)
+                         for name in dual_families(model.constraints, selected_duals(args))}
+                with trace.stage('save_results'):
+                    store_results(results, args.output, *selected_format(args))
+                    store_results(duals, args.output, *selected_format(args))
+            tac = time.time()
+            if args.is_verbose:
+                print(f"Problem solved in {(tac - tic):.2f} seconds.")
+                if winner is not None:
+                    print(f"Configuration {winner} won the race of the solver portfolio.")
+            save_metadata(args, {'solve': tac - tic})
+            sys.exit(0)
+
     tic = time.time()
     # Read inputs
-    inputs = OptimisationInputs(
-        input_parameters=args.input_parameters,
-        input_files=args.input_files,
-        output_path=args.output
-    )
+    with trace.stage('read_inputs'):
+        inputs = OptimisationInputs(
+            input_parameters=args.input_parameters,
+            input_files=args.input_files,
+            output_path=args.output,
+            input_cache=args.input_cache
+        )
+    inputs.duals = selected_duals(args)
+    inputs.outputs = selected_outputs(args)
+    inputs.results_format, inputs.results_dtype = selected_format(args)
 
     tac = time.time()
+    timings = {'read': tac - tic, 'load': inputs.load_seconds}
     if args.is_verbose:
-        print(f"Input files read in {(tac - tic):.2f} seconds.")
-
-    if args.model == 'central':
-        problem = Central(solver=args.solver, inputs=inputs, is_debug=args.is_debug)
-    if args.model == 'central_dual':
-        problem = CentralDuals(solver=args.solver, inputs=inputs, is_debug=args.is_debug)
-    elif args.model == 'rural':
-        problem = Rural(solver=args.solver, inputs=inputs, is_debug=args.is_debug)
-    else:
-        raise InvalidModelError("""The model selected ("{}") does not exist in the list of models. Please, select: "central",
-        "bilevel", or "rural".""".format(args.model))
+        sources = ''
+        if inputs.input_cache is not None:
+            sources = f", {len(inputs.input_cache.hits)} memory-mapped from the binary cache, " \
+                      f"{len(inputs.input_cache.misses)} parsed and cached"
+        print(f"Input files read in {(tac - tic):.2f} seconds (files loaded in {inputs.load_seconds:.2f} "
+              f"seconds{sources}).")
+
+    full_inputs = inputs
+    if args.periods:
+        tic = time.time()
+        with trace.stage('aggregate'):
+            inputs = full_inputs.aggregate(
+                periods=args.periods, period_length=args.period_length, extreme_periods=not args.is_no_extreme_periods
+            )
+        tac = time.time()
+        print(f"Time series aggregated into {args.periods} periods ({len(inputs.time)} of {len(full_inputs.time)} "
+              f"time steps) in {(tac - tic):.2f} seconds.")
+        for file, error in inputs.aggregation_error.items():
+            print(f"    Relative error of {file}: {100 * error:.2f} %")
+
+    if args.write_lp:
+        tic = time.time()
+        writer = LPWriter(CentralSparse(inputs=inputs), block_size=args.lp_block_size, compress=args.is_gzip)
+        with trace.stage('write_lp'):
+            statistics = writer.write(args.write_lp)
+        tac = time.time()
+        print(f"LP file {statistics['path']} written in {(tac - tic):.2f} seconds ({statistics['rows']} rows, "
+              f"{statistics['nonzeros']} nonzeros, peak memory {statistics['peak_memory']:.1f} MB).")
+        sys.exit(0)
+
+    options = dict()
+    if args.model == 'rolling':
+        options = {'window': args.window, 'look_ahead': args.look_ahead, 'workers': args.workers or 1}
+    elif args.model == 'benders':
+        options = {
+            'block_length': args.block_length, 'workers': args.workers or 1, 'tolerance': args.tolerance,
+            'warm_start': pd.read_csv(args.warm_start, index_col=0) if args.warm_start else None
+        }
+    elif args.model == 'admm':
+        options = {'workers': args.workers or 1, 'tolerance': args.tolerance, 'rho': args.rho}
+    elif args.model == 'progressive_hedging':
+        options = {'workers': args.workers, 'tolerance': args.tolerance}
+        if args.rho:
+            options['rho'] = args.rho
+    if args.model in ('benders', 'admm', 'progressive_hedging') and args.max_iterations:
+        options['max_iterations'] = args.max_iterations
+    # Models solved as a whole by solve_model, which can race the solver portfolio
+    portfolio_options = dict()
+    if args.model in PORTFOLIO_MODELS:
+        portfolio_options = {'portfolio_history': args.portfolio_history, 'portfolio_racers': args.portfolio_racers}
+    problem = MODELS[args.model](solver=args.solver, inputs=inputs, is_debug=args.is_debug, **options,
+                                 **portfolio_options)
 
     # Create problem
     tic = time.time()
-    model = problem.create_model()
+    with trace.stage('create_model'):
+        model = problem.create_model()
     tac = time.time()
+    timings['create'] = tac - tic
     if args.is_verbose:
         print(f"Model created in {(tac - tic):.2f} seconds.")
+    if trace.is_active():
+        # The nonzeros of the Pyomo models are only counted with the memory profile, as they take long to count
+        with trace.stage('model_size'):
+            trace.set_model_size(**model_size(model, nonzeros=trace.is_accounting_memory()))
+
+    if cache is not None:
+        # Pyomo models are compiled into their matrix form, which is what the cache stores, and solved as they are
+        # with the selected solver
+        with trace.stage('cache_store'):
+            cache.store(key, model if isinstance(model, SparseProblem) else SparseProblem.from_pyomo(model))
+        if args.is_verbose:
+            print(f"Model {key} stored in the cache.")
 
     # Solve problem
+    toc = tic
     tic = time.time()
-    results, duals = problem.solve_model(model=model)
+    with trace.stage('solve'):
+        results, duals = problem.solve_model(model=model)
     tac = time.time()
+    timings['solve'] = tac - tic
+    save_metadata(args, timings)
     if args.is_verbose:
         print(f"Problem solved in {(tac - tic):.2f} seconds.")
+        if problem.portfolio_winner is not None:
+            print(f"Configuration {problem.portfolio_winner} won the race of the solver portfolio.")
+
+    # The results saved (and the total costs, for the comparison below) are captured and the model is freed
+    if isinstance(results, LazyResults):
+        results.release(list(results) + ['total_costs'])
+    del model
+
+    if args.periods and args.is_compare_full:
+        # Full model, to choose the number of periods
+        aggregated_time = tac - toc
+        full_inputs.output_path = os.path.join(args.output, 'full')
+        os.makedirs(full_inputs.output_path, exist_ok=True)
+        tic = time.time()
+        full_problem = MODELS[args.model](solver=args.solver, inputs=full_inputs, is_debug=args.is_debug,
+                                          **portfolio_options)
+        full_results, _ = full_problem.solve_model(model=full_problem.create_model())
+        tac = time.time()
+        objective = results['total_costs'].sum() * problem.discount_factor
+        full_objective = full_results['total_costs'].sum() * full_problem.discount_factor
+        print(f"Speedup of the aggregation: {(tac - tic) / aggregated_time:.1f}x ({aggregated_time:.2f} vs "
+              f"{(tac - tic):.2f} seconds), error of the objective: "
+              f"{100 * (objective - full_objective) / full_objective:.2f} %.")
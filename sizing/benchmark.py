@@ -0,0 +1,306 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from sizing.core import OptimisationInputs, OPTIONAL_MEMBER_TABLES, OPTIONAL_TIME_SERIES, Trace, trace
+from sizing.models import MODELS
+from sizing.models.generic import model_size
+
+BENCHMARK_FILE = 'benchmark.json'
+BENCHMARK_MODELS = ['central', 'central_dual']
+MEMBERS = [10, 50, 200, 1000, 2000]
+# Time steps per hour of every resolution and hours of every horizon
+RESOLUTIONS = {'hourly': 1, '15min': 4}
+HORIZONS = {'week': 168, 'month': 720, 'year': 8760}
+# Relative increase of every metric over the baseline above which a case has regressed
+THRESHOLDS = {'load_seconds': 0.25, 'build_seconds': 0.25, 'solve_seconds': 0.25, 'post_process_seconds': 0.25,
+              'peak_memory_mb': 0.10}
+# Increases of the durations below this number of seconds are noise
+MIN_SECONDS = 0.1
+ENERGY_FILES = ['demand', 'generation']
+
+
+def case_name(model: str, members: int, resolution: str, horizon: str) -> str:
+    """
+    Name of a case of the benchmark, e.g. "central-200-hourly-month".
+    """
+    return '{}-{}-{}-{}'.format(model, members, resolution, horizon)
+
+
+def generate_community(input_parameters: str, input_files: str, output_path: str, members: int, resolution: str,
+                       horizon: str, seed: int = 0):
+    """
+    Writes the input files of a synthetic community. The members are bootstrapped from the members of the base inputs
+    (drawn with replacement, their demand and generation scaled by independent random factors between 0.8 and 1.2),
+    over the first hours of the base time series. At a finer resolution, the energy of every hour is split evenly over
+    its time steps and the prices are repeated.
+    :param input_parameters: path to the YML file of the base inputs, copied as the parameters of the community.
+    :param input_files: path to the base input files (csv files), e.g. hauts_sarts/input.
+    :param output_path: folder of the input files of the community.
+    :param members: number of members.
+    :param resolution: time resolution (see RESOLUTIONS).
+    :param horizon: horizon (see HORIZONS).
+    :param seed: seed of the random draws.
+    """
+    base = OptimisationInputs(input_parameters, input_files, output_path)
+    steps_per_hour, hours = RESOLUTIONS[resolution], HORIZONS[horizon]
+    if hours > len(base.time):
+        raise ValueError('The base inputs only have {} time steps ({} requested).'.format(len(base.time), hours))
+
+    generator = np.random.default_rng(seed)
+    positions = generator.integers(0, len(base.members), members)
+    labels = pd.Index(['member_{}'.format(j + 1) for j in range(members)])
+    time = pd.date_range(base.time[0], periods=hours * steps_per_hour, freq='{}min'.format(60 // steps_per_hour))
+
+    os.makedirs(output_path, exist_ok=True)
+    for file in base._mandatory_files + OPTIONAL_TIME_SERIES:
+        values = np.repeat(getattr(base, '{}_array'.format(file))[:hours, positions], steps_per_hour, axis=0)
+        if file in ENERGY_FILES:
+            values *= generator.uniform(0.8, 1.2, members) / steps_per_hour
+        pd.DataFrame(values, index=time, columns=labels).to_csv(os.path.join(output_path, '{}.csv'.format(file)))
+    for file in OPTIONAL_MEMBER_TABLES:
+        values = getattr(base, '{}_array'.format(file))[positions]
+        pd.DataFrame(values, index=labels, columns=base.technologies).to_csv(
+            os.path.join(output_path, '{}.csv'.format(file))
+        )
+    shutil.copy(input_parameters, os.path.join(output_path, 'inputs.yml'))
+
+
+def _run_case(model_name: str, solver: str, input_files: str, output_path: str, connection):
+    """
+    Loads, builds and solves the model of a case under a performance trace (in a process of its own, so that the peak
+    memory is that of the case alone) and sends the metrics through the connection.
+    """
+    try:
+        with Trace() as run_trace:
+            with trace.stage('load'):
+                inputs = OptimisationInputs(os.path.join(input_files, 'inputs.yml'), input_files, output_path)
+            problem = MODELS[model_name](inputs=inputs, solver=solver)
+            with trace.stage('build'):
+                model = problem.create_model()
+            size = model_size(model)
+            with trace.stage('solve'):
+                results, _ = problem.solve_model(model)
+            objective = float(np.sum(results['total_costs'])) * problem.discount_factor
+        data = run_trace.to_dict()
+        stages = {stage['name']: stage['wall_seconds'] for stage in data['stages']}
+        post_process = stages['solve/extract_results'] + stages['solve/save_results']
+        connection.send({
+            'status': 'optimal', 'load_seconds': stages['load'], 'build_seconds': stages['build'],
+            'solve_seconds': stages['solve'] - post_process, 'post_process_seconds': post_process,
+            'peak_memory_mb': data['peak_memory_mb'], 'objective': objective, **size
+        })
+    except Exception as error:
+        connection.send({'status': 'failed', 'error': '{}: {}'.format(type(error).__name__, error),
+                         'traceback': traceback.format_exc()})
+
+
+def run_case(model: str, solver: str, input_files: str, output_path: str, timeout: float = None) -> dict:
+    """
+    Runs a case of the benchmark in a new process.
+    :param model: name of the model (see sizing.models.MODELS).
+    :param solver: name of the solver.
+    :param input_files: folder of the input files of the case (see generate_community).
+    :param output_path: output path for the results.
+    :param timeout: maximum duration in seconds, after which the process is terminated (none by default).
+    :return: metrics of the case: durations of the stages, peak memory, size of the model and objective (or status
+    "timeout" or "failed" with the error).
+    """
+    os.makedirs(output_path, exist_ok=True)
+    # Spawned rather than forked, so that the memory of the benchmark runner is not counted in the peak memory
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case, args=(model, solver, input_files, output_path, sender))
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout):
+            return receiver.recv()
+        if process.is_alive():
+            return {'status': 'timeout', 'error': 'Not solved in {} seconds.'.format(timeout)}
+        return {'status': 'failed', 'error': 'Process exited with code {}.'.format(process.exitcode)}
+    except EOFError:
+        # The process died without sending the metrics (e.g. out of memory)
+        process.join()
+        return {'status': 'failed', 'error': 'Process exited with code {}.'.format(process.exitcode)}
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        receiver.close()
+
+
+def run_benchmark(input_parameters: str, input_files: str, output_path: str, models: list = None,
+                  members: list = None, resolutions: list = None, horizons: list = None, solver: str = 'cbc',
+                  timeout: float = None, data_path: str = None, is_verbose: bool = False) -> dict:
+    """
+    Runs the scaling benchmark: every model on synthetic communities of every size, resolution and horizon. The
+    communities are generated once (see generate_community) and reused by the models and the next runs.
+    :param input_parameters: path to the YML file of the base inputs.
+    :param input_files: path to the base input files (csv files).
+    :param output_path: output path of the results of the benchmark (benchmark.json) and of the cases.
+    :param models: names of the models (Central and CentralDuals by default).
+    :param members: numbers of members (see MEMBERS for the default).
+    :param resolutions: time resolutions (all the RESOLUTIONS by default).
+    :param horizons: horizons (all the HORIZONS by default).
+    :param solver: name of the solver.
+    :param timeout: maximum duration of every case in seconds (none by default).
+    :param data_path: folder of the input files of the communities (subfolder "data" of the output path by default).
+    :param is_verbose: flag to print the metrics of every case.
+    :return: results of the benchmark (also saved as benchmark.json).
+    """
+    models = models or BENCHMARK_MODELS
+    for model in models:
+        if model not in MODELS:
+            raise KeyError('The model "{}" does not exist. Please, select: {}.'.format(model, ', '.join(MODELS)))
+    data_path = data_path or os.path.join(output_path, 'data')
+    os.makedirs(output_path, exist_ok=True)
+
+    cases = dict()
+    for number, resolution, horizon in itertools.product(members or MEMBERS, resolutions or list(RESOLUTIONS),
+                                                        horizons or list(HORIZONS)):
+        community_files = os.path.join(data_path, '{}-{}-{}'.format(number, resolution, horizon))
+        if not os.path.isfile(os.path.join(community_files, 'inputs.yml')):
+            generate_community(input_parameters, input_files, community_files, number, resolution, horizon)
+        for model in models:
+            name = case_name(model, number, resolution, horizon)
+            tic = time.time()
+            metrics = run_case(model, solver, community_files, os.path.join(output_path, 'cases', name), timeout)
+            cases[name] = {'model': model, 'members': number, 'resolution': resolution, 'horizon': horizon,
+                           'total_seconds': time.time() - tic, **metrics}
+            if is_verbose:
+                print(f"{name}: {metrics['status']} in {cases[name]['total_seconds']:.2f} seconds "
+                      f"{metrics.get('error', '')}")
+
+    results = {'solver': solver, 'started': pd.Timestamp.now().isoformat(), 'cpus': os.cpu_count(), 'cases': cases}
+    with open(os.path.join(output_path, BENCHMARK_FILE), 'w') as outfile:
+        json.dump(results, outfile, indent=2)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, thresholds: dict = None, min_seconds: float = MIN_SECONDS) -> pd.DataFrame:
+    """
+    Compares the results of a benchmark with a baseline. A metric of a case has regressed if it increased by more
+    than its threshold (relative to the baseline) and, for the durations, by more than min_seconds. A case which is no
+    longer solved has regressed too. The cases missing from either side are ignored.
+    :param results: results of the benchmark (see run_benchmark).
+    :param baseline: results of the baseline.
+    :param thresholds: relative thresholds by metric (see THRESHOLDS for the default, which the thresholds given
+    override).
+    :param min_seconds: smallest increase of a duration considered as a regression.
+    :return: table with the baseline and current values, the ratio and the regression flag of every metric of every
+    case.
+    """
+    thresholds = {**THRESHOLDS, **(thresholds or dict())}
+    rows = []
+    for name, case in results['cases'].items():
+        reference = baseline['cases'].get(name)
+        if reference is None or reference['status'] != 'optimal':
+            continue
+        if case['status'] != 'optimal':
+            rows.append({'case': name, 'metric': 'status', 'baseline': np.nan, 'current': np.nan, 'ratio': np.nan,
+                         'is_regression': True})
+            continue
+        for metric, threshold in thresholds.items():
+            before, after = reference.get(metric), case.get(metric)
+            if before is None or after is None:
+                continue
+            is_regression = after > before * (1 + threshold)
+            if metric.endswith('_seconds'):
+                is_regression = is_regression and after - before > min_seconds
+            rows.append({'case': name, 'metric': metric, 'baseline': before, 'current': after,
+                         'ratio': after / before if before else np.inf, 'is_regression': is_regression})
+
+    return pd.DataFrame(rows, columns=['case', 'metric', 'baseline', 'current', 'ratio', 'is_regression'])
+
+
+def parse_thresholds(values: list) -> dict:
+    """
+    Parses thresholds of the command line, e.g. ["solve_seconds=0.5", "peak_memory_mb=0.2"].
+    :param values: list of "metric=threshold" strings.
+    :return: thresholds by metric.
+    """
+    thresholds = dict()
+    for value in values or []:
+        metric, _, threshold = value.partition('=')
+        if metric not in THRESHOLDS:
+            raise KeyError('Unknown metric "{}". Please, select: {}.'.format(metric, ', '.join(THRESHOLDS)))
+        thresholds[metric] = float(threshold)
+
+    return thresholds
+
+
+if __name__ == "__main__":
+
+    # Argument parsing
+    parser = argparse.ArgumentParser(description="Runs the scaling benchmark of the sizing models on synthetic "
+                                                 "communities bootstrapped from base inputs.")
+    parser.add_argument("-ip", "--input_parameters", dest="input_parameters", help="YML file of the base inputs",
+                        default="hauts_sarts/input/inputs.yml")
+    parser.add_argument("-if", "--input_files", dest="input_files", help="Path to the base input files (csv files)",
+                        default="hauts_sarts/input")
+    parser.add_argument("-o", "--output_path", dest="output", required=True, help="Output path for the results.")
+    parser.add_argument("-m", "--models", dest="models", nargs="*", default=BENCHMARK_MODELS,
+                        help="Models benchmarked (central and central_dual by default)")
+    parser.add_argument("-s", "--solver", dest="solver", help="Solver name (cbc, cplex ...)", default="cbc")
+    parser.add_argument("--members", dest="members", nargs="*", type=int, default=MEMBERS,
+                        help="Numbers of members of the communities")
+    parser.add_argument("--resolutions", dest="resolutions", nargs="*", choices=list(RESOLUTIONS),
+                        default=list(RESOLUTIONS), help="Time resolutions")
+    parser.add_argument("--horizons", dest="horizons", nargs="*", choices=list(HORIZONS), default=list(HORIZONS),
+                        help="Horizons")
+    parser.add_argument("--timeout", dest="timeout", type=float, help="Maximum duration of every case in seconds")
+    parser.add_argument("--data", dest="data_path",
+                        help="Folder of the input files of the synthetic communities, reused between runs (subfolder "
+                             "\"data\" of the output path by default)")
+    parser.add_argument("--baseline", dest="baseline", help="JSON file of the results of a previous benchmark")
+    parser.add_argument("--threshold", dest="thresholds", nargs="*",
+                        help="Relative increases over the baseline above which a metric has regressed, e.g. "
+                             "solve_seconds=0.5 (25 %% for the durations and 10 %% for the peak memory by default)")
+    parser.add_argument("--update-baseline", dest="is_update_baseline", action="store_true",
+                        help="Saves the results as the baseline after the comparison")
+    parser.add_argument("-v", "--verbose", dest="is_verbose", action="store_true", help="Verbose mode")
+
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        input_parameters=args.input_parameters,
+        input_files=args.input_files,
+        output_path=args.output,
+        models=args.models,
+        members=args.members,
+        resolutions=args.resolutions,
+        horizons=args.horizons,
+        solver=args.solver,
+        timeout=args.timeout,
+        data_path=args.data_path,
+        is_verbose=args.is_verbose
+    )
+    table = pd.DataFrame.from_dict(results['cases'], orient='index')
+    columns = ['status', 'load_seconds', 'build_seconds', 'solve_seconds', 'post_process_seconds', 'peak_memory_mb',
+               'variables', 'constraints', 'nonzeros']
+    print(table.reindex(columns=columns).to_string(float_format='{:.2f}'.format))
+
+    regressions = pd.DataFrame()
+    if args.baseline and os.path.isfile(args.baseline):
+        with open(args.baseline) as infile:
+            comparison = compare(results, json.load(infile), parse_thresholds(args.thresholds))
+        comparison.to_csv(os.path.join(args.output, 'comparison.csv'), index=False)
+        regressions = comparison[comparison['is_regression']]
+        print(f"{len(regressions)} regressions over the baseline {args.baseline}.")
+        if len(regressions):
+            print(regressions.to_string(index=False, float_format='{:.2f}'.format))
+    if args.baseline and args.is_update_baseline:
+        shutil.copy(os.path.join(args.output, BENCHMARK_FILE), args.baseline)
+
+    sys.exit(1 if len(regressions) else 0)
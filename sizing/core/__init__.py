@@ -1 +1,5 @@
-from .optimisation_inputs import OptimisationInputs
+from .optimisation_inputs import OptimisationInputs, mandatory_files, OPTIONAL_MEMBER_TABLES, OPTIONAL_TIME_SERIES
+from .input_cache import InputCache
+from .model_cache import ModelCache
+from .result_store import ResultStore, RESULT_FORMATS, RESULT_STORE_FILE, store_results
+from .trace import Trace, TRACE_FILE
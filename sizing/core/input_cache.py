@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from sizing.utils import read_data
+
+VERSION = 2
+
+
+def file_hash(path: str) -> str:
+    """
+    Hashes the content of a file.
+    :param path: path to the file.
+    :return: hexadecimal SHA-256 hash.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InputCache:
+    """
+    Binary sidecars of the input files (csv files).
+
+    Every input file is parsed once and stored as a .npy array of values with its index and columns, and a JSON file
+    with the modification time, the size and the hash of the csv file. The next reads memory-map the array instead of
+    parsing the csv file, so that the processes reading the same inputs (e.g. the variants of a sweep) share the same
+    pages. The values are stored column by column (member by member for the time series), so that reading a subset of
+    the members only touches their pages. A sidecar is rebuilt when the csv file changes: its modification time or
+    size differ and its hash differs.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Constructor.
+        :param directory: directory of the sidecars.
+        """
+        self.directory = directory
+        self.hits = []
+        self.misses = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def read(self, data_path: str) -> pd.DataFrame:
+        """
+        Reads a csv file through its sidecar, which is built (or rebuilt) if it is not valid.
+        :param data_path: path to the csv file.
+        :return: dataframe with the data, whose values are memory-mapped (read-only). The path to the csv file is kept
+        in its attribute "source".
+        """
+        prefix = self._prefix(data_path)
+        stat = os.stat(data_path)
+        metadata = self._metadata(prefix)
+
+        is_valid = metadata is not None and metadata['version'] == VERSION and metadata['size'] == stat.st_size
+        if is_valid and metadata['mtime_ns'] != stat.st_mtime_ns:
+            # Touched but possibly unchanged
+            is_valid = metadata['sha256'] == file_hash(data_path)
+            if is_valid:
+                metadata['mtime_ns'] = stat.st_mtime_ns
+                self._write_metadata(prefix, metadata)
+
+        if is_valid:
+            self.hits.append(data_path)
+        else:
+            self._build(data_path, prefix)
+            self.misses.append(data_path)
+            metadata = self._metadata(prefix)
+
+        values = np.load('{}.values.npy'.format(prefix), mmap_mode='r')
+        index = np.load('{}.index.npy'.format(prefix))
+        index = pd.Index(index.astype(object) if metadata['index_kind'] == 'labels' else index,
+                         name=metadata['index_name'])
+        if metadata['index_kind'] == 'datetime':
+            index = pd.DatetimeIndex(index.to_numpy().astype('datetime64[ns]'), name=metadata['index_name'])
+            if metadata['tz']:
+                index = index.tz_localize('UTC').tz_convert(metadata['tz'])
+        columns = pd.Index(np.load('{}.columns.npy'.format(prefix)).astype(object))
+
+        data = pd.DataFrame(values, index=index, columns=columns, copy=False)
+        data.attrs['source'] = data_path
+
+        return data
+
+    def _build(self, data_path: str, prefix: str):
+        """
+        Parses a csv file and writes its sidecar. The files are written under temporary names and renamed, so that
+        concurrent readers never see a partial sidecar.
+        """
+        data = read_data(data_path)
+        stat = os.stat(data_path)
+        metadata = {
+            'version': VERSION, 'source': os.path.abspath(data_path), 'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size, 'sha256': file_hash(data_path), 'index_name': data.index.name, 'tz': '',
+            'index_kind': 'labels'
+        }
+        if isinstance(data.index, pd.DatetimeIndex):
+            index = data.index.asi8
+            metadata['index_kind'] = 'datetime'
+            metadata['tz'] = str(data.index.tz) if data.index.tz is not None else ''
+        elif pd.api.types.is_numeric_dtype(data.index):
+            index = data.index.to_numpy()
+            metadata['index_kind'] = 'numeric'
+        else:
+            index = data.index.to_numpy().astype(str)
+
+        for suffix, values in [('values', np.asfortranarray(data.to_numpy(dtype=float))), ('index', index),
+                               ('columns', data.columns.to_numpy().astype(str))]:
+            temporary = '{}.{}.{}.tmp.npy'.format(prefix, suffix, os.getpid())
+            np.save(temporary, values, allow_pickle=False)
+            os.replace(temporary, '{}.{}.npy'.format(prefix, suffix))
+        self._write_metadata(prefix, metadata)
+
+    def _prefix(self, data_path: str) -> str:
+        """
+        Path of the sidecar of a csv file without extension (name of the file and hash of its absolute path).
+        """
+        name = os.path.splitext(os.path.basename(data_path))[0]
+        location = hashlib.sha256(os.path.abspath(data_path).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, '{}-{}'.format(name, location))
+
+    @staticmethod
+    def _metadata(prefix: str):
+        """
+        Metadata of a sidecar (None if there is no sidecar).
+        """
+        try:
+            with open('{}.json'.format(prefix)) as infile:
+                return json.load(infile)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_metadata(prefix: str, metadata: dict):
+        """
+        Writes the metadata of a sidecar.
+        """
+        temporary = '{}.{}.tmp.json'.format(prefix, os.getpid())
+        with open(temporary, 'w') as outfile:
+            json.dump(metadata, outfile)
+        os.replace(temporary, '{}.json'.format(prefix))
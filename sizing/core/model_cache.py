@@ -0,0 +1,138 @@
+import hashlib
+import inspect
+import os
+import pickle
+
+from sizing.utils import read_inputs
+from .optimisation_inputs import mandatory_files, OPTIONAL_MEMBER_TABLES, OPTIONAL_TIME_SERIES
+
+DEFAULT_CACHE_SIZE = 2048
+EXTENSION = '.pkl'
+
+
+def inputs_digest(input_parameters: str, input_files: str):
+    """
+    Hashes the configuration file and every input file read by OptimisationInputs, without parsing them.
+    :param input_parameters: path to the YML file with the parameters.
+    :param input_files: path to the input files (csv files).
+    :return: SHA-256 hash object (hashlib), which can be updated further.
+    """
+    digest = hashlib.sha256()
+    with open(input_parameters, 'rb') as infile:
+        digest.update(infile.read())
+
+    files = mandatory_files(read_inputs(input_parameters).get('stochastic'))
+    for file in files + OPTIONAL_TIME_SERIES + OPTIONAL_MEMBER_TABLES:
+        file_path = os.path.join(input_files, '{}.csv'.format(file))
+        if not os.path.exists(file_path):
+            continue
+        digest.update(file.encode())
+        with open(file_path, 'rb') as infile:
+            for chunk in iter(lambda: infile.read(1 << 20), b''):
+                digest.update(chunk)
+
+    return digest
+
+
+class ModelCache:
+    """
+    Content-addressed cache of built problems.
+
+    Problems are stored in matrix form (sparse problems, with the maps of variables and constraints needed to
+    post-process the solution) under a key that hashes the configuration file, every input file read by
+    OptimisationInputs and the model class. The least recently used entries are evicted when the cache exceeds its
+    maximum size.
+    """
+
+    def __init__(self, directory: str, max_size: float = DEFAULT_CACHE_SIZE):
+        """
+        Constructor.
+        :param directory: directory of the cache.
+        :param max_size: maximum size of the cache in MB.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(input_parameters: str, input_files: str, model_class: type, options: dict = None) -> str:
+        """
+        Computes the key of a problem without parsing the input files.
+        :param input_parameters: path to the YML file with the parameters.
+        :param input_files: path to the input files (csv files).
+        :param model_class: class of the model.
+        :param options: other options changing the problem (e.g. the aggregation of the time series).
+        :return: hexadecimal hash of the inputs and the model.
+        """
+        digest = inputs_digest(input_parameters, input_files)
+
+        # The source of the model invalidates the entries when the formulation changes
+        digest.update(model_class.__qualname__.encode())
+        digest.update(inspect.getsource(inspect.getmodule(model_class)).encode())
+        if options:
+            digest.update(repr(sorted(options.items())).encode())
+
+        return digest.hexdigest()
+
+    def load(self, key: str):
+        """
+        Loads a problem from the cache.
+        :param key: key of the problem.
+        :return: problem, or None if it is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as infile:
+                problem = pickle.load(infile)
+        except FileNotFoundError:
+            return None
+        # Marks the entry as recently used
+        os.utime(path)
+
+        return problem
+
+    def store(self, key: str, problem):
+        """
+        Stores a problem in the cache, evicting the least recently used entries if needed.
+        :param key: key of the problem.
+        :param problem: problem to store.
+        """
+        path = self._path(key)
+        temporary_path = '{}.tmp{}'.format(path, os.getpid())
+        with open(temporary_path, 'wb') as outfile:
+            pickle.dump(problem, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        self._evict()
+
+    def clear(self):
+        """
+        Removes all the entries of the cache.
+        """
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits its maximum size.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total_size = sum(size for _, _, size in entries)
+        while entries and total_size > self.max_size * 1024**2:
+            path, _, size = entries.pop(0)
+            os.remove(path)
+            total_size -= size
+
+    def _entries(self) -> list:
+        """
+        Entries of the cache as tuples (path, last use, size in bytes).
+        """
+        entries = []
+        for file in os.listdir(self.directory):
+            if file.endswith(EXTENSION):
+                path = os.path.join(self.directory, file)
+                stat = os.stat(path)
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, '{}{}'.format(key, EXTENSION))
@@ -1,8 +1,55 @@
+import copy
 import itertools
+import os
+import time
 
-from sizing.utils import read_inputs, set_file_to_object
+import numpy as np
+import pandas as pd
+
+from sizing.utils import align_data, cluster_periods, is_memory_mapped, read_data, read_files, read_inputs
+from . import trace
+from .input_cache import InputCache
 
 DEFAULT_ATTR = 0
+TECHNOLOGIES = ['p', 'b']
+OPTIONAL_TIME_SERIES = [
+    'prices_grid_import', 'prices_grid_export', 'prices_community_import', 'prices_community_export'
+]
+OPTIONAL_MEMBER_TABLES = [
+    'cost_technology_investment', 'cost_technology_running_fixed', 'cost_technology_running_variable',
+    'initial_capacity'
+]
+
+
+def mandatory_files(stochastic: list = None) -> list:
+    """
+    Names of the mandatory files (without extension) for a deterministic or stochastic configuration.
+    :param stochastic: probabilities of the scenarios (None for a deterministic configuration).
+    :return: list of names of the mandatory files.
+    """
+    if stochastic:
+        number_scenarios = len(stochastic)
+        files_demand = ['demand_scenario_{}'.format(i) for i in range(1, number_scenarios+1)]
+        files_generation = ['generation_scenario_{}'.format(i) for i in range(1, number_scenarios+1)]
+        return list(itertools.chain(*[files_demand, files_generation]))
+    else:
+        return ['demand', 'generation']
+
+
+def _slice_frame(data, index: pd.Index = None, columns: pd.Index = None):
+    """
+    Copy of the rows and/or the columns of a dataframe, no longer tied to the file it was memory-mapped from (the
+    scalar default values of the optional files are returned as they are).
+    :param data: dataframe (or scalar).
+    :param index: labels of the rows kept (all the rows by default).
+    :param columns: labels of the columns kept (all the columns by default).
+    :return: sliced dataframe.
+    """
+    if not isinstance(data, pd.DataFrame):
+        return data
+    sliced = data.reindex(index=index, columns=columns, copy=True)
+    sliced.attrs = dict()
+    return sliced
 
 
 class OptimisationInputs:
@@ -10,11 +57,24 @@ class OptimisationInputs:
     Object gathering all the inputs for the different optimisation problems.
     """
 
-    def __init__(self, input_parameters: str, input_files: str, output_path: str):
+    def __init__(self, input_parameters: str, input_files: str, output_path: str, input_cache: str = None):
         """
         Constructor.
+        :param input_parameters: path to the YML file with the parameters.
+        :param input_files: path to the input files (csv files).
+        :param output_path: output path for the results.
+        :param input_cache: directory of the binary sidecars of the input files, memory-mapped instead of parsing the
+        csv files (the csv files are parsed by default). The memory-mapped data are only loaded when they are used,
+        e.g. only the members of the inputs restricted by slice, and they are mapped again instead of being copied
+        when the inputs are sent to another process.
         """
+        self.input_cache = None if input_cache is None else InputCache(input_cache)
+        reader = read_data if self.input_cache is None else self.input_cache.read
         self.stochastic = None
+        self.duals = None
+        self.outputs = None
+        self.results_format = 'csv'
+        self.results_dtype = 'float64'
         input_parameters = read_inputs(input_parameters)
 
         # Mandatory attributes
@@ -29,41 +89,232 @@ class OptimisationInputs:
 
         # Optional attributes
         for attr in [
-            'stochastic'
+            'stochastic', 'duals', 'outputs', 'results_format', 'results_dtype'
         ]:
             try:
                 setattr(self, attr, input_parameters[attr])
             except KeyError:
                 pass
 
-        # Mandatory files
-        if self.stochastic:
-            number_scenarios = len(self.stochastic)
-            files_demand = ['demand_scenario_{}'.format(i) for i in range(1, number_scenarios+1)]
-            files_generation = ['generation_scenario_{}'.format(i) for i in range(1, number_scenarios+1)]
-            for file in itertools.chain(*[files_demand, files_generation]):
-                try:
-                    set_file_to_object(self, input_files, file)
-                except FileNotFoundError:
-                    raise FileNotFoundError('File "{}.csv" is mandatory and was not found in the inputs.'.format(file))
-        else:
-            for file in [
-                'demand', 'generation'
-            ]:
-                try:
-                    set_file_to_object(self, input_files, file)
-                except FileNotFoundError:
-                    raise FileNotFoundError('File "{}.csv" is mandatory and was not found in the inputs.'.format(file))
-
-        # Optional files
-        for file in [
-            'prices_grid_import', 'prices_grid_export', 'prices_community_import', 'prices_community_export',
-            'cost_technology_investment', 'cost_technology_running_fixed', 'cost_technology_running_variable',
-            'initial_capacity'
-        ]:
-            try:
-                set_file_to_object(self, input_files, file)
-            except FileNotFoundError:
+        # Input files, resolved up front and read concurrently
+        start = time.perf_counter()
+        self._mandatory_files = mandatory_files(self.stochastic)
+        paths = {file: os.path.join(input_files, '{}.csv'.format(file))
+                 for file in self._mandatory_files + OPTIONAL_TIME_SERIES + OPTIONAL_MEMBER_TABLES}
+        for file in self._mandatory_files:
+            if not os.path.isfile(paths[file]):
+                raise FileNotFoundError('File "{}.csv" is mandatory and was not found in the inputs.'.format(file))
+        paths = {file: path for file, path in paths.items() if os.path.isfile(path)}
+        with trace.stage('load_files'):
+            for file, data in read_files(paths, trace.timed(reader)).items():
+                setattr(self, file, data)
+        for file in OPTIONAL_TIME_SERIES + OPTIONAL_MEMBER_TABLES:
+            if file not in paths:
                 setattr(self, file, DEFAULT_ATTR)
+        self.load_seconds = time.perf_counter() - start
 
         self.output_path: str = output_path
+
+        # Positional representation of the data
+        with trace.stage('align_arrays'):
+            self._build_arrays()
+
+    def _build_arrays(self):
+        """
+        Aligns every time series (time x member) and member table (member x technology) into a contiguous float64
+        array named after the file with the suffix "_array", and builds the maps from labels to positions. The models
+        read their coefficients by position instead of looking up labels in the dataframes.
+        """
+        reference = getattr(self, self._mandatory_files[0])
+        self.time: pd.Index = reference.index
+        self.members: pd.Index = reference.columns
+        self.technologies: pd.Index = pd.Index(TECHNOLOGIES)
+
+        self.time_position = {t: i for i, t in enumerate(self.time)}
+        self.member_position = {u: j for j, u in enumerate(self.members)}
+        self.technology_position = {n: k for k, n in enumerate(self.technologies)}
+
+        for file in self._mandatory_files + OPTIONAL_TIME_SERIES:
+            setattr(self, '{}_array'.format(file), align_data(getattr(self, file), self.time, self.members))
+        for file in OPTIONAL_MEMBER_TABLES:
+            setattr(self, '{}_array'.format(file), align_data(getattr(self, file), self.members, self.technologies))
+
+        # Time representation (weight of every time step and, for aggregated inputs, the representative periods)
+        self.time_weight_array = np.ones(len(self.time))
+        self.period_length = None
+        self.period_sequence = None
+        self.aggregation_error = None
+
+    def slice(self, members: list = None, time: list = None) -> 'OptimisationInputs':
+        """
+        Restricts the inputs to a subset of the members and/or of the time steps. The dataframes, the arrays and the
+        positions are sliced together, so that the slice holds no reference to the data of the members and time steps
+        left out, while the parameters are shared with these inputs. For memory-mapped inputs (input cache), only the
+        data of the members kept are read, so that the memory scales with the slice.
+        :param members: labels of the members to keep, in the order of the new positions (all the members by default).
+        :param time: labels of the time steps to keep, in the order of the new positions (all the time steps by
+        default).
+        :return: sliced inputs.
+        """
+        inputs = copy.copy(self)
+
+        if members is not None:
+            try:
+                positions = [self.member_position[u] for u in members]
+            except KeyError as error:
+                raise KeyError('Member {} not found in the inputs.'.format(error))
+            inputs.members = self.members[positions]
+            inputs.member_position = {u: j for j, u in enumerate(inputs.members)}
+            for file in self._mandatory_files + OPTIONAL_TIME_SERIES:
+                setattr(inputs, file, _slice_frame(getattr(self, file), columns=inputs.members))
+                array = getattr(self, '{}_array'.format(file))
+                setattr(inputs, '{}_array'.format(file), np.ascontiguousarray(array[:, positions]))
+            for file in OPTIONAL_MEMBER_TABLES:
+                setattr(inputs, file, _slice_frame(getattr(self, file), index=inputs.members))
+                array = getattr(self, '{}_array'.format(file))
+                setattr(inputs, '{}_array'.format(file), np.ascontiguousarray(array[positions]))
+
+        if time is not None:
+            if self.period_sequence is not None:
+                raise ValueError('The time steps of aggregated inputs cannot be sliced.')
+            try:
+                positions = [self.time_position[t] for t in time]
+            except KeyError as error:
+                raise KeyError('Time step {} not found in the inputs.'.format(error))
+            inputs.time = self.time[positions]
+            inputs.time_position = {t: i for i, t in enumerate(inputs.time)}
+            inputs.time_weight_array = self.time_weight_array[positions]
+            for file in self._mandatory_files + OPTIONAL_TIME_SERIES:
+                setattr(inputs, file, _slice_frame(getattr(inputs, file), index=inputs.time))
+                array = getattr(inputs, '{}_array'.format(file))
+                setattr(inputs, '{}_array'.format(file), np.ascontiguousarray(array[positions]))
+
+        return inputs
+
+    def __getstate__(self) -> dict:
+        """
+        State of the inputs when they are pickled (e.g. sent to a worker process): the memory-mapped dataframes and
+        the arrays which are views of them are replaced by the paths to their input files, to be mapped again by the
+        process unpickling the inputs.
+        """
+        state = self.__dict__.copy()
+        sources = {name: value for name, value in state.items()
+                   if isinstance(value, pd.DataFrame) and 'source' in value.attrs}
+        for name, value in state.items():
+            if name in sources:
+                state[name] = ('memory_mapped', value.attrs['source'], False)
+            elif isinstance(value, np.ndarray) and is_memory_mapped(value):
+                source = next((data.attrs['source'] for data in sources.values()
+                               if np.may_share_memory(value, data.to_numpy())), None)
+                if source is not None:
+                    state[name] = ('memory_mapped', source, True)
+
+        return state
+
+    def __setstate__(self, state: dict):
+        """
+        Restores the inputs pickled, mapping the memory-mapped data again.
+        """
+        for name, value in state.items():
+            if isinstance(value, tuple) and len(value) == 3 and value[0] == 'memory_mapped':
+                data = state['input_cache'].read(value[1])
+                state[name] = data.to_numpy(dtype=float) if value[2] else data
+        self.__dict__.update(state)
+
+    def scenario(self, scenario: int) -> 'OptimisationInputs':
+        """
+        Deterministic inputs of one scenario of a stochastic configuration: the demand and the generation of the
+        scenario, while the parameters and the other data are shared with these inputs.
+        :param scenario: number of the scenario (from 1, as in the names of the files).
+        :return: inputs of the scenario.
+        """
+        if not self.stochastic:
+            raise ValueError('The inputs are not stochastic (no probabilities of the scenarios).')
+        if not 1 <= scenario <= len(self.stochastic):
+            raise ValueError('Scenario {} not found in the inputs ({} scenarios).'.format(
+                scenario, len(self.stochastic)
+            ))
+
+        inputs = copy.copy(self)
+        inputs.stochastic = None
+        inputs._mandatory_files = mandatory_files()
+        for file in inputs._mandatory_files:
+            name = '{}_scenario_{}'.format(file, scenario)
+            setattr(inputs, file, getattr(self, name))
+            setattr(inputs, '{}_array'.format(file), getattr(self, '{}_array'.format(name)))
+
+        return inputs
+
+    def aggregate(self, periods: int, period_length: int = None, extreme_periods: bool = True) -> 'OptimisationInputs':
+        """
+        Aggregates the time series into representative periods. The periods (days by default) are clustered jointly
+        on all the time series of all the members, and every cluster is represented by its medoid weighted by the
+        number of periods of the cluster. The sequence of representative periods over the horizon is kept so that the
+        models can link the storage between consecutive periods.
+        :param periods: number of representative periods (including the extreme ones).
+        :param period_length: number of time steps per period (one day by default).
+        :param extreme_periods: flag to keep the period with the highest peak of net demand and the period with the
+        lowest generation of the community as representative periods of their own.
+        :return: aggregated inputs, with the relative error of every time series in "aggregation_error".
+        """
+        if self.period_sequence is not None:
+            raise ValueError('The inputs are already aggregated.')
+        if period_length is None:
+            period_length = int(pd.Timedelta(days=1) / (self.time[1] - self.time[0]))
+        number_periods, remainder = divmod(len(self.time), period_length)
+        if remainder != 0:
+            raise ValueError('The horizon ({} time steps) is not a multiple of the period length ({}).'.format(
+                len(self.time), period_length
+            ))
+
+        files = self._mandatory_files + OPTIONAL_TIME_SERIES
+        series = {file: getattr(self, '{}_array'.format(file)) for file in files}
+
+        # Periods kept as their own representative periods
+        extremes = []
+        if extreme_periods and not self.stochastic:
+            net_demand = (series['demand'] - series['generation']).sum(axis=1).reshape(number_periods, -1)
+            generation = series['generation'].sum(axis=1).reshape(number_periods, -1)
+            extremes = list(dict.fromkeys([int(net_demand.max(axis=1).argmax()), int(generation.sum(axis=1).argmin())]))
+        if not len(extremes) < periods <= number_periods:
+            raise ValueError('The number of representative periods must be between {} and {}.'.format(
+                len(extremes) + 1, number_periods
+            ))
+
+        # Features: every time series of every member over the period, scaled by the range of the series
+        features = np.hstack([
+            ((values - values.min()) / (np.ptp(values) or 1.)).reshape(number_periods, -1)
+            for values in series.values()
+        ])
+        others = np.setdiff1d(np.arange(number_periods), extremes)
+        labels, medoids = cluster_periods(features[others], periods - len(extremes))
+
+        representatives = np.concatenate([extremes, others[medoids]]).astype(int)
+        sequence = np.empty(number_periods, dtype=int)
+        sequence[extremes] = np.arange(len(extremes))
+        sequence[others] = len(extremes) + labels
+
+        # Representative periods in chronological order
+        order = np.argsort(representatives)
+        representatives, sequence = representatives[order], np.argsort(order)[sequence]
+        steps = (representatives[:, np.newaxis] * period_length + np.arange(period_length)).ravel()
+
+        inputs = copy.copy(self)
+        inputs.time = self.time[steps]
+        inputs.time_position = {t: i for i, t in enumerate(inputs.time)}
+        for file, values in series.items():
+            setattr(inputs, '{}_array'.format(file), np.ascontiguousarray(values[steps]))
+        inputs.time_weight_array = np.repeat(np.bincount(sequence, minlength=len(representatives)), period_length)
+        inputs.time_weight_array = inputs.time_weight_array.astype(float)
+        inputs.period_length = period_length
+        inputs.period_sequence = sequence
+
+        # Relative root mean square error of the series rebuilt from the representative periods
+        inputs.aggregation_error = dict()
+        for file, values in series.items():
+            rebuilt = values.reshape(number_periods, period_length, -1)[representatives[sequence]].reshape(values.shape)
+            inputs.aggregation_error[file] = (
+                np.sqrt(np.mean((rebuilt - values)**2)) / (np.sqrt(np.mean(values**2)) or 1.)
+            )
+
+        return inputs
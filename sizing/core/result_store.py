@@ -0,0 +1,176 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from sizing.utils import save_results
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+RESULT_FORMATS = ['csv', 'hdf5']
+RESULT_STORE_FILE = 'results.h5'
+CHUNK_ROWS = 4096
+# Columns per chunk: chunks of 4096 x 32 float64 values fill the default chunk cache of HDF5 (1 MB)
+CHUNK_COLUMNS = 32
+COMPRESSION_LEVEL = 4
+
+
+def store_results(results: dict, output_path: str, file_format: str = 'csv', dtype: str = 'float64'):
+    """
+    Saves the results in csv files or in the result store of the output path.
+    :param results: dictionary containing the results of the simulation (name -> dataframe or series).
+    :param output_path: path to the folder where the results are saved.
+    :param file_format: "csv" (one file per result) or "hdf5" (one store per output path).
+    :param dtype: type of the values saved ("float64" or "float32").
+    """
+    if file_format == 'csv':
+        if dtype != 'float64':
+            results = {name: values.astype(dtype) for name, values in results.items()}
+        save_results(results, output_path)
+    elif file_format == 'hdf5':
+        with ResultStore(os.path.join(output_path, RESULT_STORE_FILE), mode='a', dtype=dtype) as store:
+            for name, values in results.items():
+                store.write(name, values)
+    else:
+        raise ValueError('Format "{}" of the results not supported. Please, select: {}.'.format(
+            file_format, ', '.join(RESULT_FORMATS)
+        ))
+
+
+class ResultStore:
+    """
+    Columnar store of the results of a run in a single compressed HDF5 file. Every result (dataframe or series) is a
+    group with its values, chunked by blocks of rows and columns, and its index and columns (e.g. time steps and members), so that
+    a range of time steps or a subset of members is read without loading the whole result. The metadata of the run
+    (e.g. hash of the inputs, solver, timings) are stored as attributes of the file.
+    """
+
+    def __init__(self, path: str, mode: str = 'r', dtype: str = 'float64'):
+        """
+        Constructor.
+        :param path: path to the HDF5 file.
+        :param mode: mode of the file ("r" to read, "a" to read and write, "w" to overwrite).
+        :param dtype: type of the values written ("float64" or "float32").
+        """
+        if h5py is None:
+            raise ImportError('The package h5py is required to store the results in HDF5.')
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._file = h5py.File(path, mode)
+
+    def __enter__(self) -> 'ResultStore':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def names(self) -> list:
+        """
+        Names of the results of the store.
+        """
+        return list(self._file.keys())
+
+    @property
+    def metadata(self) -> dict:
+        """
+        Metadata of the run.
+        """
+        return dict(self._file.attrs)
+
+    def set_metadata(self, **metadata):
+        """
+        Adds (or replaces) metadata of the run, e.g. the hash of the inputs, the solver or the timings.
+        """
+        for key, value in metadata.items():
+            self._file.attrs[key] = 'None' if value is None else value
+
+    def write(self, name: str, values):
+        """
+        Writes (or replaces) a result.
+        :param name: name of the result.
+        :param values: dataframe or series.
+        """
+        if name in self._file:
+            del self._file[name]
+        group = self._file.create_group(name)
+        data = values.to_numpy(dtype=self.dtype)
+        chunks = (min(len(data), CHUNK_ROWS),) + tuple(min(size, CHUNK_COLUMNS) for size in data.shape[1:])
+        chunks = chunks if data.size else None
+        group.create_dataset('values', data=data, chunks=chunks, compression='gzip',
+                             compression_opts=COMPRESSION_LEVEL, shuffle=True)
+        self._write_axis(group, 'index', values.index)
+        if isinstance(values, pd.DataFrame):
+            self._write_axis(group, 'columns', values.columns)
+        group.attrs['written'] = datetime.datetime.now().isoformat()
+
+    def read(self, name: str, start=None, end=None, members: list = None):
+        """
+        Reads a result, or a part of it: only the chunks of the rows and the columns selected are read.
+        :param name: name of the result.
+        :param start: first label of the index to read, e.g. a time step (inclusive, from the start by default).
+        :param end: last label of the index to read (inclusive, up to the end by default).
+        :param members: labels of the columns (e.g. members) to read (all the columns by default).
+        :return: dataframe or series.
+        """
+        group = self._file[name]
+        index = self._read_axis(group['index'])
+        rows = index.slice_indexer(start, end) if start is not None or end is not None else slice(None)
+        index = index[rows]
+
+        if 'columns' not in group:
+            return pd.Series(group['values'][rows], index=index)
+
+        columns = self._read_axis(group['columns'])
+        if members is None:
+            return pd.DataFrame(group['values'][rows], index=index, columns=columns)
+        try:
+            positions = np.array([columns.get_loc(member) for member in members], dtype=int)
+        except KeyError as error:
+            raise KeyError('Member {} not found in the result "{}".'.format(error, name))
+        if not len(positions):
+            return pd.DataFrame(index=index, columns=columns[positions], dtype=group['values'].dtype)
+        # The columns are read once each and in increasing order (as required by HDF5), and put back in the order
+        # requested
+        unique, inverse = np.unique(positions, return_inverse=True)
+        values = group['values'][rows, unique][:, inverse]
+        return pd.DataFrame(values, index=index, columns=columns[positions])
+
+    @staticmethod
+    def _write_axis(group, name: str, axis: pd.Index):
+        """
+        Writes an index as a dataset: timestamps as nanoseconds, labels as strings.
+        """
+        if isinstance(axis, pd.DatetimeIndex):
+            dataset = group.create_dataset(name, data=axis.asi8)
+            dataset.attrs['kind'] = 'datetime'
+            dataset.attrs['tz'] = str(axis.tz) if axis.tz is not None else ''
+        elif pd.api.types.is_numeric_dtype(axis):
+            dataset = group.create_dataset(name, data=axis.to_numpy())
+            dataset.attrs['kind'] = 'numeric'
+        else:
+            dataset = group.create_dataset(name, data=axis.astype(str).to_numpy(dtype=object),
+                                           dtype=h5py.string_dtype())
+            dataset.attrs['kind'] = 'string'
+
+    @staticmethod
+    def _read_axis(dataset) -> pd.Index:
+        """
+        Reads an index written by _write_axis.
+        """
+        kind = dataset.attrs['kind']
+        if kind == 'datetime':
+            axis = pd.DatetimeIndex(dataset[()].astype('datetime64[ns]'))
+            return axis.tz_localize('UTC').tz_convert(dataset.attrs['tz']) if dataset.attrs['tz'] else axis
+        elif kind == 'string':
+            return pd.Index(dataset.asstr()[()])
+        return pd.Index(dataset[()])
@@ -0,0 +1,330 @@
+import contextlib
+import datetime
+import functools
+import json
+import os
+import platform
+import resource
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+from sizing.utils import peak_memory
+
+TRACE_FILE = 'trace.json'
+MEMORY_PROFILE_FILE = 'memory_profile.csv'
+MB = 1024 ** 2
+
+# Trace recording the stages of the run (None if the run is not traced)
+_active = None
+
+
+def current_peak() -> float:
+    """
+    Peak resident memory (RSS) of the current process since the start of the process or since it was last reset.
+    :return: peak resident memory in MB.
+    """
+    try:
+        with open('/proc/self/status') as infile:
+            for line in infile:
+                if line.startswith('VmHWM'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_memory()
+
+
+def reset_peak() -> bool:
+    """
+    Resets the peak resident memory of the current process to its current resident memory (Linux only).
+    :return: True if the peak has been reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as outfile:
+            outfile.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def children_cpu_time() -> float:
+    """
+    CPU time (user and system) of the terminated child processes, e.g. solvers run as executables.
+    :return: CPU time in seconds.
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Trace:
+    """
+    Performance trace of a run: wall time, CPU time and peak memory of every stage (e.g. loading every input file,
+    building every constraint family, running the solver, saving the results) and size of the model, written as JSON.
+
+    Stages are nested and named by their path, e.g. "create_model/_energy_balance_eqn". The peak memory of a stage is
+    the peak resident memory of the process during the stage if the peak can be reset (Linux), else since the start of
+    the process. The stages run in worker processes are not recorded: their time is part of the stage of the parent.
+
+    With the memory accounting, the Python allocations are traced (tracemalloc) and every stage also records the
+    memory it allocated and still holds at its end (e.g. the variables and constraints of a family built in the stage,
+    or the values of the duals loaded in the suffix) and the peak of the allocations during the stage. Tracing the
+    allocations slows the run down (about 3 times for Central). The memory allocated outside of Python (e.g. by the
+    solver libraries) is only seen by the peak resident memory.
+    """
+
+    def __init__(self, memory: bool = False, **metadata):
+        """
+        Constructor.
+        :param memory: flag to account the Python allocations of every stage (see above).
+        :param metadata: description of the run (e.g. model and solver), saved with the trace.
+        """
+        self.metadata = metadata
+        self.memory = memory
+        self.stages = []
+        self.model_size = dict()
+        self.is_peak_reset = reset_peak()
+        self._stack = []
+        self._lock = threading.Lock()
+        self._previous = None
+        self._is_tracing = False
+        self._started = datetime.datetime.now()
+        self._start = time.perf_counter()
+
+    def __enter__(self) -> 'Trace':
+        self.activate()
+        return self
+
+    def __exit__(self, *args):
+        self.deactivate()
+
+    def activate(self):
+        """
+        Records the stages of the run in this trace (see the functions stage, staged and timed).
+        """
+        global _active
+        self._previous, _active = _active, self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._is_tracing = True
+
+    def deactivate(self):
+        """
+        Stops recording the stages of the run in this trace.
+        """
+        global _active
+        _active, self._previous = self._previous, None
+        if self._is_tracing:
+            tracemalloc.stop()
+            self._is_tracing = False
+
+    def path(self, name: str) -> str:
+        """
+        Path of a stage started in the current stage.
+        """
+        return '/'.join([frame['name'] for frame in self._stack] + [name])
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Records a stage (from the main thread).
+        :param name: name of the stage.
+        """
+        path = self.path(name)
+        is_tracing = self.memory and tracemalloc.is_tracing()
+        if self._stack:
+            # The peaks of the enclosing stage so far are kept before the peaks are reset
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], current_peak())
+            if is_tracing:
+                self._stack[-1]['traced_peak'] = max(self._stack[-1]['traced_peak'], tracemalloc.get_traced_memory()[1])
+        reset_peak()
+        frame = {'name': name, 'peak': 0., 'traced_peak': 0}
+        if is_tracing:
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        self._stack.append(frame)
+        wall, cpu, children = time.perf_counter(), time.process_time(), children_cpu_time()
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            peak = max(frame['peak'], current_peak())
+            values = dict()
+            if is_tracing and tracemalloc.is_tracing():
+                current, traced_peak = tracemalloc.get_traced_memory()
+                traced_peak = max(frame['traced_peak'], traced_peak)
+                values = {'allocated_mb': (current - traced) / MB, 'allocated_peak_mb': (traced_peak - traced) / MB}
+                if self._stack:
+                    self._stack[-1]['traced_peak'] = max(self._stack[-1]['traced_peak'], traced_peak)
+            self.record(
+                path, start_seconds=wall - self._start, wall_seconds=time.perf_counter() - wall,
+                cpu_seconds=time.process_time() - cpu, children_cpu_seconds=children_cpu_time() - children,
+                peak_memory_mb=peak, **values
+            )
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+    def record(self, path: str, **values):
+        """
+        Records the measures of a stage (from any thread).
+        :param path: path of the stage.
+        :param values: measures of the stage (e.g. wall_seconds).
+        """
+        with self._lock:
+            self.stages.append(dict(name=path, **values))
+
+    def record_memory(self, name: str, size: int):
+        """
+        Records the memory held by an object built within the current stage but not in a stage of its own (e.g. the
+        duals loaded by the solver), as a stage of the current stage, with the memory accounting.
+        :param name: name of the stage.
+        :param size: memory in bytes.
+        """
+        if self.memory:
+            self.record(self.path(name), allocated_mb=size / MB)
+
+    def set_model_size(self, **size):
+        """
+        Records the size of the model (e.g. numbers of variables, constraints and nonzeros).
+        """
+        self.model_size.update(size)
+
+    def memory_profile(self) -> pd.DataFrame:
+        """
+        Memory of the innermost stages (e.g. every variable and constraint family), ranked by the memory they allocated
+        and still hold at their end, with the peak of their allocations and the peak resident memory of the process.
+        The memory recorded apart (see record_memory) is also part of the stage in which it was allocated.
+        :return: table indexed by the paths of the stages (empty without the memory accounting).
+        """
+        columns = ['allocated_mb', 'allocated_peak_mb', 'peak_memory_mb']
+        stages = [values for values in self.stages if 'allocated_mb' in values]
+        paths = {values['name'] for values in stages}
+        parents = {path.rsplit('/', 1)[0] for path in paths if '/' in path}
+        profile = pd.DataFrame([values for values in stages if values['name'] not in parents],
+                               columns=['name'] + columns)
+
+        return profile.set_index('name').sort_values('allocated_mb', ascending=False)
+
+    def to_dict(self) -> dict:
+        """
+        Trace as a dictionary (stages in the order in which they end).
+        """
+        return {
+            'metadata': self.metadata,
+            'started': self._started.isoformat(),
+            'total_seconds': time.perf_counter() - self._start,
+            'peak_memory_mb': max([values.get('peak_memory_mb', 0.) for values in self.stages] + [current_peak()]),
+            'peak_scope': 'stage' if self.is_peak_reset else 'process',
+            'system': {'python': platform.python_version(), 'platform': platform.platform(),
+                       'cpus': os.cpu_count()},
+            'model_size': self.model_size,
+            'stages': list(self.stages)
+        }
+
+    def write(self, path: str):
+        """
+        Writes the trace as JSON, and the memory profile (see memory_profile) as a csv file in the same folder with the
+        memory accounting.
+        :param path: path to the JSON file.
+        """
+        with open(path, 'w') as outfile:
+            json.dump(self.to_dict(), outfile, indent=2, default=str)
+        if self.memory:
+            self.memory_profile().to_csv(os.path.join(os.path.dirname(path), MEMORY_PROFILE_FILE))
+
+
+def is_active() -> bool:
+    """
+    Checks if the run is traced.
+    """
+    return _active is not None
+
+
+def is_accounting_memory() -> bool:
+    """
+    Checks if the run is traced with the memory accounting.
+    """
+    return _active is not None and _active.memory
+
+
+def record_memory(name: str, size: int):
+    """
+    Records the memory held by an object in the active trace (nothing if the run is not traced, see Trace.record_memory).
+    """
+    if _active is not None:
+        _active.record_memory(name, size)
+
+
+def set_model_size(**size):
+    """
+    Records the size of the model in the active trace (nothing if the run is not traced).
+    """
+    if _active is not None:
+        _active.set_model_size(**size)
+
+
+def stage(name: str):
+    """
+    Records a stage in the active trace (nothing if the run is not traced).
+    :param name: name of the stage.
+    :return: context manager.
+    """
+    return contextlib.nullcontext() if _active is None else _active.stage(name)
+
+
+@contextlib.contextmanager
+def staged(obj, methods: dict):
+    """
+    Records the calls of methods of an object as stages of the active trace, within the context (e.g. the steps of a
+    solver). The methods which the object does not have are ignored.
+    :param obj: object.
+    :param methods: names of the stages by name of the method.
+    """
+    methods = {} if _active is None else {method: name for method, name in methods.items() if hasattr(obj, method)}
+    for method, name in methods.items():
+        setattr(obj, method, _staged_method(getattr(obj, method), name))
+    try:
+        yield
+    finally:
+        for method in methods:
+            delattr(obj, method)
+
+
+def _staged_method(method, name: str):
+    """
+    Wraps a bound method so that its calls are recorded as stages.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def timed(function):
+    """
+    Wraps a function of a file path (e.g. the reader of the input files) so that every call is recorded in the active
+    trace as a stage of the current stage named after the file, with its wall time and the CPU time of its thread. The
+    calls can be made from several threads.
+    :param function: function whose first argument is a file path.
+    :return: wrapped function (the function itself if the run is not traced).
+    """
+    if _active is None:
+        return function
+    trace = _active
+    path = '/'.join(frame['name'] for frame in trace._stack)
+
+    @functools.wraps(function)
+    def wrapper(file_path, *args, **kwargs):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        result = function(file_path, *args, **kwargs)
+        trace.record(
+            '/'.join(filter(None, [path, os.path.splitext(os.path.basename(file_path))[0]])),
+            start_seconds=wall - trace._start, wall_seconds=time.perf_counter() - wall,
+            cpu_seconds=time.thread_time() - cpu
+        )
+        return result
+
+    return wrapper
@@ -1,6 +1,17 @@
+from .sparse import SparseProblem
 from .generic import GenericModel
+from .admm import ADMM
+from .benders import Benders
 from .central import Central
 from .central_duals import CentralDuals
+from .central_sparse import CentralSparse
+from .lp_writer import LPWriter
+from .progressive_hedging import ProgressiveHedging
+from .rolling_horizon import RollingHorizon
 from .rural import Rural
 from .model_structure import ModelStructure
 
+
+MODELS = {'admm': ADMM, 'benders': Benders, 'central': Central, 'central_dual': CentralDuals,
+          'central_sparse': CentralSparse, 'progressive_hedging': ProgressiveHedging, 'rolling': RollingHorizon,
+          'rural': Rural}
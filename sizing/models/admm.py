@@ -0,0 +1,263 @@
+import multiprocessing
+import os
+import time
+import warnings
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sizing.core import OptimisationInputs
+from . import GenericModel
+from .central_sparse import CentralSparse
+from .generic import dual_families, sparse_results
+from .sparse import SparseProblem
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+RESIDUAL_RATIO = 10
+BALANCING_ITERATIONS = 100
+RHO_FACTOR = 2
+
+# Model of every worker process, set when the worker starts
+_admm = None
+
+
+class ADMM(GenericModel):
+    """
+    Planing problem of Central solved member by member with the alternating direction method of multipliers. The
+    local exchanges constraint (the community exports equal the community imports at every time step), the only one
+    coupling the members, is relaxed with one multiplier per time step: every member solves its own problem with the
+    local price and a quadratic penalty on its deviation from the balance, in parallel, and the prices are updated
+    with the imbalance of the community until the primal and dual residuals are below the tolerance.
+    """
+
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'highs', workers: int = 1, tolerance: float = 1e-3,
+                 max_iterations: int = 500, rho: float = None, is_debug: bool = False):
+        """
+        Constructor.
+        :param inputs: input data and parameters.
+        :param solver: name of the solver to use (the quadratic problems of the members are solved with HiGHS).
+        :param workers: number of groups of members solved in parallel.
+        :param tolerance: tolerance on the primal (energy) and dual (cost per energy) residuals, as root mean squares
+        over the time steps.
+        :param max_iterations: maximum number of iterations.
+        :param rho: initial penalty parameter (by default, the discounted average community import price). It is
+        adapted during the iterations to balance the residuals.
+        :param is_debug: flag to activate debug mode.
+        """
+        super().__init__(inputs, solver)
+        if highspy is None:
+            raise ImportError('The package highspy is required to solve the problems of the members with HiGHS.')
+        if self.inputs.period_sequence is not None:
+            raise NotImplementedError('Aggregated inputs (representative periods) are only supported by Central.')
+        if max_iterations < 1:
+            raise ValueError('The maximum number of iterations must be at least 1.')
+        self.workers = workers
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.rho = self.discount_factor * np.abs(self.inputs.prices_community_import_array).mean() if rho is None \
+            else rho
+        self.history = None
+        self._is_debug = is_debug
+        self._subproblems = dict()
+
+    def create_model(self, **kwargs) -> list:
+        """
+        Groups of members solved by every worker. The problem of every member is built when it is first solved.
+        :return: list of arrays with the positions of the members of every group.
+        """
+        return [group for group in np.array_split(np.arange(len(self.inputs.members)), self.workers) if len(group)]
+
+    def solve_model(self, model: list):
+        """
+        Iterates until the primal and dual residuals are below the tolerance and extracts the results of the members
+        and the local prices (duals of the local exchanges constraint).
+        :param model: groups of members (as returned by create_model).
+        :return results of the optimisation.
+        """
+        groups = model
+        number_time, number_members = len(self.inputs.time), len(self.inputs.members)
+        exchange = np.zeros((number_time, number_members))
+        average, scaled_price = np.zeros(number_time), np.zeros(number_time)
+        rho, history = self.rho, []
+
+        # One worker per group, which keeps the problems of its members (and their last solutions) between iterations
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        executors = []
+        if len(groups) > 1:
+            executors = [
+                ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_initialise_worker, initargs=(self,))
+                for _ in groups
+            ]
+        try:
+            for iteration in range(self.max_iterations):
+                tic = time.time()
+                target = exchange - (average + scaled_price)[:, np.newaxis]
+                new_exchange = np.column_stack(self._evaluate(executors, groups, target, rho))
+                new_average = new_exchange.mean(axis=1)
+                scaled_price += new_average
+
+                primal = np.linalg.norm(new_average * number_members) / np.sqrt(number_time)
+                dual = rho * np.linalg.norm(
+                    (new_exchange - new_average[:, np.newaxis]) - (exchange - average[:, np.newaxis])
+                ) / np.sqrt(number_time)
+                exchange, average = new_exchange, new_average
+
+                history.append({'iteration': iteration, 'primal_residual': primal, 'dual_residual': dual,
+                                'rho': rho, 'seconds': time.time() - tic})
+                print(f"ADMM iteration {iteration}: primal residual {primal:.6f}, dual residual {dual:.6f}, "
+                      f"rho {rho:.4f} ({history[-1]['seconds']:.2f} seconds).")
+                if primal <= self.tolerance and dual <= self.tolerance:
+                    break
+
+                # Residual balancing (only during the first iterations, so that the method converges with a fixed
+                # penalty): the scaled prices follow the penalty so that the prices are not changed
+                if iteration < BALANCING_ITERATIONS:
+                    if primal > RESIDUAL_RATIO * dual:
+                        rho, scaled_price = rho * RHO_FACTOR, scaled_price / RHO_FACTOR
+                    elif dual > RESIDUAL_RATIO * primal:
+                        rho, scaled_price = rho / RHO_FACTOR, scaled_price * RHO_FACTOR
+            else:
+                warnings.warn('ADMM not converged in {} iterations: primal residual {:.6f} and dual residual {:.6f} '
+                              '(tolerance {:.6f}). The results are those of the last iteration.'.format(
+                                  self.max_iterations, primal, dual, self.tolerance))
+
+            # Results of the last problems solved
+            solved = self._evaluate(executors, groups, target, rho, is_final=True)
+        finally:
+            for executor in executors:
+                executor.shutdown()
+
+        self.history = pd.DataFrame(history).set_index('iteration')
+        self.history.to_csv(os.path.join(self.inputs.output_path, 'admm_history.csv'))
+
+        # Local prices with the sign of the duals of the local exchanges constraint of Central
+        prices = pd.Series(-rho * scaled_price, index=self.inputs.time)
+
+        return self._post_process(solved, prices)
+
+    def solve_members(self, group: np.ndarray, target: np.ndarray, rho: float, is_final: bool = False) -> list:
+        """
+        Solves the problems of a group of members with the local prices and the quadratic penalty.
+        :param group: positions of the members.
+        :param target: net community exports targeted by every member of the group (array time x member).
+        :param rho: penalty parameter.
+        :param is_final: flag to return the results and the duals of the members instead of their exchanges.
+        :return: list of the net community exports (or of the tuples of results and duals) of every member.
+        """
+        solved = []
+        for k, member in enumerate(group):
+            if member not in self._subproblems:
+                self._subproblems[member] = self._subproblem(member)
+            problem, solver, net_exports, current_rho = self._subproblems[member]
+
+            if is_final:
+                # The last problem solved by this worker holds the solution of the member
+                results, duals = sparse_results(problem, self.inputs.duals)
+                duals.pop('dual_net_exports_rec_eqn', None)
+                solved.append((results, duals))
+                continue
+
+            if rho != current_rho:
+                solver.passHessian(SparseProblem.diagonal_hessian(problem.number_variables, net_exports, rho))
+                self._subproblems[member] = (problem, solver, net_exports, rho)
+            # The penalty on (net_exports - target)^2 adds linear terms to the costs
+            solver.changeColsCost(len(net_exports), net_exports.astype(np.int32), -rho * target[:, k])
+
+            if not problem.solve_highs(solver):
+                raise ValueError("Problem of member {} not properly solved (HiGHS status: {}).".format(
+                    self.inputs.members[member], solver.modelStatusToString(solver.getModelStatus())
+                ))
+            solved.append(problem.solution[net_exports])
+
+        return solved
+
+    def _subproblem(self, member: int) -> tuple:
+        """
+        Problem of a member: the constraints of Central without the local exchanges constraint, with the net community
+        exports of the member as variables (on which the penalty applies), loaded in HiGHS.
+        :param member: position of the member.
+        :return: tuple (sparse problem, HiGHS instance, positions of the net community exports, penalty parameter of
+        the Hessian loaded).
+        """
+        central = CentralSparse(inputs=self.inputs)
+        members = np.array([member])
+        problem = SparseProblem()
+        variables = central.add_variables(problem, members)
+        central.add_constraints(problem, variables, members, local_exchanges=False)
+        net_exports = problem.add_variables(
+            'net_exports_rec', self.inputs.time, self.inputs.members[members], lower=-np.inf
+        )
+        problem.add_constraints('_net_exports_rec_eqn', self.inputs.time, self.inputs.members[members], terms=[
+            (net_exports, 1.),
+            (variables['exports_rec'], -1.),
+            (variables['imports_rec'], 1.)
+        ])
+        problem.assemble()
+
+        solver = problem.to_highs()
+
+        return problem, solver, net_exports.ravel(), None
+
+    def _evaluate(self, executors: list, groups: list, target: np.ndarray, rho: float, is_final: bool = False) -> list:
+        """
+        Solves the problems of all the members, in parallel if there is a pool of workers.
+        :param executors: worker of every group (empty to solve the problems sequentially).
+        :param groups: positions of the members of every group.
+        :param target: net community exports targeted by every member (array time x member).
+        :param rho: penalty parameter.
+        :param is_final: flag to return the results and the duals of the members instead of their exchanges.
+        :return: list of the outputs of solve_members for every member, in the order of the members.
+        """
+        arguments = [(group, target[:, group], rho, is_final) for group in groups]
+        if not executors:
+            solved = [self.solve_members(*argument) for argument in arguments]
+        else:
+            futures = [executor.submit(_solve_members, argument) for executor, argument in zip(executors, arguments)]
+            solved = [future.result() for future in futures]
+
+        return [output for outputs in solved for output in outputs]
+
+    def _post_process(self, solved: list, prices: pd.Series):
+        """
+        Gathers the results and the duals of the members and adds the local prices.
+        :param solved: list of tuples (results, duals) of every member.
+        :param prices: local prices (duals of the local exchanges constraint).
+        :return results of the optimisation.
+        """
+        results, duals = dict(), dict()
+        for output, position in [(results, 0), (duals, 1)]:
+            for name in solved[0][position]:
+                values = [member[position][name] for member in solved]
+                if isinstance(values[0], pd.DataFrame) and name != 'optimal_capacity':
+                    output[name] = pd.concat(values, axis=1).sort_index(axis=1)
+                else:
+                    output[name] = pd.concat(values).sort_index()
+        if dual_families(['_local_exchanges_eqn'], self.inputs.duals):
+            duals['dual_local_exchanges_eqn'] = prices
+
+        self._save_results(inputs=self.inputs, results=results)
+        self._save_results(inputs=self.inputs, results=duals)
+
+        return results, duals
+
+
+def _initialise_worker(admm: ADMM):
+    """
+    Sets the model of a worker process.
+    """
+    global _admm
+    _admm = admm
+
+
+def _solve_members(arguments: tuple) -> list:
+    """
+    Solves the problems of a group of members in its worker process. The problems are built once and re-solved with
+    the new prices at every iteration.
+    """
+    return _admm.solve_members(*arguments)
@@ -0,0 +1,374 @@
+import multiprocessing
+import os
+import time
+import warnings
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sizing.core import OptimisationInputs
+from . import GenericModel
+from .central_sparse import CentralSparse
+from .generic import dual_families
+from .sparse import SparseProblem
+
+OPERATIONAL_FAMILIES = [
+    '_technology_generation_eqn', '_technology_consumption_eqn', '_state_of_charge_limit_eqn', '_limit_inflow_eqn',
+    '_limit_outflow_eqn', '_energy_balance_eqn', '_local_exchanges_eqn'
+]
+TIME_VARIABLES = [
+    'electricity_produced', 'electricity_consumed', 'imports_retailer', 'imports_rec', 'exports_retailer', 'exports_rec'
+]
+
+STALLED_ITERATIONS = 5
+
+# Model inherited by the workers (fork start method)
+_benders = None
+
+
+class Benders(GenericModel):
+    """
+    Planing problem of Central solved by Benders decomposition. A master problem chooses the capacities of the members
+    and the state of charge of the batteries at the boundaries between blocks of the horizon; the operational
+    subproblems of the blocks are solved (in parallel) with these values fixed and return optimality cuts built from
+    their duals. The boundaries make the decomposition exact: the master and the cuts of all the blocks together
+    describe the same problem as Central, except for the sign restriction of the total costs of every member, which
+    would couple all the blocks of the member and is not enforced (it only matters for members with net revenues).
+    """
+
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'highs', block_length: int = None, workers: int = 1,
+                 tolerance: float = 1e-3, max_iterations: int = 50, warm_start=None, stabilisation: float = 0.5,
+                 is_debug: bool = False):
+        """
+        Constructor.
+        :param inputs: input data and parameters.
+        :param solver: name of the solver to use (the master and the subproblems are solved with HiGHS).
+        :param block_length: number of time steps of every block (one week by default).
+        :param workers: number of subproblems solved in parallel.
+        :param tolerance: relative gap between the upper and the lower bounds at which the iterations stop.
+        :param max_iterations: maximum number of iterations.
+        :param warm_start: capacities evaluated at the first iteration (dataframe member x technology, e.g. from a
+        heuristic or a previous run). The initial capacities are evaluated by default.
+        :param stabilisation: weight of the master solution in the points evaluated by the subproblems (the rest of
+        the weight is given to the best point found so far), 1 to evaluate the master solutions.
+        :param is_debug: flag to activate debug mode.
+        """
+        super().__init__(inputs, solver)
+        if self.inputs.period_sequence is not None:
+            raise NotImplementedError('Aggregated inputs (representative periods) are only supported by Central.')
+        if max_iterations < 1:
+            raise ValueError('The maximum number of iterations must be at least 1.')
+        steps_per_day = int(pd.Timedelta(days=1) / (self.inputs.time[1] - self.inputs.time[0]))
+        self.block_length = 7 * steps_per_day if block_length is None else block_length
+        self.workers = workers
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.warm_start = warm_start
+        self.stabilisation = stabilisation
+        self.history = None
+        self._is_debug = is_debug
+        self._subproblems = dict()
+
+    def create_model(self, **kwargs) -> list:
+        """
+        Blocks of the decomposition. The subproblem of every block is built when it is first solved.
+        :return: list of the time steps of every block.
+        """
+        time = self.inputs.time
+        return [time[start:start + self.block_length] for start in range(0, len(time), self.block_length)]
+
+    def solve_model(self, model: list):
+        """
+        Iterates between the master problem and the subproblems until the relative gap between the bounds is below the
+        tolerance, and solves the subproblems a last time at the best capacities found to get the results.
+        :param model: blocks of the decomposition (as returned by create_model).
+        :return results of the optimisation.
+        """
+        global _benders
+
+        blocks = model
+        capacity = self._initial_point()
+        soc = np.zeros((len(blocks), len(self.inputs.members)))
+        cuts, history = [], []
+        best = (np.inf, capacity, soc)
+        lower_bound, stalled = -np.inf, 0
+
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        executor = None
+        if self.workers > 1:
+            if context.get_start_method() == 'fork':
+                _benders = self
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        try:
+            for iteration in range(self.max_iterations):
+                tic = time.time()
+                evaluated = self._evaluate(executor, blocks, capacity, soc)
+                cuts.append((capacity, soc, evaluated))
+
+                upper_bound = self._capacity_costs(capacity) + sum(cut[0] for cut in evaluated)
+                if upper_bound < best[0]:
+                    best = (upper_bound, capacity, soc)
+
+                master, positions = self._master_problem(blocks, cuts)
+                if not master.solve():
+                    raise ValueError("Master problem not properly solved (sparse problem solved with HiGHS is not "
+                                     "optimal).")
+                stalled = stalled + 1 if master.objective <= lower_bound + 1e-9 * abs(lower_bound) else 0
+                lower_bound = max(lower_bound, master.objective)
+
+                # In-out stabilisation: the next point is between the master solution and the best point found, or
+                # the master solution itself when the lower bound stalls
+                stabilisation = 1. if stalled >= STALLED_ITERATIONS else self.stabilisation
+                capacity = stabilisation * master.solution[positions[0]] + (1 - stabilisation) * best[1]
+                soc = stabilisation * master.solution[positions[1]] + (1 - stabilisation) * best[2]
+
+                gap = (best[0] - lower_bound) / max(abs(best[0]), 1e-9)
+                history.append({'iteration': iteration, 'lower_bound': lower_bound, 'upper_bound': best[0],
+                                'gap': gap, 'seconds': time.time() - tic})
+                print(f"Benders iteration {iteration}: lower bound {lower_bound:.2f}, upper bound {best[0]:.2f}, "
+                      f"gap {100 * gap:.4f} % ({history[-1]['seconds']:.2f} seconds).")
+                if gap <= self.tolerance:
+                    break
+            else:
+                warnings.warn('Benders decomposition not converged in {} iterations: gap {:.4%} above the tolerance '
+                              '{:.4%}. The results are those of the best capacities found.'.format(
+                                  self.max_iterations, gap, self.tolerance))
+
+            # Results at the best capacities
+            solved = self._evaluate(executor, blocks, best[1], best[2], is_final=True)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            _benders = None
+
+        self.history = pd.DataFrame(history).set_index('iteration')
+        self.history.to_csv(os.path.join(self.inputs.output_path, 'benders_history.csv'))
+
+        return self._post_process(solved, best[1])
+
+    def solve_block(self, block: int, times: pd.DatetimeIndex, capacity: np.ndarray, soc_start: np.ndarray,
+                    soc_end: np.ndarray, is_final: bool = False) -> tuple:
+        """
+        Solves the subproblem of one block with the capacities and the boundary states of charge fixed.
+        :param block: position of the block.
+        :param times: time steps of the block.
+        :param capacity: capacities of the members (array member x technology).
+        :param soc_start: state of charge of the batteries before the block.
+        :param soc_end: state of charge of the batteries at the end of the block.
+        :param is_final: flag to return the results and the duals of the block instead of a cut.
+        :return: tuple (operational costs, gradients with respect to the capacities, the start and the end state of
+        charge), or the results and the duals of the block.
+        """
+        if block not in self._subproblems:
+            self._subproblems[block] = self._subproblem(block, times)
+        m, v = self._subproblems[block]
+
+        for name, values in [('optimal_capacity', capacity), ('battery_soc_start', soc_start),
+                             ('battery_soc_end', soc_end)]:
+            m.col_lower[v[name]] = values
+            m.col_upper[v[name]] = values
+        if not m.solve():
+            raise ValueError("Subproblem of block {} not properly solved (sparse problem solved with HiGHS is not "
+                             "optimal).".format(block))
+
+        if is_final:
+            results = {name: m.get_values(name) for name in TIME_VARIABLES}
+            duals = {'dual{}'.format(name): m.get_duals(name)
+                     for name in dual_families(m.constraints, self.inputs.duals) if name != '_state_of_charge_end_eqn'}
+            return results, duals
+
+        return (
+            m.objective,
+            m.col_dual[v['optimal_capacity']],
+            m.col_dual[v['battery_soc_start']],
+            m.col_dual[v['battery_soc_end']]
+        )
+
+    def _subproblem(self, block: int, times: pd.DatetimeIndex) -> tuple:
+        """
+        Operational subproblem of a block: the constraints of Central over the block, without the annual costs, with
+        the capacities and the state of charge at the boundaries of the block as (fixed) variables.
+        :param block: position of the block.
+        :param times: time steps of the block.
+        :return: sparse problem and positions of its variables.
+        """
+        inputs = self.inputs.slice(time=times)
+        central = CentralSparse(inputs=inputs)
+        members = np.arange(len(inputs.members))
+        shape = (len(times), len(members))
+
+        m = SparseProblem()
+        v = central.add_variables(m, members)
+        central.add_constraints(m, v, members, families=OPERATIONAL_FAMILIES)
+        v['battery_soc_start'] = m.add_variables('battery_soc_start', inputs.members)
+        v['battery_soc_end'] = m.add_variables('battery_soc_end', inputs.members)
+
+        # The first time step of the horizon has no flows (cyclic condition of Central)
+        flows = np.ones((len(times), 1))
+        if block == 0:
+            flows[0] = 0.
+        previous = np.concatenate([v['battery_soc_start'][np.newaxis], v['battery_soc'][:-1]])
+        m.add_constraints('_state_of_charge_eqn', times, inputs.members, terms=[
+            (v['battery_soc'], 1.),
+            (previous, -1.),
+            (v['battery_inflow'], -self.inputs.efficiency_charge * flows),
+            (v['battery_outflow'], flows / self.inputs.efficiency_discharge)
+        ])
+        m.add_constraints('_state_of_charge_end_eqn', inputs.members, terms=[
+            (v['battery_soc'][-1], 1.),
+            (v['battery_soc_end'], -1.)
+        ])
+
+        # Operational costs of the block, the annual costs are not part of the subproblems
+        for name in ['annual_investment_costs', 'annual_operational_costs', 'annual_electricity_bills',
+                     'annual_electricity_revenue', 'total_costs']:
+            m.cost[v[name]], m.col_upper[v[name]] = 0., 0.
+        running_variable = inputs.cost_technology_running_variable_array.sum(axis=1)
+        for name, coefficients in [
+            ('electricity_produced', np.broadcast_to(running_variable, shape)),
+            ('electricity_consumed', np.broadcast_to(running_variable, shape)),
+            ('imports_retailer', inputs.prices_grid_import_array),
+            ('imports_rec', inputs.prices_community_import_array),
+            ('exports_retailer', -inputs.prices_grid_export_array),
+            ('exports_rec', -inputs.prices_community_export_array)
+        ]:
+            m.cost[v[name]] = self.discount_factor * coefficients
+        m.assemble()
+
+        return m, v
+
+    def _evaluate(self, executor, blocks: list, capacity: np.ndarray, soc: np.ndarray, is_final: bool = False) -> list:
+        """
+        Solves the subproblems of all the blocks, in parallel if there is a pool of workers.
+        :param executor: pool of workers (None to solve the subproblems sequentially).
+        :param blocks: time steps of every block.
+        :param capacity: capacities of the members.
+        :param soc: state of charge of the batteries at the start of every block (array block x member).
+        :param is_final: flag to return the results and the duals of the blocks instead of cuts.
+        :return: list of the outputs of solve_block, one per block.
+        """
+        arguments = [
+            (b, times, capacity, soc[b], soc[(b + 1) % len(blocks)], is_final) for b, times in enumerate(blocks)
+        ]
+        if executor is None:
+            return [self.solve_block(*argument) for argument in arguments]
+
+        # With fork, the workers inherit the model and keep their subproblems between iterations
+        return list(executor.map(_solve_block, [None if _benders is self else self] * len(arguments), arguments))
+
+    def _master_problem(self, blocks: list, cuts: list) -> tuple:
+        """
+        Master problem: capacity costs plus the approximation of the operational costs of every block by the cuts.
+        :param blocks: time steps of every block.
+        :param cuts: list of tuples (capacities, states of charge, outputs of the subproblems) of every iteration.
+        :return: sparse problem and positions of the capacities and of the boundary states of charge.
+        """
+        members, technologies = self.inputs.members, self.inputs.technologies
+        battery = self.inputs.technology_position['b']
+        labels = pd.RangeIndex(len(blocks))
+        investment = self.inputs.cost_technology_investment_array * self.annuity_factor
+
+        m = SparseProblem()
+        capacity = m.add_variables(
+            'optimal_capacity', members, technologies, lower=self.inputs.initial_capacity_array, upper=1000,
+            cost=self.discount_factor * (investment + self.inputs.cost_technology_running_fixed_array)
+        )
+        soc = m.add_variables('battery_soc_boundary', labels, members)
+        theta = m.add_variables('operational_costs', labels, lower=-np.inf, cost=1.)
+        m.offset = -self.discount_factor * (self.inputs.initial_capacity_array * investment).sum()
+
+        shape = (len(blocks), len(members))
+        capacity_battery = np.broadcast_to(capacity[:, battery], shape)
+        m.add_constraints('_state_of_charge_boundary_eqn', labels, members, terms=[
+            (soc, 1.),
+            (capacity_battery, -1.)
+        ], lower=-np.inf)
+
+        # The battery must be able to move between the boundaries of every block, so that the subproblems are feasible
+        steps = np.array([len(times) for times in blocks], dtype=float)[:, np.newaxis]
+        steps[0] -= 1
+        m.add_constraints('_charge_boundary_eqn', labels, members, terms=[
+            (np.roll(soc, -1, axis=0), 1.),
+            (soc, -1.),
+            (capacity_battery, -steps * self.inputs.efficiency_charge / self.inputs.charge_rate)
+        ], lower=-np.inf)
+        m.add_constraints('_discharge_boundary_eqn', labels, members, terms=[
+            (soc, 1.),
+            (np.roll(soc, -1, axis=0), -1.),
+            (capacity_battery, -steps / (self.inputs.discharge_rate * self.inputs.efficiency_discharge))
+        ], lower=-np.inf)
+
+        # Optimality cuts of every block and iteration
+        value = np.array([[cut[0] for cut in evaluated] for _, _, evaluated in cuts])
+        gradient_capacity = np.array([[cut[1] for cut in evaluated] for _, _, evaluated in cuts])
+        gradient_start = np.array([[cut[2] for cut in evaluated] for _, _, evaluated in cuts])
+        gradient_end = np.array([[cut[3] for cut in evaluated] for _, _, evaluated in cuts])
+        point_capacity = np.array([point for point, _, _ in cuts])
+        point_start = np.array([point for _, point, _ in cuts])
+        point_end = np.roll(point_start, -1, axis=1)
+        constant = (
+            value -
+            (gradient_capacity * point_capacity[:, np.newaxis]).sum(axis=(2, 3)) -
+            (gradient_start * point_start).sum(axis=2) -
+            (gradient_end * point_end).sum(axis=2)
+        )
+        shape = value.shape
+        m.add_constraints('_optimality_cuts_eqn', pd.RangeIndex(len(cuts)), labels, terms=[
+            (np.broadcast_to(theta, shape), 1.),
+            (np.broadcast_to(capacity, shape + capacity.shape), -gradient_capacity),
+            (np.broadcast_to(soc, shape + (len(members),)), -gradient_start),
+            (np.broadcast_to(np.roll(soc, -1, axis=0), shape + (len(members),)), -gradient_end)
+        ], lower=constant, upper=np.inf)
+        m.assemble()
+
+        return m, (capacity, soc)
+
+    def _initial_point(self) -> np.ndarray:
+        """
+        Capacities evaluated at the first iteration: the warm start (within the bounds of the capacities) or the
+        initial capacities.
+        """
+        if self.warm_start is None:
+            return self.inputs.initial_capacity_array.copy()
+        warm_start = self.warm_start
+        if isinstance(warm_start, pd.DataFrame):
+            warm_start = warm_start.reindex(index=self.inputs.members, columns=self.inputs.technologies).fillna(0.)
+        return np.clip(np.asarray(warm_start, dtype=float), self.inputs.initial_capacity_array, 1000)
+
+    def _capacity_costs(self, capacity: np.ndarray) -> float:
+        """
+        Discounted investment and fixed running costs of the capacities.
+        """
+        return self.discount_factor * (
+            ((capacity - self.inputs.initial_capacity_array) * self.inputs.cost_technology_investment_array).sum() *
+            self.annuity_factor +
+            (capacity * self.inputs.cost_technology_running_fixed_array).sum()
+        )
+
+    def _post_process(self, solved: list, capacity: np.ndarray):
+        """
+        Stitches the results of the blocks and computes the annual results of the members over the whole horizon.
+        :param solved: list of tuples (results, duals) of every block.
+        :param capacity: capacities of the members.
+        :return results of the optimisation.
+        """
+        results = {name: pd.concat([block[0][name] for block in solved]) for name in solved[0][0]}
+        duals = {name: pd.concat([block[1][name] for block in solved]) for name in solved[0][1]}
+
+        results.update(self._annual_results(results, capacity))
+
+        self._save_results(inputs=self.inputs, results=results)
+        self._save_results(inputs=self.inputs, results=duals)
+
+        return results, duals
+
+
+def _solve_block(benders: Benders, arguments: tuple):
+    """
+    Solves the subproblem of a block in a worker process. The subproblems are built once per worker and re-solved
+    with the new capacities at every iteration.
+    """
+    benders = benders or _benders
+    return benders.solve_block(*arguments)
@@ -1,8 +1,10 @@
-import pandas as pd
+import itertools
+
 import pyomo.environ as pyo
 
 from sizing.core import OptimisationInputs
 from . import GenericModel
+from .generic import MUTABLE_MEMBER_TABLES, MUTABLE_TIME_SERIES
 
 
 class Central(GenericModel):
@@ -10,56 +12,110 @@ class Central(GenericModel):
     Planing problem from a fully centralised optimisation standpoint.
     """
 
-    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc', is_debug: bool = False):
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc', is_debug: bool = False, **kwargs):
         """
         Constructor.
         :param inputs: input data and parameters.
         :param solver: name of the solver to use.
         :param is_debug: flag to activate debug mode.
+        :param kwargs: options of the solver portfolio (see GenericModel).
         """
-        super().__init__(inputs, solver)
+        super().__init__(inputs, solver, **kwargs)
         self._is_debug = is_debug
 
-    def create_model(self, **kwargs):
+    def create_model(self, mutable: bool = False, **kwargs):
         """
         Optimisation model.
+        :param mutable: flag to declare the prices, the technology costs and the annuity and discount factors as mutable
+        parameters, so that the model can be re-solved for several variants with solve_variants.
+        For aggregated inputs (OptimisationInputs.aggregate), the annual costs are weighted by the number of periods
+        represented by every time step and the storage is linked between consecutive periods.
         :return: model
         """
+        # Positions of the labels and aligned coefficients (as nested lists to read native floats by position)
+        time = list(self.inputs.time)
+        time_position = self.inputs.time_position
+        member_position = self.inputs.member_position
+        technology_position = self.inputs.technology_position
+        coefficients = self._coefficients()
+        demand, generation = coefficients['demand'], coefficients['generation']
+        initial_capacity = coefficients['initial_capacity']
+        annuity_factor, discount_factor = self.annuity_factor, self.discount_factor
+        # Representative periods (aggregated inputs): weight of every time step and sequence of periods over the horizon
+        weight = self.inputs.time_weight_array.tolist()
+        period_length = self.inputs.period_length
+        sequence = None if self.inputs.period_sequence is None else self.inputs.period_sequence.tolist()
+
         def _initialise_optimal_capacity(m, u, n):
             """
             Defines the initial optimal capacity of the REC members.
             """
-            return self.inputs.initial_capacity.loc[u, n], 1000
+            return initial_capacity[member_position[u]][technology_position[n]], 1000
 
         # Linear program
         m = pyo.ConcreteModel()
 
-        # Extraction dual variables
-        m.dual = pyo.Suffix(direction=pyo.Suffix.IMPORT)
+        # Extraction dual variables (unless no constraint family is selected in the inputs)
+        if self.inputs.duals is None or len(self.inputs.duals):
+            self._add_component(m, 'dual', pyo.Suffix(direction=pyo.Suffix.IMPORT))
 
         # Sets
-        m.time = pyo.Set(initialize=self.inputs.demand.index)
-        m.member = pyo.Set(initialize=self.inputs.demand.columns)
-        m.technology = pyo.Set(initialize=['p', 'b'])
+        m.time = pyo.Set(initialize=time)
+        m.member = pyo.Set(initialize=self.inputs.members)
+        m.technology = pyo.Set(initialize=self.inputs.technologies)
+        if sequence is not None:
+            m.period = pyo.Set(initialize=range(len(sequence)))
+            m.representative = pyo.Set(initialize=range(len(time) // period_length))
+
+        if mutable:
+            # Mutable parameters, arranged as the nested lists of values so that the rules read them by position
+            m.annuity_factor = pyo.Param(initialize=annuity_factor, mutable=True)
+            m.discount_factor = pyo.Param(initialize=discount_factor, mutable=True)
+            annuity_factor, discount_factor = m.annuity_factor, m.discount_factor
+            for file, index, columns in (
+                    [(file, time, self.inputs.members) for file in MUTABLE_TIME_SERIES] +
+                    [(file, self.inputs.members, self.inputs.technologies) for file in MUTABLE_MEMBER_TABLES]
+            ):
+                values = itertools.chain(*coefficients[file])
+                setattr(m, file, pyo.Param(
+                    index, columns, initialize=dict(zip(itertools.product(index, columns), values)), mutable=True
+                ))
+                data = list(getattr(m, file).values())
+                coefficients[file] = [data[i:i + len(columns)] for i in range(0, len(data), len(columns))]
+
+        prices_grid_import = coefficients['prices_grid_import']
+        prices_grid_export = coefficients['prices_grid_export']
+        prices_community_import = coefficients['prices_community_import']
+        prices_community_export = coefficients['prices_community_export']
+        cost_technology_investment = coefficients['cost_technology_investment']
+        cost_technology_running_fixed = coefficients['cost_technology_running_fixed']
+        cost_technology_running_variable = coefficients['cost_technology_running_variable']
 
         # Decision variables
-        m.optimal_capacity = pyo.Var(m.member, m.technology, bounds=_initialise_optimal_capacity)
-        m.electricity_produced = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.electricity_consumed = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.imports_retailer = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.imports_rec = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.exports_retailer = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.exports_rec = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.battery_outflow = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.battery_inflow = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.battery_soc = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
+        self._add_component(m, 'optimal_capacity', pyo.Var(m.member, m.technology, bounds=_initialise_optimal_capacity))
+        self._add_component(m, 'electricity_produced', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'electricity_consumed', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'imports_retailer', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'imports_rec', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'exports_retailer', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'exports_rec', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'battery_outflow', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'battery_inflow', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        if sequence is None:
+            self._add_component(m, 'battery_soc', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        else:
+            # Change of charge since the start of the representative period, on top of the level between periods
+            self._add_component(m, 'battery_soc', pyo.Var(m.time, m.member, within=pyo.Reals))
+            self._add_component(m, 'battery_soc_inter', pyo.Var(m.period, m.member, within=pyo.NonNegativeReals))
+            self._add_component(m, 'battery_soc_max', pyo.Var(m.representative, m.member, within=pyo.NonNegativeReals))
+            self._add_component(m, 'battery_soc_min', pyo.Var(m.representative, m.member, within=pyo.NonPositiveReals))
 
         # Auxiliary variables
-        m.annual_investment_costs = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.annual_operational_costs = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.annual_electricity_bills = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.annual_electricity_revenue = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.total_costs = pyo.Var(m.member, within=pyo.NonNegativeReals)
+        self._add_component(m, 'annual_investment_costs', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'annual_operational_costs', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'annual_electricity_bills', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'annual_electricity_revenue', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'total_costs', pyo.Var(m.member, within=pyo.NonNegativeReals))
 
         ####################
         # Objective function
@@ -69,7 +125,7 @@ class Central(GenericModel):
             """
             Minimises the sum of costs (investment, operation, electricity) taking away the revenue.
             """
-            return pyo.quicksum(m.total_costs[u] for u in m.member) * self.discount_factor
+            return pyo.quicksum(m.total_costs[u] for u in m.member) * discount_factor
 
         #############
         # Constraints
@@ -89,10 +145,11 @@ class Central(GenericModel):
             """
             Annuity of the initial investments over the lifetime of the REC.
             """
+            j = member_position[u]
             return m.annual_investment_costs[u] == (
                 pyo.quicksum(
-                    (m.optimal_capacity[u, n] - self.inputs.initial_capacity.loc[u, n]) *
-                    self.inputs.cost_technology_investment.loc[u, n] * self.annuity_factor
+                    (m.optimal_capacity[u, n] - initial_capacity[j][technology_position[n]]) *
+                    cost_technology_investment[j][technology_position[n]] * annuity_factor
                     for n in m.technology
                 )
             )
@@ -101,11 +158,13 @@ class Central(GenericModel):
             """
             Annual operational costs.
             """
+            j = member_position[u]
             return m.annual_operational_costs[u] == (
                 pyo.quicksum(
-                    self.inputs.cost_technology_running_fixed.loc[u, n] * m.optimal_capacity[u, n] +
+                    m.optimal_capacity[u, n] * cost_technology_running_fixed[j][technology_position[n]] +
                     pyo.quicksum(
-                        self.inputs.cost_technology_running_variable * (m.electricity_produced[t, u] + m.electricity_consumed[t, u])
+                        (m.electricity_produced[t, u] + m.electricity_consumed[t, u]) *
+                        (cost_technology_running_variable[j][technology_position[n]] * weight[time_position[t]])
                         for t in m.time
                     )
                     for n in m.technology
@@ -116,10 +175,11 @@ class Central(GenericModel):
             """
             Annual electricity bills.
             """
+            j = member_position[u]
             return m.annual_electricity_bills[u] == (
                 pyo.quicksum(
-                    m.imports_retailer[t, u] * self.inputs.prices_grid_import.loc[t, u] +
-                    m.imports_rec[t, u] * self.inputs.prices_community_import.loc[t, u]
+                    m.imports_retailer[t, u] * (prices_grid_import[time_position[t]][j] * weight[time_position[t]]) +
+                    m.imports_rec[t, u] * (prices_community_import[time_position[t]][j] * weight[time_position[t]])
                     for t in m.time
                 )
             )
@@ -128,10 +188,11 @@ class Central(GenericModel):
             """
             Annual electricity revenue.
             """
+            j = member_position[u]
             return m.annual_electricity_revenue[u] == (
                 pyo.quicksum(
-                    m.exports_retailer[t, u] * self.inputs.prices_grid_export.loc[t, u] +
-                    m.exports_rec[t, u] * self.inputs.prices_community_export.loc[t, u]
+                    m.exports_retailer[t, u] * (prices_grid_export[time_position[t]][j] * weight[time_position[t]]) +
+                    m.exports_rec[t, u] * (prices_community_export[time_position[t]][j] * weight[time_position[t]])
                     for t in m.time
                 )
             )
@@ -141,7 +202,8 @@ class Central(GenericModel):
             Power generated by the different technologies.
             """
             return m.electricity_produced[t, u] == (
-                    self.inputs.generation.loc[t, u] * m.optimal_capacity[u, 'p'] + m.battery_outflow[t, u]
+                    generation[time_position[t]][member_position[u]] * m.optimal_capacity[u, 'p'] +
+                    m.battery_outflow[t, u]
             )
 
         def _technology_consumption(m, t, u):
@@ -154,14 +216,19 @@ class Central(GenericModel):
             """
             Computes the state of charge of the battery.
             """
-            if t == m.time[1]: # TODO: Are we sure this should not be m.time[0]?
-                return m.battery_soc[t, u] == m.battery_soc[m.time[-1], u]
+            i = time_position[t]
+            if sequence is not None and i % period_length == 0:
+                # Representative periods start from the level between periods (see _state_of_charge_inter)
+                previous = 0
+            elif i == 0:
+                return m.battery_soc[t, u] == m.battery_soc[time[-1], u]
             else:
-                return m.battery_soc[t, u] == (
-                    m.battery_soc[t-pd.Timedelta(minutes=self.frequency), u] +
-                    self.inputs.efficiency_charge * m.battery_inflow[t, u] -
-                    m.battery_outflow[t, u] / self.inputs.efficiency_discharge
-                )
+                previous = m.battery_soc[time[i - 1], u]
+            return m.battery_soc[t, u] == (
+                previous +
+                self.inputs.efficiency_charge * m.battery_inflow[t, u] -
+                m.battery_outflow[t, u] / self.inputs.efficiency_discharge
+            )
 
         def _state_of_charge_limit(m, t, u):
             """
@@ -169,6 +236,39 @@ class Central(GenericModel):
             """
             return m.battery_soc[t, u] <= m.optimal_capacity[u, 'b']
 
+        def _state_of_charge_inter(m, d, u):
+            """
+            Links the level of the battery between consecutive periods through the change of charge over their
+            representative period (cyclic over the horizon).
+            """
+            return m.battery_soc_inter[(d + 1) % len(sequence), u] == (
+                m.battery_soc_inter[d, u] + m.battery_soc[time[(sequence[d] + 1) * period_length - 1], u]
+            )
+
+        def _state_of_charge_max(m, t, u):
+            """
+            Maximum change of charge within the representative period.
+            """
+            return m.battery_soc[t, u] <= m.battery_soc_max[time_position[t] // period_length, u]
+
+        def _state_of_charge_min(m, t, u):
+            """
+            Minimum change of charge within the representative period.
+            """
+            return m.battery_soc[t, u] >= m.battery_soc_min[time_position[t] // period_length, u]
+
+        def _state_of_charge_period_limit(m, d, u):
+            """
+            Limits the maximum state of charge during every period to the capacity of the battery.
+            """
+            return m.battery_soc_inter[d, u] + m.battery_soc_max[sequence[d], u] <= m.optimal_capacity[u, 'b']
+
+        def _state_of_charge_period_lower(m, d, u):
+            """
+            Keeps the state of charge during every period non-negative.
+            """
+            return m.battery_soc_inter[d, u] + m.battery_soc_min[sequence[d], u] >= 0
+
         def _limit_inflow(m, t, u):
             """
             Limits the battery inflow.
@@ -186,7 +286,7 @@ class Central(GenericModel):
             Energy balance of the REC.
             """
             return (
-                self.inputs.demand.loc[t, u] +
+                demand[time_position[t]][member_position[u]] +
                 m.exports_retailer[t, u] +
                 m.exports_rec[t, u] +
                 m.electricity_consumed[t, u]
@@ -216,20 +316,38 @@ class Central(GenericModel):
         # Calling equations
         ###################
 
-        m.objective_eqn = pyo.Objective(rule=_objective_function, sense=pyo.minimize)
-        m._total_costs_eqn = pyo.Constraint(m.member, rule=_total_costs)
-        m._annual_investments_eqn = pyo.Constraint(m.member, rule=_annual_investments)
-        m._annual_operational_costs_eqn = pyo.Constraint(m.member, rule=_annual_operational_costs)
-        m._annual_electricity_bills_eqn = pyo.Constraint(m.member, rule=_annual_electricity_bills)
-        m._annual_electricity_revenue_eqn = pyo.Constraint(m.member, rule=_annual_electricity_revenue)
-        m._technology_generation_eqn = pyo.Constraint(m.time, m.member, rule=_technology_generation)
-        m._technology_consumption_eqn = pyo.Constraint(m.time, m.member, rule=_technology_consumption)
-        m._state_of_charge_eqn = pyo.Constraint(m.time, m.member, rule=_state_of_charge)
-        m._state_of_charge_limit_eqn = pyo.Constraint(m.time, m.member, rule=_state_of_charge_limit)
-        m._limit_inflow_eqn = pyo.Constraint(m.time, m.member, rule=_limit_inflow)
-        m._limit_outflow_eqn = pyo.Constraint(m.time, m.member, rule=_limit_outflow)
-        m._energy_balance_eqn = pyo.Constraint(m.time, m.member, rule=_energy_balance)
-        m._local_exchanges_eqn = pyo.Constraint(m.time, rule=_local_exchanges)
+        self._add_component(m, 'objective_eqn', pyo.Objective(rule=_objective_function, sense=pyo.minimize))
+        self._add_component(m, '_total_costs_eqn', pyo.Constraint(m.member, rule=_total_costs))
+        self._add_component(m, '_annual_investments_eqn', pyo.Constraint(m.member, rule=_annual_investments))
+        self._add_component(m, '_annual_operational_costs_eqn',
+                            pyo.Constraint(m.member, rule=_annual_operational_costs))
+        self._add_component(m, '_annual_electricity_bills_eqn',
+                            pyo.Constraint(m.member, rule=_annual_electricity_bills))
+        self._add_component(m, '_annual_electricity_revenue_eqn',
+                            pyo.Constraint(m.member, rule=_annual_electricity_revenue))
+        self._add_component(m, '_technology_generation_eqn',
+                            pyo.Constraint(m.time, m.member, rule=_technology_generation))
+        self._add_component(m, '_technology_consumption_eqn',
+                            pyo.Constraint(m.time, m.member, rule=_technology_consumption))
+        self._add_component(m, '_state_of_charge_eqn', pyo.Constraint(m.time, m.member, rule=_state_of_charge))
+        if sequence is None:
+            self._add_component(m, '_state_of_charge_limit_eqn',
+                                pyo.Constraint(m.time, m.member, rule=_state_of_charge_limit))
+        else:
+            self._add_component(m, '_state_of_charge_inter_eqn',
+                                pyo.Constraint(m.period, m.member, rule=_state_of_charge_inter))
+            self._add_component(m, '_state_of_charge_max_eqn',
+                                pyo.Constraint(m.time, m.member, rule=_state_of_charge_max))
+            self._add_component(m, '_state_of_charge_min_eqn',
+                                pyo.Constraint(m.time, m.member, rule=_state_of_charge_min))
+            self._add_component(m, '_state_of_charge_period_limit_eqn',
+                                pyo.Constraint(m.period, m.member, rule=_state_of_charge_period_limit))
+            self._add_component(m, '_state_of_charge_period_lower_eqn',
+                                pyo.Constraint(m.period, m.member, rule=_state_of_charge_period_lower))
+        self._add_component(m, '_limit_inflow_eqn', pyo.Constraint(m.time, m.member, rule=_limit_inflow))
+        self._add_component(m, '_limit_outflow_eqn', pyo.Constraint(m.time, m.member, rule=_limit_outflow))
+        self._add_component(m, '_energy_balance_eqn', pyo.Constraint(m.time, m.member, rule=_energy_balance))
+        self._add_component(m, '_local_exchanges_eqn', pyo.Constraint(m.time, rule=_local_exchanges))
         # m._limit_exports_eqn = pyo.Constraint(m.time, m.member, rule=_limit_exports)
 
         if self._is_debug:
@@ -0,0 +1,196 @@
+import numpy as np
+import scipy.sparse as sp
+
+from sizing.core import OptimisationInputs, trace
+from . import GenericModel
+from .sparse import SparseProblem
+
+
+class CentralSparse(GenericModel):
+    """
+    Planing problem from a fully centralised optimisation standpoint (same formulation as Central), assembled directly
+    as a sparse constraint matrix with vectorized blocks instead of Pyomo expressions.
+    """
+
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'highs', is_debug: bool = False, **kwargs):
+        """
+        Constructor.
+        :param inputs: input data and parameters.
+        :param solver: name of the solver to use (the matrix form is solved with HiGHS, the other solvers are passed an
+        equivalent Pyomo model, see generic.solve_sparse).
+        :param is_debug: flag to activate debug mode.
+        :param kwargs: options of the solver portfolio (see GenericModel).
+        """
+        super().__init__(inputs, solver, **kwargs)
+        self._is_debug = is_debug
+
+    def create_model(self, members=None, local_exchanges: bool = True, **kwargs) -> SparseProblem:
+        """
+        Optimisation model.
+        :param members: positions of the members to include in the model (all the members by default).
+        :param local_exchanges: flag to include the local exchanges constraint, the only one coupling the members.
+        :return: model
+        """
+        if self.inputs.period_sequence is not None:
+            raise NotImplementedError('Aggregated inputs (representative periods) are only supported by Central.')
+        members = np.arange(len(self.inputs.members)) if members is None else np.asarray(members)
+
+        # Linear program
+        m = SparseProblem()
+        with trace.stage('variables'):
+            variables = self.add_variables(m, members)
+        self.add_constraints(m, variables, members, local_exchanges=local_exchanges)
+        with trace.stage('assemble'):
+            m.assemble()
+
+        if self._is_debug:
+            sp.save_npz('{}/model.npz'.format(self.inputs.output_path), m.matrix)
+
+        return m
+
+    def add_variables(self, m: SparseProblem, members: np.ndarray) -> dict:
+        """
+        Adds the variables (with their bounds and objective coefficients) of the given members.
+        :param m: sparse problem.
+        :param members: positions of the members.
+        :return: dictionary with the positions of the variables (columns of the matrix) of every family.
+        """
+        time, technologies = self.inputs.time, self.inputs.technologies
+        labels = self.inputs.members[members]
+
+        # Decision variables
+        variables = dict()
+        variables['optimal_capacity'] = m.add_variables(
+            'optimal_capacity', labels, technologies, lower=self.inputs.initial_capacity_array[members], upper=1000
+        )
+        for name in ['electricity_produced', 'electricity_consumed', 'imports_retailer', 'imports_rec',
+                     'exports_retailer', 'exports_rec', 'battery_outflow', 'battery_inflow', 'battery_soc']:
+            variables[name] = m.add_variables(name, time, labels)
+
+        # Auxiliary variables
+        for name in ['annual_investment_costs', 'annual_operational_costs', 'annual_electricity_bills',
+                     'annual_electricity_revenue']:
+            variables[name] = m.add_variables(name, labels)
+
+        ####################
+        # Objective function
+        ####################
+
+        variables['total_costs'] = m.add_variables('total_costs', labels, cost=self.discount_factor)
+
+        return variables
+
+    def add_constraints(self, m: SparseProblem, variables: dict, members: np.ndarray, local_exchanges: bool = True,
+                        families: list = None):
+        """
+        Adds the constraints of the given members.
+        :param m: sparse problem.
+        :param variables: positions of the variables of every family (as returned by add_variables).
+        :param members: positions of the members.
+        :param local_exchanges: flag to include the local exchanges constraint.
+        :param families: names of the constraint families to add (all by default).
+        """
+        time, labels = self.inputs.time, self.inputs.members[members]
+        pv, battery = self.inputs.technology_position['p'], self.inputs.technology_position['b']
+        shape = (len(time), len(members))
+        v = variables
+
+        def _add(name, *args, **kwargs):
+            if families is None or name in families:
+                with trace.stage(name):
+                    m.add_constraints(name, *args, **kwargs)
+
+        #############
+        # Constraints
+        #############
+        # Rows are written as (left-hand side - right-hand side) with the constants moved to the bounds, as Pyomo does,
+        # so that the duals have the same sign as in Central.
+
+        _add('_total_costs_eqn', labels, terms=[
+            (v['total_costs'], 1.),
+            (v['annual_investment_costs'], -1.),
+            (v['annual_operational_costs'], -1.),
+            (v['annual_electricity_bills'], -1.),
+            (v['annual_electricity_revenue'], 1.)
+        ])
+
+        initial_capacity = self.inputs.initial_capacity_array[members]
+        investment = self.inputs.cost_technology_investment_array[members] * self.annuity_factor
+        constant_investment = -(initial_capacity * investment).sum(axis=1)
+        _add('_annual_investments_eqn', labels, terms=[
+            (v['annual_investment_costs'], 1.),
+            (v['optimal_capacity'], -investment)
+        ], lower=constant_investment, upper=constant_investment)
+
+        running_variable = self.inputs.cost_technology_running_variable_array[members].sum(axis=1)[:, np.newaxis]
+        _add('_annual_operational_costs_eqn', labels, terms=[
+            (v['annual_operational_costs'], 1.),
+            (v['optimal_capacity'], -self.inputs.cost_technology_running_fixed_array[members]),
+            (v['electricity_produced'].T, -running_variable),
+            (v['electricity_consumed'].T, -running_variable)
+        ])
+
+        _add('_annual_electricity_bills_eqn', labels, terms=[
+            (v['annual_electricity_bills'], 1.),
+            (v['imports_retailer'].T, -self.inputs.prices_grid_import_array[:, members].T),
+            (v['imports_rec'].T, -self.inputs.prices_community_import_array[:, members].T)
+        ])
+
+        _add('_annual_electricity_revenue_eqn', labels, terms=[
+            (v['annual_electricity_revenue'], 1.),
+            (v['exports_retailer'].T, -self.inputs.prices_grid_export_array[:, members].T),
+            (v['exports_rec'].T, -self.inputs.prices_community_export_array[:, members].T)
+        ])
+
+        _add('_technology_generation_eqn', time, labels, terms=[
+            (v['electricity_produced'], 1.),
+            (np.broadcast_to(v['optimal_capacity'][:, pv], shape), -self.inputs.generation_array[:, members]),
+            (v['battery_outflow'], -1.)
+        ])
+
+        _add('_technology_consumption_eqn', time, labels, terms=[
+            (v['battery_inflow'], 1.),
+            (v['electricity_consumed'], -1.)
+        ], lower=-np.inf)
+
+        # The first time step links the state of charge with the last one (cyclic condition)
+        first = np.zeros((len(time), 1), dtype=bool)
+        first[0] = True
+        _add('_state_of_charge_eqn', time, labels, terms=[
+            (v['battery_soc'], 1.),
+            (np.roll(v['battery_soc'], 1, axis=0), -1.),
+            (v['battery_inflow'], np.where(first, 0., -self.inputs.efficiency_charge)),
+            (v['battery_outflow'], np.where(first, 0., 1 / self.inputs.efficiency_discharge))
+        ])
+
+        capacity_battery = np.broadcast_to(v['optimal_capacity'][:, battery], shape)
+        _add('_state_of_charge_limit_eqn', time, labels, terms=[
+            (v['battery_soc'], 1.),
+            (capacity_battery, -1.)
+        ], lower=-np.inf)
+
+        _add('_limit_inflow_eqn', time, labels, terms=[
+            (v['battery_inflow'], 1.),
+            (capacity_battery, -1 / self.inputs.charge_rate)
+        ], lower=-np.inf)
+
+        _add('_limit_outflow_eqn', time, labels, terms=[
+            (v['battery_outflow'], 1.),
+            (capacity_battery, -1 / self.inputs.discharge_rate)
+        ], lower=-np.inf)
+
+        demand = self.inputs.demand_array[:, members]
+        _add('_energy_balance_eqn', time, labels, terms=[
+            (v['exports_retailer'], 1.),
+            (v['exports_rec'], 1.),
+            (v['electricity_consumed'], 1.),
+            (v['electricity_produced'], -1.),
+            (v['imports_retailer'], -1.),
+            (v['imports_rec'], -1.)
+        ], lower=-demand, upper=-demand)
+
+        if local_exchanges:
+            _add('_local_exchanges_eqn', time, terms=[
+                (v['exports_rec'], 1.),
+                (v['imports_rec'], -1.)
+            ])
@@ -30,15 +30,18 @@ class Decomposed(GenericModel):
             """
             Defines the initial optimal capacity of the REC members.
             """
-            return self.inputs.initial_capacity.loc[u, n], 1000
+            return (
+                self.inputs.initial_capacity_array[self.inputs.member_position[u], self.inputs.technology_position[n]],
+                1000
+            )
 
         # Linear program
         m = pyo.ConcreteModel()
 
         # Sets
-        m.time = pyo.Set(initialize=self.inputs.demand.index)
-        m.member = pyo.Set(initialize=self.inputs.demand.columns)
-        m.technology = pyo.Set(initialize=['p', 'b'])
+        m.time = pyo.Set(initialize=self.inputs.time)
+        m.member = pyo.Set(initialize=self.inputs.members)
+        m.technology = pyo.Set(initialize=self.inputs.technologies)
 
         # Decision variables
         m.optimal_capacity = pyo.Var(m.member, m.technology, bounds=_initialise_optimal_capacity)
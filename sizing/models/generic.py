@@ -1,13 +1,192 @@
 import os
+import sys
+import time
+import warnings
+
+import numpy as np
 import pandas as pd
 import pyomo.environ as pyo
 
 from abc import ABC
+from pyomo.core.expr.visitor import identify_variables
+
+from sizing.core import OptimisationInputs, OPTIONAL_TIME_SERIES, store_results, trace
+from sizing.utils import align_data, unstack_data
+from .portfolio import PORTFOLIO, PORTFOLIO_HISTORY_FILE, PORTFOLIO_SOLVER, PortfolioHistory, \
+    available_configurations, instance_class, race
+from .results import LazyResults
+from .sparse import SparseProblem
 
-from sizing.core import OptimisationInputs
-from sizing.utils import unstack_data
+try:
+    import highspy
+except ImportError:
+    highspy = None
 
 DEFAULT_FREQ = '15T'
+RESULT_VARIABLES = [
+    'optimal_capacity', 'annual_investment_costs', 'annual_operational_costs', 'annual_electricity_bills',
+    'annual_electricity_revenue', 'total_costs', 'imports_retailer', 'imports_rec', 'exports_retailer', 'exports_rec',
+    'electricity_produced', 'electricity_consumed'
+]
+MUTABLE_TIME_SERIES = OPTIONAL_TIME_SERIES
+MUTABLE_MEMBER_TABLES = [
+    'cost_technology_investment', 'cost_technology_running_fixed', 'cost_technology_running_variable'
+]
+MUTABLE_RATES = ['interest_rate', 'discount_rate', 'lifetime']
+# Coefficients of the Pyomo models, read by position from the arrays of the inputs
+COEFFICIENT_FILES = ['demand', 'generation', 'initial_capacity'] + MUTABLE_TIME_SERIES + MUTABLE_MEMBER_TABLES
+PERSISTENT_SOLVERS = {'highs': 'appsi_highs', 'appsi_highs': 'appsi_highs', 'highs-direct': 'appsi_highs',
+                      'gurobi': 'appsi_gurobi', 'cplex': 'appsi_cplex'}
+# In-process HiGHS (highspy) fed with the matrix form of the model, and solver used instead if it is not available
+DIRECT_SOLVER = 'highs-direct'
+FALLBACK_SOLVER = 'cbc'
+# Solvers of the sparse problems run on their matrix form with HiGHS (through SciPy), the other solvers are passed an
+# equivalent Pyomo model
+SPARSE_SOLVERS = ['highs', 'appsi_highs']
+# Steps of the solvers run as executables (Pyomo shell solvers), recorded as stages of the trace
+SHELL_SOLVER_STAGES = {'_presolve': 'solver_write', '_apply_solver': 'solver_run', '_postsolve': 'solver_read'}
+
+
+def result_variables(outputs: list = None) -> list:
+    """
+    Selects the result variables which are persisted.
+    :param outputs: names of the variables to persist (all the result variables if None).
+    :return: names of the variables selected, in the order of RESULT_VARIABLES.
+    """
+    if outputs is None:
+        return list(RESULT_VARIABLES)
+    unknown = set(outputs).difference(RESULT_VARIABLES)
+    if unknown:
+        raise KeyError('Outputs {} are not result variables. Please, select: {}.'.format(
+            sorted(unknown), ', '.join(RESULT_VARIABLES)
+        ))
+
+    return [name for name in RESULT_VARIABLES if name in outputs]
+
+
+def dual_families(names, duals: list = None) -> list:
+    """
+    Selects the constraint families whose duals are extracted.
+    :param names: names of the constraint families of a model (e.g. "_energy_balance_eqn").
+    :param duals: names of the families to extract, with or without the leading underscore (all the families if None).
+    :return: names of the families selected, in the order of the model.
+    """
+    if duals is None:
+        return list(names)
+    selected = {'_{}'.format(name.lstrip('_')) for name in duals}
+
+    return [name for name in names if name in selected]
+
+
+def suffix_size(suffix: pyo.Suffix) -> int:
+    """
+    Memory held by the values of a suffix (e.g. the duals), excluding the components they are attached to.
+    :param suffix: suffix.
+    :return: size in bytes.
+    """
+    entries = suffix._dict
+    return sys.getsizeof(entries) + sum(sys.getsizeof(entry) + sys.getsizeof(entry[1]) for entry in entries.values())
+
+
+def model_size(model, nonzeros: bool = True) -> dict:
+    """
+    Size of a model.
+    :param model: Pyomo model or sparse problem.
+    :param nonzeros: flag to count the nonzeros of a Pyomo model, which walks the expressions of all its constraints
+    and takes about half as long as building the model (the nonzeros of a sparse problem are always counted).
+    :return: dictionary with the numbers of variables, constraints and nonzeros of the constraint matrix (empty for
+    the decompositions).
+    """
+    if isinstance(model, SparseProblem):
+        matrix = model.matrix if model.matrix is not None else model.assemble()
+        return {'variables': model.number_variables, 'constraints': model.number_constraints,
+                'nonzeros': int(matrix.nnz)}
+    if not isinstance(model, pyo.Block):
+        # Decompositions build their models while they are solved
+        return dict()
+
+    constraints = list(model.component_data_objects(pyo.Constraint, active=True))
+    size = {'variables': sum(1 for _ in model.component_data_objects(pyo.Var)), 'constraints': len(constraints)}
+    if nonzeros:
+        size['nonzeros'] = sum(sum(1 for _ in identify_variables(c.body, include_fixed=False)) for c in constraints)
+    return size
+
+
+def sparse_results(model: SparseProblem, duals: list = None) -> tuple:
+    """
+    Extracts the results and the duals of a solved sparse problem, with the same names and shapes as the Pyomo models.
+    :param model: solved sparse problem.
+    :param duals: constraint families whose duals are extracted (all the families if None).
+    :return: dictionaries of results and duals.
+    """
+    results = {variable_name: model.get_values(variable_name) for variable_name in RESULT_VARIABLES}
+    duals = {'dual{}'.format(name): model.get_duals(name) for name in dual_families(model.constraints, duals)}
+
+    return results, duals
+
+
+def solve_sparse(problem: SparseProblem, solver_name: str, options: dict = None):
+    """
+    Solves a sparse problem with a solver, storing its solution and duals: in-process with HiGHS (highspy) for
+    "highs-direct", with HiGHS through SciPy on its matrix form (see SPARSE_SOLVERS), else through Pyomo on the
+    equivalent Pyomo model (see SparseProblem.to_pyomo).
+    :param problem: sparse problem.
+    :param solver_name: name of the solver.
+    :param options: options of the solver (not used by HiGHS through SciPy).
+    """
+    if solver_name == DIRECT_SOLVER:
+        with trace.stage('solver_write'):
+            solver = problem.to_highs()
+            for option, value in (options or dict()).items():
+                solver.setOptionValue(option, value)
+        with trace.stage('solver_run'):
+            is_optimal = problem.solve_highs(solver)
+        if not is_optimal:
+            raise ValueError("Problem not properly solved (status of HiGHS: {}).".format(
+                solver.modelStatusToString(solver.getModelStatus())
+            ))
+        return
+
+    if solver_name in SPARSE_SOLVERS:
+        with trace.stage('solver_run'):
+            is_optimal = problem.solve()
+        if not is_optimal:
+            raise ValueError("Problem not properly solved (sparse problem solved with HiGHS is not optimal).")
+        return
+
+    with trace.stage('solver_write'):
+        model = problem.to_pyomo()
+    opt = pyo.SolverFactory(solver_name)
+    opt.options.update(options or dict())
+    stages = SHELL_SOLVER_STAGES if hasattr(opt, '_apply_solver') else {'solve': 'solver_run'}
+    with trace.staged(opt, stages):
+        results = opt.solve(model, tee=True, keepfiles=False)
+    GenericModel._check_termination(results)
+    problem.load_pyomo(model)
+
+
+def solve_portfolio(problem: SparseProblem, model, model_name: str, history_path: str, racers: int = None) -> str:
+    """
+    Solves a linear model with the solver portfolio (see portfolio.race), the solution being loaded in its sparse
+    problem, and records the winner in the history of the races.
+    :param problem: matrix form of the model, assembled.
+    :param model: Pyomo model (None if the model is a sparse problem, which only the in-process configurations of HiGHS
+    can solve).
+    :param model_name: name of the model (e.g. "Central"), part of the class of the instance in the history.
+    :param history_path: path to the JSON file of the history of the races.
+    :param racers: number of configurations raced at once (see portfolio.race).
+    :return: name of the winning configuration.
+    """
+    history = PortfolioHistory(history_path)
+    key = instance_class(model_name, model_size(problem))
+    names = history.rank(key, available_configurations(PORTFOLIO, is_pyomo=model is not None))
+
+    tic = time.perf_counter()
+    with trace.stage('solver_run'):
+        winner, entered = race(problem, model, names, racers=racers)
+    history.record(key, entered, winner, time.perf_counter() - tic)
+
+    return winner
 
 
 class GenericModel(ABC):
@@ -15,67 +194,284 @@ class GenericModel(ABC):
     Generic object with generic methods shared by all models.
     """
 
-    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc'):
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc', portfolio_history: str = None,
+                 portfolio_racers: int = None):
         """
         Constructor.
         :param inputs: inputs for the simulation.
         :param solver: solver to be used to solve the model.
+        :param portfolio_history: JSON file of the races of the solver portfolio (in the output path by default).
+        :param portfolio_racers: number of configurations of the solver portfolio raced at once (see portfolio.race).
         """
         self.inputs = inputs
         self.solver_name = solver
+        self.solver_options = dict()
+        self.portfolio_history = portfolio_history
+        self.portfolio_racers = portfolio_racers
+        # Configuration which won the last race of the solver portfolio
+        self.portfolio_winner = None
         self.annuity_factor = self._compute_annuity_factor(self.inputs.interest_rate, self.inputs.lifetime)
         self.discount_factor = self._compute_discount_factor(self.inputs.discount_rate, self.inputs.lifetime)
-        self.frequency = self._infer_frequency(self.inputs.demand.index)
+        self.frequency = self._infer_frequency(self.inputs.time)
 
-    def _post_process(self, model: pyo.ConcreteModel):
+    def _post_process(self, model):
         """
         Extracts and processes the results of the optimisation.
         :param model: model containing the variables and equations to be solved.
         :return results of the optimisation.
         """
-        results = dict()
-        for variable_name in ['optimal_capacity', 'annual_investment_costs', 'annual_operational_costs',
-                              'annual_electricity_bills', 'annual_electricity_revenue', 'total_costs',
-                              'imports_retailer', 'imports_rec', 'exports_retailer', 'exports_rec',
-                              'electricity_produced', 'electricity_consumed']:
-            try:
-                # Get the value of the variable with the same name
-                data = getattr(model, variable_name).get_values()
-            except AttributeError:
-                raise AttributeError(
-                    """The argument "variable" only accepts "optimized_keys", "allocated_consumption",
-                    "verified_allocated_consumption", "locally_sold_production", "ssr_user" or "ssr_rec",
-                    otherwise leave it empty."""
-                )
-            output_data = pd.Series(data)
-            results[f'{variable_name}'] = unstack_data(output_data)
+        with trace.stage('extract_results'):
+            results, duals = self._extract_results(model, self.inputs.outputs)
+            if trace.is_active():
+                # The values are read here rather than when they are saved, to be measured apart
+                for name in results:
+                    with trace.stage(name):
+                        results.array(name)
+
+        with trace.stage('save_results'):
+            self._save_results(inputs=self.inputs, results=results)
+            self._save_results(inputs=self.inputs, results=duals)
+
+        return results, duals
+
+    def _coefficients(self) -> dict:
+        """
+        Coefficients of the Pyomo models aligned with the labels of the inputs, as nested lists (time x member or member
+        x technology) so that the rules read native floats by position (see the positions of the labels of the inputs,
+        e.g. OptimisationInputs.time_position).
+        :return: dictionary {name of the input file: nested lists of values}.
+        """
+        return {file: getattr(self.inputs, '{}_array'.format(file)).tolist() for file in COEFFICIENT_FILES}
+
+    def _annual_results(self, results: dict, capacity: np.ndarray) -> dict:
+        """
+        Computes the capacities and the annual results of the members from the time series of a solution, e.g.
+        stitched from problems solved over parts of the horizon.
+        :param results: time series of the results (dataframes time x member).
+        :param capacity: capacities of the members (array member x technology).
+        :return: dictionary with the capacities and the annual results, shaped as the results of the models.
+        """
+        def _array(name):
+            return results[name].reindex(index=self.inputs.time, columns=self.inputs.members).to_numpy()
+
+        annual = {
+            'annual_investment_costs': (
+                (capacity - self.inputs.initial_capacity_array) * self.inputs.cost_technology_investment_array
+            ).sum(axis=1) * self.annuity_factor,
+            'annual_operational_costs': (
+                (capacity * self.inputs.cost_technology_running_fixed_array).sum(axis=1) +
+                (_array('electricity_produced') + _array('electricity_consumed')).sum(axis=0) *
+                self.inputs.cost_technology_running_variable_array.sum(axis=1)
+            ),
+            'annual_electricity_bills': (
+                _array('imports_retailer') * self.inputs.prices_grid_import_array +
+                _array('imports_rec') * self.inputs.prices_community_import_array
+            ).sum(axis=0),
+            'annual_electricity_revenue': (
+                _array('exports_retailer') * self.inputs.prices_grid_export_array +
+                _array('exports_rec') * self.inputs.prices_community_export_array
+            ).sum(axis=0)
+        }
+        annual['total_costs'] = (
+            annual['annual_investment_costs'] + annual['annual_operational_costs'] +
+            annual['annual_electricity_bills'] - annual['annual_electricity_revenue']
+        )
+
+        annual_results = {
+            'optimal_capacity': pd.DataFrame(
+                capacity, index=self.inputs.members, columns=self.inputs.technologies
+            ).sort_index().sort_index(axis=1)
+        }
+        for name, values in annual.items():
+            annual_results[name] = pd.Series(values, index=self.inputs.members)
+
+        return annual_results
+
+    def _extract_results(self, model, outputs: list = None) -> tuple:
+        """
+        Extracts the values of the variables and the duals of the constraint families selected in the inputs (all
+        the families by default) of a solved model. The values of the variables are only read from the model when
+        they are first accessed.
+        :param model: solved model (Pyomo model or sparse problem).
+        :param outputs: names of the result variables (all the result variables by default).
+        :return: results (LazyResults) and dictionary of duals.
+        """
+        results = LazyResults(model, result_variables(outputs))
+        if isinstance(model, SparseProblem):
+            return results, {'dual{}'.format(name): model.get_duals(name)
+                             for name in dual_families(model.constraints, self.inputs.duals)}
 
         duals = dict()
-        for constraint in model.component_objects(pyo.Constraint, active=True):
-            indices = [i for i in constraint]
-            if type(indices[0]) == tuple:
-                index = pd.MultiIndex.from_tuples(indices)
-                dual_values = pd.Series(index=index)
-            else:
-                dual_values = pd.Series(index=indices)
-            for index in constraint:
-                dual_values[index] = model.dual[constraint[index]]
-            duals['dual{}'.format(constraint.name)] = unstack_data(dual_values)
-
-        self._save_results(inputs=self.inputs, results=results)
-        self._save_results(inputs=self.inputs, results=duals)
+        if model.component('dual') is None:
+            # The model does not import the duals (no family selected)
+            return results, duals
+        constraints = {constraint.name: constraint
+                       for constraint in model.component_objects(pyo.Constraint, active=True)}
+        for name in dual_families(constraints, self.inputs.duals):
+            # Duals gathered in the order of the indices and shaped in one step
+            with trace.stage('dual{}'.format(name)):
+                indices = list(constraints[name].keys())
+                values = np.fromiter((model.dual[c] for c in constraints[name].values()), dtype=float,
+                                     count=len(indices))
+                index = pd.MultiIndex.from_tuples(indices) if type(indices[0]) == tuple else pd.Index(indices)
+                duals['dual{}'.format(name)] = unstack_data(pd.Series(values, index=index))
 
         return results, duals
 
-    def solve_model(self, model: pyo.ConcreteModel):
+    def solve_model(self, model):
         """
-        Solves the model previously created.
-        :param model: model containing the variables and equations to be solved.
+        Solves the model previously created. With the solver "highs-direct", a linear model is solved in-process by
+        HiGHS (see _solve_direct), with the solver "portfolio", several solvers race on it (see _solve_portfolio), else
+        (or if the solvers are not installed) through Pyomo, which writes the problem for shell solvers and reads their
+        solution back.
+        :param model: model containing the variables and equations to be solved (Pyomo model or sparse problem).
         :return results of the optimisation.
         """
-        opt = pyo.SolverFactory(self.solver_name)
-        results = opt.solve(model, tee=True, keepfiles=False)
+        solver_name = self.solver_name
+        if solver_name in (DIRECT_SOLVER, PORTFOLIO_SOLVER):
+            try:
+                return self._solve_direct(model) if solver_name == DIRECT_SOLVER else self._solve_portfolio(model)
+            except (ImportError, NotImplementedError) as error:
+                warnings.warn('{} The model is solved with {} instead.'.format(error, FALLBACK_SOLVER))
+                solver_name = FALLBACK_SOLVER
+
+        if isinstance(model, SparseProblem):
+            solve_sparse(model, solver_name, self.solver_options)
+            return self._post_process(model)
+
+        opt = pyo.SolverFactory(solver_name)
+        opt.options.update(self.solver_options)
+        # Shell solvers write the problem file, run and write the solution file, read by Pyomo, in turn, while the
+        # other solvers are run as a whole
+        stages = SHELL_SOLVER_STAGES if hasattr(opt, '_apply_solver') else {'solve': 'solver_run'}
+        with trace.staged(opt, stages), trace.staged(model.solutions, {'load_from': 'solution_load'}):
+            results = opt.solve(model, tee=True, keepfiles=False)
+        self._check_termination(results)
+        if model.component('dual') is not None and trace.is_accounting_memory():
+            # The duals are loaded by the solvers along with the solution, the memory of the suffix is measured apart
+            trace.record_memory('dual', suffix_size(model.dual))
+
+        return self._post_process(model)
+
+    def _solve_direct(self, model):
+        """
+        Solves the model in-process with HiGHS (highspy): a Pyomo model is compiled into its matrix form, which is
+        passed to HiGHS without writing any file, and the solution and the duals are read back as arrays.
+        :param model: linear model (Pyomo model or sparse problem).
+        :return results of the optimisation.
+        """
+        if highspy is None:
+            raise ImportError('The package highspy is required by the solver {}.'.format(DIRECT_SOLVER))
+
+        with trace.stage('compile'):
+            problem = model if isinstance(model, SparseProblem) else SparseProblem.from_pyomo(model)
+        solve_sparse(problem, DIRECT_SOLVER, self.solver_options)
+
+        return self._post_process(problem)
+
+    def _solve_portfolio(self, model):
+        """
+        Solves a linear model with a portfolio of solvers and algorithms (see portfolio.PORTFOLIO) racing on disjoint
+        cores: the first optimal solution is kept and the other solvers are terminated. The winner is recorded in the
+        history of the races, by class of similar instances, from which the configurations are ranked and pruned.
+        :param model: linear model (Pyomo model or sparse problem, which only the in-process configurations of HiGHS
+        can solve).
+        :return results of the optimisation.
+        """
+        with trace.stage('solver_write'):
+            is_pyomo = not isinstance(model, SparseProblem)
+            problem = SparseProblem.from_pyomo(model) if is_pyomo else model
+            if problem.matrix is None:
+                problem.assemble()
+        history_path = self.portfolio_history or os.path.join(self.inputs.output_path, PORTFOLIO_HISTORY_FILE)
+        self.portfolio_winner = solve_portfolio(problem, model if is_pyomo else None, type(self).__name__, history_path,
+                                                self.portfolio_racers)
+
+        return self._post_process(problem)
 
+    def solve_variants(self, model, overrides: list) -> list:
+        """
+        Re-solves a model built with mutable parameters (create_model(mutable=True)) for several variants of the
+        prices, technology costs and rates. The model is built once and a single persistent solver is kept alive: only
+        the coefficients which change between variants are pushed to the solver, which re-solves from the previous
+        basis.
+        :param model: model built with mutable parameters.
+        :param overrides: list of dictionaries {parameter: value}, one per variant. The parameters are the rates
+        ("interest_rate", "discount_rate", "lifetime"), the prices and the technology costs, given as scalars,
+        dataframes or arrays aligned with the inputs. The parameters not overridden keep the values of the inputs.
+        :return: list of tuples (results, duals), one per variant, also saved in the subfolders "variant_<i>" of the
+        output path.
+        """
+        try:
+            opt = pyo.SolverFactory(PERSISTENT_SOLVERS[self.solver_name])
+        except KeyError:
+            raise ValueError('No persistent interface for the solver "{}". Please, select: {}.'.format(
+                self.solver_name, ', '.join(PERSISTENT_SOLVERS)
+            ))
+        # Only the values of the parameters change between variants
+        for option in ['check_for_new_or_removed_constraints', 'check_for_new_or_removed_vars',
+                       'check_for_new_or_removed_params', 'check_for_new_objective', 'update_constraints',
+                       'update_vars', 'update_named_expressions', 'update_objective']:
+            setattr(opt.update_config, option, False)
+
+        parameters = [name for name in ['annuity_factor', 'discount_factor'] + MUTABLE_TIME_SERIES +
+                      MUTABLE_MEMBER_TABLES if model.component(name) is not None]
+        data = {name: list(model.component(name).values()) for name in parameters}
+        current = {name: np.array([p.value for p in data[name]], dtype=float) for name in parameters}
+
+        variants = []
+        for i, override in enumerate(overrides):
+            values = self._variant_parameters(override)
+            for name in parameters:
+                for k in np.flatnonzero(values[name] != current[name]).tolist():
+                    data[name][k].set_value(values[name][k])
+                current[name] = values[name]
+
+            self._check_termination(opt.solve(model, tee=False))
+            results, duals = self._extract_results(model, self.inputs.outputs)
+
+            output_path = os.path.join(self.inputs.output_path, 'variant_{}'.format(i))
+            os.makedirs(output_path, exist_ok=True)
+            store_results(results, output_path, self.inputs.results_format, self.inputs.results_dtype)
+            store_results(duals, output_path, self.inputs.results_format, self.inputs.results_dtype)
+            # The values of this variant are captured before the model is re-solved
+            results.release()
+            variants.append((results, duals))
+
+        return variants
+
+    def _variant_parameters(self, override: dict) -> dict:
+        """
+        Values of the mutable parameters of a variant, flattened in the order of their indices.
+        :param override: dictionary {parameter: value} of the variant.
+        :return: dictionary {name of the parameter: array of values}.
+        """
+        unknown = set(override).difference(MUTABLE_RATES + MUTABLE_TIME_SERIES + MUTABLE_MEMBER_TABLES)
+        if unknown:
+            raise KeyError('Parameters {} cannot be overridden.'.format(sorted(unknown)))
+
+        rates = {rate: override.get(rate, getattr(self.inputs, rate)) for rate in MUTABLE_RATES}
+        values = {
+            'annuity_factor': np.array([self._compute_annuity_factor(rates['interest_rate'], rates['lifetime'])]),
+            'discount_factor': np.array([self._compute_discount_factor(rates['discount_rate'], rates['lifetime'])])
+        }
+        for name, index, columns in (
+                [(name, self.inputs.time, self.inputs.members) for name in MUTABLE_TIME_SERIES] +
+                [(name, self.inputs.members, self.inputs.technologies) for name in MUTABLE_MEMBER_TABLES]
+        ):
+            value = override.get(name, getattr(self.inputs, '{}_array'.format(name)))
+            if not isinstance(value, np.ndarray):
+                value = align_data(value, index, columns)
+            values[name] = np.broadcast_to(value, (len(index), len(columns))).ravel()
+
+        return values
+
+    @staticmethod
+    def _check_termination(results):
+        """
+        Checks that the solver found an optimal (or feasible) solution.
+        :param results: results returned by the solver.
+        """
         if (results.solver.status != pyo.SolverStatus.ok
                 or results.solver.termination_condition not in {
                     pyo.TerminationCondition.optimal,
@@ -85,8 +481,6 @@ class GenericModel(ABC):
             raise ValueError(f"""Problem not properly solved (status: {results.solver.status}, 
                 termination condition: {results.solver.termination_condition}).""")
 
-        return self._post_process(model)
-
     def create_model(self, inputs: OptimisationInputs):
         """
         Optimisation model.
@@ -95,15 +489,29 @@ class GenericModel(ABC):
         """
         raise NotImplementedError
 
+    @staticmethod
+    def _add_component(m: pyo.ConcreteModel, name: str, component):
+        """
+        Adds a component (e.g. a constraint family) to a model, its construction being recorded as a stage of the trace.
+        :param m: model.
+        :param name: name of the component.
+        :param component: component (not constructed).
+        """
+        with trace.stage(name):
+            m.add_component(name, component)
+
     @staticmethod
     def _save_results(inputs: OptimisationInputs, results: dict):
         """
-        Saves the results in csv files.
+        Saves the results in the format selected in the inputs (csv files by default), except the result variables
+        which are not selected in the inputs.
         :param inputs: input data and parameters.
         :param results: dictionary containing the results of the simulation..
         """
-        for key, values in results.items():
-            values.to_csv(os.path.join(inputs.output_path, '{}.csv'.format(key)))
+        if inputs.outputs is not None:
+            outputs = result_variables(inputs.outputs)
+            results = {name: results[name] for name in results if name in outputs or name not in RESULT_VARIABLES}
+        store_results(results, inputs.output_path, inputs.results_format, inputs.results_dtype)
 
     @staticmethod
     def _compute_annuity_factor(interest_rate: float, lifetime: int) -> float:
@@ -0,0 +1,188 @@
+import gzip
+import time
+
+import numpy as np
+
+from sizing.utils import peak_memory
+from .central_sparse import CentralSparse
+from .sparse import SparseProblem
+
+CONSTRAINT_FAMILIES = [
+    '_total_costs_eqn', '_annual_investments_eqn', '_annual_operational_costs_eqn', '_annual_electricity_bills_eqn',
+    '_annual_electricity_revenue_eqn', '_technology_generation_eqn', '_technology_consumption_eqn',
+    '_state_of_charge_eqn', '_state_of_charge_limit_eqn', '_limit_inflow_eqn', '_limit_outflow_eqn',
+    '_energy_balance_eqn'
+]
+ROWS_PER_CHUNK = 10000
+
+
+class LPWriter:
+    """
+    Streams the Central formulation to a file in CPLEX LP format (readable by CBC, HiGHS, CPLEX, Gurobi...).
+
+    The rows are generated constraint family by constraint family and member block by member block from the input
+    arrays, and written to the file as they are generated, so that the memory is bounded by one block of members
+    rather than by the whole model. Variables and rows are labelled by position: "name(time_member)",
+    "name(member_technology)" or "name(member)".
+    """
+
+    def __init__(self, model: CentralSparse, block_size: int = 50, compress: bool = False):
+        """
+        Constructor.
+        :param model: sparse central model providing the blocks of the formulation.
+        :param block_size: number of members per block.
+        :param compress: flag to compress the file with gzip.
+        """
+        if model.inputs.period_sequence is not None:
+            raise NotImplementedError('Aggregated inputs (representative periods) are only supported by Central.')
+        self._model = model
+        self._block_size = block_size
+        self._compress = compress
+        self.statistics = dict()
+
+    def write(self, path: str) -> dict:
+        """
+        Writes the model to a file.
+        :param path: path of the file (".gz" is appended when compressing).
+        :return: statistics of the writing (rows, nonzeros, seconds and peak resident memory in MB).
+        """
+        if self._compress and not path.endswith('.gz'):
+            path = '{}.gz'.format(path)
+        self.statistics = {'path': path, 'rows': 0, 'nonzeros': 0}
+
+        tic = time.time()
+        with (gzip.open(path, 'wt') if self._compress else open(path, 'w')) as outfile:
+            outfile.write('\\* Central *\\\n\nmin\nobjective_eqn:\n')
+            for members in self._blocks():
+                problem = SparseProblem()
+                self._model.add_variables(problem, members)
+                columns = np.flatnonzero(problem.cost)
+                outfile.writelines(self._terms(problem, members, columns, problem.cost[columns]))
+
+            outfile.write('\ns.t.\n\n')
+            for family in CONSTRAINT_FAMILIES:
+                for members in self._blocks():
+                    problem = SparseProblem()
+                    variables = self._model.add_variables(problem, members)
+                    self._model.add_constraints(problem, variables, members, families=[family])
+                    problem.assemble()
+                    self._write_rows(outfile, problem, members)
+            self._write_local_exchanges(outfile)
+
+            outfile.write('\nbounds\n')
+            for members in self._blocks():
+                problem = SparseProblem()
+                self._model.add_variables(problem, members)
+                self._write_bounds(outfile, problem, members)
+            outfile.write('\nend\n')
+
+        self.statistics['seconds'] = time.time() - tic
+        self.statistics['peak_memory'] = peak_memory()
+
+        return self.statistics
+
+    def _blocks(self):
+        """
+        Iterates over the positions of the members, by blocks.
+        """
+        number_members = len(self._model.inputs.members)
+        for start in range(0, number_members, self._block_size):
+            yield np.arange(start, min(start + self._block_size, number_members))
+
+    def _write_rows(self, outfile, problem: SparseProblem, members: np.ndarray):
+        """
+        Writes the rows of a block, by chunks of rows.
+        """
+        matrix = problem.matrix
+        for start in range(0, problem.number_constraints, ROWS_PER_CHUNK):
+            stop = min(start + ROWS_PER_CHUNK, problem.number_constraints)
+            rows = np.arange(start, stop)
+            names = self._labels(problem.constraints, rows, members)
+            first, last = matrix.indptr[start], matrix.indptr[stop]
+            terms = self._terms(problem, members, matrix.indices[first:last], matrix.data[first:last])
+            pointers = (matrix.indptr[start:stop + 1] - first).tolist()
+
+            lines = []
+            for k, (name, lower, upper) in enumerate(zip(
+                    names, problem.row_lower[start:stop].tolist(), problem.row_upper[start:stop].tolist()
+            )):
+                if lower == upper:
+                    senses = [('c_e_{}_', '=', upper)]
+                elif np.isinf(lower):
+                    senses = [('c_u_{}_', '<=', upper)]
+                elif np.isinf(upper):
+                    senses = [('c_l_{}_', '>=', lower)]
+                else:
+                    senses = [('r_l_{}_', '>=', lower), ('r_u_{}_', '<=', upper)]
+                row_terms = ''.join(terms[pointers[k]:pointers[k + 1]])
+                for label, sense, bound in senses:
+                    lines.append('{}:\n{}{} {}\n\n'.format(label.format(name), row_terms, sense, bound + 0.))
+                    self.statistics['nonzeros'] += pointers[k + 1] - pointers[k]
+                self.statistics['rows'] += len(senses)
+            outfile.writelines(lines)
+
+    def _write_local_exchanges(self, outfile):
+        """
+        Writes the local exchanges (the only constraint coupling all the members), by chunks of time steps.
+        """
+        number_time, number_members = len(self._model.inputs.time), len(self._model.inputs.members)
+        for start in range(0, number_time, max(1, ROWS_PER_CHUNK // number_members)):
+            lines = []
+            for t in range(start, min(start + max(1, ROWS_PER_CHUNK // number_members), number_time)):
+                terms = ''.join(
+                    '+1 exports_rec({0}_{1})\n-1 imports_rec({0}_{1})\n'.format(t, u) for u in range(number_members)
+                )
+                lines.append('c_e__local_exchanges_eqn({})_:\n{}= 0\n\n'.format(t, terms))
+            outfile.writelines(lines)
+            self.statistics['rows'] += len(lines)
+            self.statistics['nonzeros'] += 2 * number_members * len(lines)
+
+    def _write_bounds(self, outfile, problem: SparseProblem, members: np.ndarray):
+        """
+        Writes the bounds of the variables of a block which differ from the default ones (non-negative variables).
+        """
+        columns = np.flatnonzero((problem.col_lower != 0) | np.isfinite(problem.col_upper))
+        names = self._labels(problem.variables, columns, members)
+        outfile.writelines(
+            '   {} <= {} <= {}\n'.format(lower + 0., name, upper if np.isfinite(upper) else '+inf')
+            for name, lower, upper in zip(names, problem.col_lower[columns], problem.col_upper[columns])
+        )
+
+    def _terms(self, problem: SparseProblem, members: np.ndarray, columns: np.ndarray, values: np.ndarray):
+        """
+        Formats the linear terms of the given columns.
+        """
+        names = self._labels(problem.variables, columns, members)
+        return ['{:+} {}\n'.format(value, name) for value, name in zip(values.tolist(), names)]
+
+    def _labels(self, families: dict, positions: np.ndarray, members: np.ndarray) -> list:
+        """
+        Labels the given positions (columns or rows) of a block with their family and global indices.
+        :param families: variables or constraints of the block (name -> (offset, index, columns)).
+        :param positions: positions to label.
+        :param members: positions of the members of the block, to translate the local indices into global ones.
+        :return: list of labels.
+        """
+        names = list(families)
+        offsets = np.array([offset for offset, _, _ in families.values()])
+        family = np.searchsorted(offsets, positions, side='right') - 1
+        labels = []
+        for k in np.unique(family):
+            selected = family == k
+            offset, index, columns = families[names[k]]
+            local = positions[selected] - offset
+            member_first = index.equals(self._model.inputs.members[members])
+            if columns is None:
+                first = members[local] if member_first else local
+                labels.append((selected, ['{}({})'.format(names[k], i) for i in first.tolist()]))
+            else:
+                first, second = np.divmod(local, len(columns))
+                first, second = (members[first], second) if member_first else (first, members[second])
+                labels.append((
+                    selected, ['{}({}_{})'.format(names[k], i, j) for i, j in zip(first.tolist(), second.tolist())]
+                ))
+
+        result = np.empty(len(positions), dtype=object)
+        for selected, values in labels:
+            result[selected] = values
+        return result.tolist()
@@ -23,20 +23,23 @@ class ModelStructure:
 
         :param model: Pyomo model where sets and variables are initialised.
         """
-        def _initialise_optimal_capacity(model, m, n):
+        def _initialise_optimal_capacity(model, u, n):
             """
             Defines the initial optimal capacity of the REC members.
 
             :param model: Pyomo model.
-            :param m: Member m.
+            :param u: Member u.
             :param n: Technology n.
             """
-            return self.inputs.initial_capacity.loc[u, n], BOUND_TECH
+            return (
+                self.inputs.initial_capacity_array[self.inputs.member_position[u], self.inputs.technology_position[n]],
+                BOUND_TECH
+            )
 
         # Sets initialisation
-        model.time = pyo.Set(initialize=self.inputs.demand.index)
-        model.member = pyo.Set(initialize=self.inputs.demand.columns)
-        model.technology = pyo.Set(initialize=['p', 'b'])
+        model.time = pyo.Set(initialize=self.inputs.time)
+        model.member = pyo.Set(initialize=self.inputs.members)
+        model.technology = pyo.Set(initialize=self.inputs.technologies)
 
         # Decision variables initialisation
         model.optimal_capacity = pyo.Var(model.member, model.technology, bounds=_initialise_optimal_capacity)
@@ -0,0 +1,278 @@
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import traceback
+
+from multiprocessing.connection import wait
+
+import numpy as np
+import pyomo.environ as pyo
+
+from pyomo.common.tempfiles import TempfileManager
+
+from .sparse import SparseProblem
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+PORTFOLIO_SOLVER = 'portfolio'
+PORTFOLIO_HISTORY_FILE = 'portfolio_history.json'
+# Solver of the configurations which solve the matrix form of the model in-process with HiGHS (highspy)
+DIRECT_HIGHS = 'highs-direct'
+# Configurations raced by the portfolio: name -> (solver, options). The configurations of the other solvers solve the
+# Pyomo model through Pyomo.
+PORTFOLIO = {
+    'highs-simplex': (DIRECT_HIGHS, {'solver': 'simplex'}),
+    'highs-ipm': (DIRECT_HIGHS, {'solver': 'ipm'}),
+    'cbc-dual': ('cbc', {'dualSimplex': ''}),
+    'cbc-barrier': ('cbc', {'barrier': ''}),
+    'glpk': ('glpk', {}),
+}
+# Seconds given to a terminated racer to exit before it is killed
+TERMINATE_SECONDS = 5.
+# Number of races of similar instances that a configuration may lose in a row before it is pruned
+PRUNE_AFTER = 5
+
+
+def available_configurations(configurations: dict = None, is_pyomo: bool = True) -> list:
+    """
+    Configurations of the portfolio whose solver is installed.
+    :param configurations: configurations (PORTFOLIO by default).
+    :param is_pyomo: flag if the model is a Pyomo model, else only the configurations of "highs-direct" can solve it.
+    :return: names of the configurations available, in their order.
+    """
+    configurations = PORTFOLIO if configurations is None else configurations
+    available = []
+    for name, (solver, _) in configurations.items():
+        if solver == DIRECT_HIGHS:
+            is_available = highspy is not None
+        else:
+            is_available = is_pyomo and pyo.SolverFactory(solver).available(exception_flag=False)
+        if is_available:
+            available.append(name)
+
+    return available
+
+
+def instance_class(model_name: str, size: dict) -> str:
+    """
+    Class of similar instances whose races are gathered in the history: same model and number of variables within a
+    factor of two, e.g. "Central-14".
+    :param model_name: name of the model.
+    :param size: size of the instance (numbers of variables, constraints and nonzeros).
+    :return: class of the instance.
+    """
+    return '{}-{}'.format(model_name, int(size['variables']).bit_length())
+
+
+class PortfolioHistory:
+    """
+    Record of the races of the portfolio, by class of similar instances (see instance_class): number of races every
+    configuration entered, won and lost in a row, and duration of its wins, saved as JSON. The configurations are
+    ranked by their rate of wins and those which lost the last PRUNE_AFTER races of a class are no longer raced on it.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Constructor.
+        :param path: path to the JSON file of the history (kept in memory only if None).
+        """
+        self.path = path
+        self.classes = dict()
+        if path is not None and os.path.isfile(path):
+            with open(path) as infile:
+                self.classes = json.load(infile)
+
+    def rank(self, key: str, names: list) -> list:
+        """
+        Ranks the configurations for a class of instances, without those which have been pruned (the best ranked is
+        always kept).
+        :param key: class of the instance.
+        :param names: names of the configurations.
+        :return: names of the configurations, by decreasing rate of wins (configurations not yet raced rank in the
+        middle, ties in the order given).
+        """
+        statistics = self.classes.get(key, dict())
+
+        def _rate(name):
+            entry = statistics.get(name, {'entered': 0, 'wins': 0})
+            return (entry['wins'] + 1) / (entry['entered'] + 2)
+
+        ranked = sorted(names, key=_rate, reverse=True)
+        kept = [name for name in ranked if statistics.get(name, {}).get('losses_in_row', 0) < PRUNE_AFTER]
+
+        return kept or ranked[:1]
+
+    def record(self, key: str, entered: list, winner: str, seconds: float):
+        """
+        Records a race and saves the history.
+        :param key: class of the instance.
+        :param entered: names of the configurations raced.
+        :param winner: name of the winning configuration.
+        :param seconds: duration of the race.
+        """
+        statistics = self.classes.setdefault(key, dict())
+        for name in entered:
+            entry = statistics.setdefault(name, {'entered': 0, 'wins': 0, 'losses_in_row': 0, 'win_seconds': 0.})
+            entry['entered'] += 1
+            if name == winner:
+                entry['wins'] += 1
+                entry['losses_in_row'] = 0
+                entry['win_seconds'] += seconds
+            else:
+                entry['losses_in_row'] += 1
+
+        if self.path is not None:
+            temporary_path = '{}.tmp{}'.format(self.path, os.getpid())
+            with open(temporary_path, 'w') as outfile:
+                json.dump(self.classes, outfile, indent=2)
+            os.replace(temporary_path, self.path)
+
+
+def race(problem: SparseProblem, model: pyo.ConcreteModel, names: list, configurations: dict = None,
+         racers: int = None) -> tuple:
+    """
+    Races configurations of the portfolio on a model: each runs in a process of its own pinned to its own cores, the
+    first optimal solution is loaded in the sparse problem and the other processes (and their solvers) are terminated.
+    The processes are forked, so that they share the model with the parent process.
+    :param problem: matrix form of the model, assembled.
+    :param model: Pyomo model (None if the model is a sparse problem).
+    :param names: names of the configurations, by rank.
+    :param configurations: configurations (PORTFOLIO by default).
+    :param racers: number of configurations raced at once, the best ranked (by default, as many as cores, at least two).
+    When there are fewer cores than racers, the racers share the cores.
+    :return: name of the winning configuration and names of the configurations raced.
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise NotImplementedError('The solver portfolio requires the fork start method.')
+    if not names:
+        raise NotImplementedError('No solver of the portfolio is installed.')
+    configurations = PORTFOLIO if configurations is None else configurations
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    racers = min(len(names), racers or max(2, len(cores)))
+    entered = names[:racers]
+    if len(cores) >= racers:
+        groups = [cores[i::racers] for i in range(racers)]
+    else:
+        groups = [[cores[i % len(cores)]] for i in range(racers)]
+
+    context = multiprocessing.get_context('fork')
+    processes, receivers = dict(), dict()
+    directory = tempfile.TemporaryDirectory()
+    try:
+        for name, group in zip(entered, groups):
+            receiver, sender = context.Pipe(duplex=False)
+            # The racer closes the ends of the pipes kept by the parent, so that its writes fail once they are closed
+            process = context.Process(target=_run_configuration, args=(
+                problem, model, configurations[name], group, directory.name, sender, list(receivers) + [receiver]
+            ))
+            process.start()
+            sender.close()
+            processes[name], receivers[receiver] = process, name
+            # Each racer leads a process group (also set by the racer, whichever runs first), so that the shell
+            # solvers it runs are terminated with it
+            try:
+                os.setpgid(process.pid, process.pid)
+            except OSError:
+                pass
+
+        errors = dict()
+        while receivers:
+            for receiver in wait(list(receivers)):
+                name = receivers.pop(receiver)
+                try:
+                    message = receiver.recv()
+                except EOFError:
+                    # The process died without sending its solution (e.g. out of memory)
+                    processes[name].join()
+                    message = {'status': 'failed',
+                               'error': 'Process exited with code {}.'.format(processes[name].exitcode)}
+                receiver.close()
+                if message['status'] == 'optimal':
+                    problem.solution, problem.row_dual = message['solution'], message['row_dual']
+                    problem.col_dual, problem.objective = message['col_dual'], message['objective']
+                    return name, entered
+                errors[name] = message['error']
+        raise ValueError('Problem not properly solved by any solver of the portfolio ({}).'.format(
+            '; '.join('{}: {}'.format(name, error) for name, error in errors.items())
+        ))
+    finally:
+        for receiver in receivers:
+            receiver.close()
+        for process in processes.values():
+            if process.is_alive():
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except OSError:
+                    process.terminate()
+        for process in processes.values():
+            process.join(TERMINATE_SECONDS)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        directory.cleanup()
+
+
+def _run_configuration(problem: SparseProblem, model: pyo.ConcreteModel, configuration: tuple, cores: list,
+                       directory: str, connection, inherited: list):
+    """
+    Solves a model with a configuration of the portfolio (in a racing process) and sends the solution and the duals,
+    in the order of the columns and rows of the sparse problem, through the connection. The ends of the pipes of the
+    parent inherited by the fork are closed.
+    """
+    for receiver in inherited:
+        receiver.close()
+    os.setpgid(0, 0)
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    solver_name, options = configuration
+    # The files of the shell solvers are written in the folder of the race, removed with it
+    TempfileManager.tempdir = directory
+    try:
+        if solver_name == DIRECT_HIGHS:
+            solver = problem.to_highs()
+            solver.setOptionValue('threads', len(cores))
+            for option, value in options.items():
+                solver.setOptionValue(option, value)
+            if not problem.solve_highs(solver):
+                raise ValueError('Status of HiGHS: {}.'.format(solver.modelStatusToString(solver.getModelStatus())))
+            message = {'solution': problem.solution, 'row_dual': problem.row_dual, 'col_dual': problem.col_dual,
+                       'objective': problem.objective}
+        else:
+            opt = pyo.SolverFactory(solver_name)
+            opt.options.update(options)
+            results = opt.solve(model, tee=False, keepfiles=False)
+            if results.solver.termination_condition != pyo.TerminationCondition.optimal:
+                raise ValueError('Termination condition: {}.'.format(results.solver.termination_condition))
+            message = {'solution': _pyomo_solution(model), 'row_dual': _pyomo_duals(model), 'col_dual': None,
+                       'objective': pyo.value(next(model.component_data_objects(pyo.Objective, active=True)))}
+        connection.send(dict(status='optimal', **message))
+    except Exception as error:
+        connection.send({'status': 'failed', 'error': '{}: {}'.format(type(error).__name__, error),
+                         'traceback': traceback.format_exc()})
+    finally:
+        connection.close()
+
+
+def _pyomo_solution(model: pyo.ConcreteModel) -> np.ndarray:
+    """
+    Values of the variables of a solved Pyomo model, in the order of the columns of SparseProblem.from_pyomo.
+    """
+    return np.array([0. if v.value is None else v.value
+                     for variable in model.component_objects(pyo.Var, active=True) for v in variable.values()])
+
+
+def _pyomo_duals(model: pyo.ConcreteModel) -> np.ndarray:
+    """
+    Duals of the constraints of a solved Pyomo model, in the order of the rows of SparseProblem.from_pyomo (zeros if
+    the model does not import the duals).
+    """
+    duals = model.component('dual')
+    return np.array([0. if duals is None else duals.get(c, 0.)
+                     for constraint in model.component_objects(pyo.Constraint, active=True)
+                     for c in constraint.values() if c.active])
@@ -0,0 +1,257 @@
+import multiprocessing
+import os
+import time
+import warnings
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sizing.core import OptimisationInputs
+from . import GenericModel
+from .central_sparse import CentralSparse
+from .generic import sparse_results
+from .sparse import SparseProblem
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Smallest penalty parameter, relative to the largest one (capacities without costs are still penalised)
+MINIMUM_RHO = 1e-3
+
+# Model of every worker process, set when the worker starts
+_progressive_hedging = None
+
+
+class ProgressiveHedging(GenericModel):
+    """
+    Two-stage stochastic planning problem of a community: the capacities are decided before the scenario (demand and
+    generation) is known, and the operation is decided for every scenario. The extensive form (Central over every
+    scenario, with the same capacities) is solved scenario by scenario with progressive hedging: every scenario solves
+    Central with its own capacities, in parallel, penalised by the non-anticipativity multipliers and a quadratic term
+    on their deviation from the expected capacities, and the multipliers are updated until the capacities of the
+    scenarios agree.
+    """
+
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'highs', workers: int = None, tolerance: float = 1e-3,
+                 max_iterations: int = 100, rho: float = 1., is_debug: bool = False):
+        """
+        Constructor.
+        :param inputs: input data and parameters, with the probabilities of the scenarios (stochastic configuration).
+        :param solver: name of the solver to use (the problems of the scenarios are solved with HiGHS).
+        :param workers: number of groups of scenarios solved in parallel (one worker per scenario by default).
+        :param tolerance: tolerance on the expected deviation of the capacities of the scenarios from the expected
+        capacities, relative to the norm of the expected capacities.
+        :param max_iterations: maximum number of iterations.
+        :param rho: penalty parameter, as a multiple of the discounted annual cost of every capacity.
+        :param is_debug: flag to activate debug mode.
+        """
+        super().__init__(inputs, solver)
+        if highspy is None:
+            raise ImportError('The package highspy is required to solve the problems of the scenarios with HiGHS.')
+        if not self.inputs.stochastic:
+            raise ValueError('Progressive hedging requires the probabilities of the scenarios (stochastic inputs).')
+        if self.inputs.period_sequence is not None:
+            raise NotImplementedError('Aggregated inputs (representative periods) are only supported by Central.')
+        if max_iterations < 1:
+            raise ValueError('The maximum number of iterations must be at least 1.')
+        self.probabilities = np.asarray(self.inputs.stochastic, dtype=float)
+        self.probabilities /= self.probabilities.sum()
+        self.workers = len(self.probabilities) if workers is None else workers
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+
+        # Penalty parameter of every capacity proportional to its cost
+        costs = self.discount_factor * (
+            self.inputs.cost_technology_investment_array * self.annuity_factor +
+            self.inputs.cost_technology_running_fixed_array
+        ).ravel()
+        self.rho = rho * np.maximum(costs, MINIMUM_RHO * max(costs.max(), 1.))
+        self.history = None
+        self._is_debug = is_debug
+        self._subproblems = dict()
+
+    def create_model(self, **kwargs) -> list:
+        """
+        Groups of scenarios solved by every worker. The problem of every scenario is built when it is first solved.
+        :return: list of arrays with the positions of the scenarios of every group.
+        """
+        return [group for group in np.array_split(np.arange(len(self.probabilities)), self.workers) if len(group)]
+
+    def solve_model(self, model: list):
+        """
+        Iterates until the capacities of the scenarios agree, then solves every scenario with the expected capacities
+        and extracts the expected results (weighted by the probabilities of the scenarios).
+        :param model: groups of scenarios (as returned by create_model).
+        :return results of the optimisation.
+        """
+        groups = model
+        number_capacities = len(self.inputs.members) * len(self.inputs.technologies)
+        multipliers = np.zeros((len(self.probabilities), number_capacities))
+        average, history = None, []
+
+        # One worker per group, which keeps the problems of its scenarios (and their last solutions) between iterations
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        executors = []
+        if len(groups) > 1:
+            executors = [
+                ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_initialise_worker, initargs=(self,))
+                for _ in groups
+            ]
+        try:
+            for iteration in range(self.max_iterations):
+                tic = time.time()
+                # The first iteration solves the scenarios independently (wait-and-see solution)
+                solved = self._evaluate(executors, groups, multipliers, average)
+                capacities = np.array([capacity for capacity, _ in solved])
+                expected_cost = self.probabilities @ np.array([cost for _, cost in solved])
+
+                average = self.probabilities @ capacities
+                multipliers += self.rho * (capacities - average)
+
+                deviation = self.probabilities @ np.linalg.norm(capacities - average, axis=1)
+                deviation /= max(np.linalg.norm(average), 1.)
+                history.append({'iteration': iteration, 'deviation': deviation, 'expected_cost': expected_cost,
+                                'seconds': time.time() - tic})
+                print(f"Progressive hedging iteration {iteration}: deviation {deviation:.6f}, expected cost "
+                      f"{expected_cost:.2f} ({history[-1]['seconds']:.2f} seconds).")
+                if deviation <= self.tolerance:
+                    break
+            else:
+                warnings.warn('Progressive hedging not converged in {} iterations: deviation {:.6f} above the '
+                              'tolerance {:.6f}. The results are those of the expected capacities of the last '
+                              'iteration.'.format(self.max_iterations, deviation, self.tolerance))
+
+            # Operation of every scenario with the expected capacities
+            solved = self._evaluate(executors, groups, multipliers, average, is_final=True)
+        finally:
+            for executor in executors:
+                executor.shutdown()
+
+        self.history = pd.DataFrame(history).set_index('iteration')
+        self.history.to_csv(os.path.join(self.inputs.output_path, 'progressive_hedging_history.csv'))
+
+        return self._post_process(solved)
+
+    def solve_scenarios(self, group: np.ndarray, multipliers: np.ndarray, average: np.ndarray,
+                        is_final: bool = False) -> list:
+        """
+        Solves the problems of a group of scenarios with the non-anticipativity multipliers and the quadratic penalty.
+        :param group: positions of the scenarios.
+        :param multipliers: non-anticipativity multipliers of the scenarios of the group (array scenario x capacity).
+        :param average: expected capacities (None at the first iteration, which solves the scenarios independently).
+        :param is_final: flag to solve the scenarios with the expected capacities fixed and return their results and
+        duals.
+        :return: list of the tuples (capacities, cost) (or of the tuples of results and duals) of every scenario.
+        """
+        solved = []
+        for k, scenario in enumerate(group):
+            if scenario not in self._subproblems:
+                self._subproblems[scenario] = self._subproblem(scenario)
+            problem, solver, capacities, is_penalised = self._subproblems[scenario]
+            costs = problem.cost[capacities]
+
+            if is_final:
+                # Recourse problem: Central with the capacities fixed (to the expected capacities within their bounds)
+                fixed = np.clip(average, problem.col_lower[capacities], problem.col_upper[capacities])
+                problem.col_lower[capacities], problem.col_upper[capacities] = fixed, fixed
+                solver = problem.to_highs()
+            elif average is not None:
+                if not is_penalised:
+                    solver.passHessian(SparseProblem.diagonal_hessian(problem.number_variables, capacities, self.rho))
+                    self._subproblems[scenario] = (problem, solver, capacities, True)
+                # The penalty on (capacities - average)^2 adds linear terms to the costs
+                solver.changeColsCost(
+                    len(capacities), capacities.astype(np.int32), costs + multipliers[k] - self.rho * average
+                )
+
+            if not problem.solve_highs(solver):
+                raise ValueError("Problem of scenario {} not properly solved (HiGHS status: {}).".format(
+                    scenario + 1, solver.modelStatusToString(solver.getModelStatus())
+                ))
+
+            if is_final:
+                solved.append(sparse_results(problem, self.inputs.duals))
+            else:
+                # Cost of the scenario without the penalty
+                solution = problem.solution
+                solved.append((solution[capacities], problem.cost @ solution + problem.offset))
+
+        return solved
+
+    def _subproblem(self, scenario: int) -> tuple:
+        """
+        Problem of a scenario (Central with the demand and the generation of the scenario), loaded in HiGHS.
+        :param scenario: position of the scenario.
+        :return: tuple (sparse problem, HiGHS instance, positions of the capacities, flag of the quadratic penalty
+        loaded).
+        """
+        problem = CentralSparse(inputs=self.inputs.scenario(scenario + 1)).create_model()
+        offset = problem.variables['optimal_capacity'][0]
+        capacities = np.arange(offset, offset + len(self.inputs.members) * len(self.inputs.technologies))
+
+        return problem, problem.to_highs(), capacities, False
+
+    def _evaluate(self, executors: list, groups: list, multipliers: np.ndarray, average: np.ndarray,
+                  is_final: bool = False) -> list:
+        """
+        Solves the problems of all the scenarios, in parallel if there is a pool of workers.
+        :param executors: worker of every group (empty to solve the problems sequentially).
+        :param groups: positions of the scenarios of every group.
+        :param multipliers: non-anticipativity multipliers (array scenario x capacity).
+        :param average: expected capacities (None at the first iteration).
+        :param is_final: flag to return the results and the duals of the scenarios with the expected capacities.
+        :return: list of the outputs of solve_scenarios for every scenario, in the order of the scenarios.
+        """
+        arguments = [(group, multipliers[group], average, is_final) for group in groups]
+        if not executors:
+            solved = [self.solve_scenarios(*argument) for argument in arguments]
+        else:
+            futures = [executor.submit(_solve_scenarios, argument) for executor, argument in zip(executors, arguments)]
+            solved = [future.result() for future in futures]
+
+        return [output for outputs in solved for output in outputs]
+
+    def _post_process(self, solved: list):
+        """
+        Saves the results of every scenario and computes the expected results and duals.
+        :param solved: list of tuples (results, duals) of every scenario.
+        :return results of the optimisation.
+        """
+        for scenario, (results, duals) in enumerate(solved):
+            inputs = self.inputs.scenario(scenario + 1)
+            inputs.output_path = os.path.join(self.inputs.output_path, 'scenario_{}'.format(scenario + 1))
+            os.makedirs(inputs.output_path, exist_ok=True)
+            self._save_results(inputs=inputs, results=results)
+            self._save_results(inputs=inputs, results=duals)
+
+        results, duals = dict(), dict()
+        for output, position in [(results, 0), (duals, 1)]:
+            for name in solved[0][position]:
+                output[name] = sum(
+                    probability * scenario[position][name] for probability, scenario in zip(self.probabilities, solved)
+                )
+
+        self._save_results(inputs=self.inputs, results=results)
+        self._save_results(inputs=self.inputs, results=duals)
+
+        return results, duals
+
+
+def _initialise_worker(progressive_hedging: ProgressiveHedging):
+    """
+    Sets the model of a worker process.
+    """
+    global _progressive_hedging
+    _progressive_hedging = progressive_hedging
+
+
+def _solve_scenarios(arguments: tuple) -> list:
+    """
+    Solves the problems of a group of scenarios in its worker process. The problems are built once and re-solved with
+    the new multipliers at every iteration.
+    """
+    return _progressive_hedging.solve_scenarios(*arguments)
@@ -0,0 +1,107 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+
+from sizing.utils import unstack_data
+from .sparse import SparseProblem
+
+
+def read_values(model, name: str) -> tuple:
+    """
+    Reads the values of a family of variables of a solved model into an array, in the order of its indices.
+    :param model: solved model (Pyomo model or sparse problem).
+    :param name: name of the family of variables.
+    :return: tuple (array of values, labels of the values).
+    """
+    if isinstance(model, SparseProblem):
+        offset, index, columns = model.variables[name]
+        if columns is None:
+            return model.solution[offset:offset + len(index)].copy(), index
+        return (
+            model.solution[offset:offset + len(index) * len(columns)].copy(),
+            pd.MultiIndex.from_product([index, columns])
+        )
+
+    variable = model.component(name)
+    if variable is None:
+        raise KeyError('Variable "{}" not found in the model.'.format(name))
+    keys = list(variable.keys())
+    values = np.array([v.value for v in variable.values()], dtype=float)
+    labels = pd.MultiIndex.from_tuples(keys) if type(keys[0]) == tuple else pd.Index(keys)
+
+    return values, labels
+
+
+class LazyResults(MutableMapping):
+    """
+    Results of a solved model: the values of every variable are read into an array when it is first accessed, and
+    shaped as a dataframe (or a series) only when it is accessed as an item. The model can be released once the
+    values needed are captured.
+    """
+
+    def __init__(self, model, names: list):
+        """
+        Constructor.
+        :param model: solved model (Pyomo model or sparse problem).
+        :param names: names of the variables of the results (the keys of the mapping). Other variables of the model
+        can be accessed as long as the model is not released.
+        """
+        self._model = model
+        self._names = list(names)
+        self._arrays = dict()
+        self._frames = dict()
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Values of a variable, in the order of its indices.
+        :param name: name of the variable.
+        :return: array of values.
+        """
+        return self._capture(name)[0]
+
+    def release(self, names: list = None):
+        """
+        Captures the values of some variables and releases the model, so that it can be freed.
+        :param names: names of the variables to capture (the variables of the results by default). The variables
+        already captured are kept.
+        """
+        for name in self._names if names is None else names:
+            if name not in self._frames:
+                self._capture(name)
+        self._model = None
+
+    def _capture(self, name: str) -> tuple:
+        """
+        Reads the values of a variable from the model, once.
+        """
+        if name not in self._arrays:
+            if self._model is None:
+                raise KeyError('Variable "{}" was not captured before the model was released.'.format(name))
+            self._arrays[name] = read_values(self._model, name)
+        return self._arrays[name]
+
+    def __getitem__(self, name: str):
+        if name not in self._frames:
+            values, labels = self._capture(name)
+            self._frames[name] = unstack_data(pd.Series(values, index=labels))
+        return self._frames[name]
+
+    def __setitem__(self, name: str, value):
+        self._frames[name] = value
+        if name not in self._names:
+            self._names.append(name)
+
+    def __delitem__(self, name: str):
+        self._names.remove(name)
+        self._frames.pop(name, None)
+        self._arrays.pop(name, None)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
@@ -0,0 +1,147 @@
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing.core import OptimisationInputs
+from . import GenericModel
+from .central import Central
+
+# Model inherited by the workers (fork start method)
+_rolling_horizon = None
+
+
+class RollingHorizon(GenericModel):
+    """
+    Operational problem of a community whose capacities are already known (the initial capacities): the central
+    formulation is solved over overlapping windows of the horizon, with the optimal capacities fixed. Only the first
+    part of every window is kept (the rest is a look-ahead) and the state of charge of the batteries at the end of
+    the kept part is passed to the next window.
+    """
+
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc', window: int = None, look_ahead: int = None,
+                 workers: int = 1, is_debug: bool = False):
+        """
+        Constructor.
+        :param inputs: input data and parameters.
+        :param solver: name of the solver to use.
+        :param window: number of time steps kept from every window (one week by default).
+        :param look_ahead: number of extra time steps optimised at the end of every window (one day by default).
+        :param workers: number of windows solved in parallel. With more than one worker, the windows are independent:
+        the state of charge is cyclic within every window instead of being passed between windows.
+        :param is_debug: flag to activate debug mode.
+        """
+        super().__init__(inputs, solver)
+        steps_per_day = int(pd.Timedelta(days=1) / (self.inputs.time[1] - self.inputs.time[0]))
+        self.window = 7 * steps_per_day if window is None else window
+        self.look_ahead = steps_per_day if look_ahead is None else look_ahead
+        self.workers = workers
+        self._is_debug = is_debug
+
+    def create_model(self, **kwargs) -> list:
+        """
+        Windows of the rolling horizon. The Pyomo model of every window is built when the window is solved.
+        :return: list of tuples (time steps kept, time steps optimised) of every window.
+        """
+        time = self.inputs.time
+        return [
+            (time[start:start + self.window], time[start:start + self.window + self.look_ahead])
+            for start in range(0, len(time), self.window)
+        ]
+
+    def solve_model(self, model: list):
+        """
+        Solves the windows (sequentially, passing the state of charge, or in parallel) and stitches their results.
+        :param model: windows of the rolling horizon (as returned by create_model).
+        :return results of the optimisation.
+        """
+        global _rolling_horizon
+
+        if self.workers > 1:
+            context = multiprocessing.get_context(
+                'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+            )
+            _rolling_horizon = self
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+                    solved = list(executor.map(
+                        _solve_window,
+                        [None if context.get_start_method() == 'fork' else self] * len(model),
+                        model
+                    ))
+            finally:
+                _rolling_horizon = None
+        else:
+            solved, initial_soc = [], pd.Series(0., index=self.inputs.members)
+            for window in model:
+                results, duals, initial_soc = self.solve_window(window, initial_soc)
+                solved.append((results, duals, initial_soc))
+
+        return self._post_process(solved)
+
+    def solve_window(self, window: tuple, initial_soc: pd.Series = None) -> tuple:
+        """
+        Solves one window with the capacities fixed.
+        :param window: tuple (time steps kept, time steps optimised).
+        :param initial_soc: state of charge of every member before the window (None for a cyclic state of charge).
+        :return: results and duals restricted to the time steps kept, and state of charge at the end of them.
+        """
+        kept, optimised = window
+        central = Central(inputs=self.inputs.slice(time=optimised), solver=self.solver_name)
+        m = central.create_model()
+
+        for capacity in m.optimal_capacity.values():
+            capacity.fix(capacity.lb)
+
+        if initial_soc is not None:
+            # The first time step starts from the state of charge at the end of the previous window
+            first = optimised[0]
+            for u in m.member:
+                m._state_of_charge_eqn[first, u].set_value(
+                    m.battery_soc[first, u] == (
+                        initial_soc[u] +
+                        self.inputs.efficiency_charge * m.battery_inflow[first, u] -
+                        m.battery_outflow[first, u] / self.inputs.efficiency_discharge
+                    )
+                )
+
+        opt = pyo.SolverFactory(self.solver_name)
+        opt.options.update(self.solver_options)
+        self._check_termination(opt.solve(m, tee=self._is_debug))
+
+        results, duals = self._extract_results(m)
+        results = {name: values for name, values in results.items() if values.index.isin(optimised).all()}
+        duals = {name: values for name, values in duals.items() if values.index.isin(optimised).all()}
+        soc = pd.Series({u: m.battery_soc[kept[-1], u].value for u in m.member})
+
+        return (
+            {name: values.loc[kept] for name, values in results.items()},
+            {name: values.loc[kept] for name, values in duals.items()},
+            soc
+        )
+
+    def _post_process(self, solved: list):
+        """
+        Stitches the results of the windows and computes the annual results of the members over the whole horizon.
+        :param solved: list of tuples (results, duals, state of charge) of every window.
+        :return results of the optimisation.
+        """
+        results = {name: pd.concat([window[0][name] for window in solved]) for name in solved[0][0]}
+        duals = {name: pd.concat([window[1][name] for window in solved]) for name in solved[0][1]}
+
+        results.update(self._annual_results(results, self.inputs.initial_capacity_array))
+
+        self._save_results(inputs=self.inputs, results=results)
+        self._save_results(inputs=self.inputs, results=duals)
+
+        return results, duals
+
+
+def _solve_window(rolling_horizon: RollingHorizon, window: tuple) -> tuple:
+    """
+    Solves an independent window (cyclic state of charge) in a worker process.
+    """
+    rolling_horizon = rolling_horizon or _rolling_horizon
+    return rolling_horizon.solve_window(window)
@@ -1,4 +1,3 @@
-import pandas as pd
 import pyomo.environ as pyo
 
 from sizing.core import OptimisationInputs
@@ -10,15 +9,15 @@ class Rural(GenericModel):
     Planing problem from a fully centralised optimisation standpoint.
     """
 
-    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc', is_debug: bool = False):
+    def __init__(self, inputs: OptimisationInputs, solver: str = 'cbc', is_debug: bool = False, **kwargs):
         """
         Constructor.
         :param inputs: input data and parameters.
         :param solver: name of the solver to use.
         :param is_debug: flag to activate debug mode.
+        :param kwargs: options of the solver portfolio (see GenericModel).
         """
-        super().__init__(solver)
-        self._inputs = inputs
+        super().__init__(inputs, solver, **kwargs)
         self._is_debug = is_debug
 
     def create_model(self, **kwargs):
@@ -26,41 +25,55 @@ class Rural(GenericModel):
         Optimisation model.
         :return: model
         """
-        # Pre-processing
-        annuity_factor, discount_rate, frequency = self._pre_process()
+        if self.inputs.period_sequence is not None:
+            raise NotImplementedError('Aggregated inputs (representative periods) are only supported by Central.')
+        # Positions of the labels and aligned coefficients (as nested lists to read native floats by position)
+        time = list(self.inputs.time)
+        time_position = self.inputs.time_position
+        member_position = self.inputs.member_position
+        technology_position = self.inputs.technology_position
+        coefficients = self._coefficients()
+        demand, generation = coefficients['demand'], coefficients['generation']
+        prices_grid_import, prices_grid_export = coefficients['prices_grid_import'], coefficients['prices_grid_export']
+        prices_community_import = coefficients['prices_community_import']
+        prices_community_export = coefficients['prices_community_export']
+        initial_capacity = coefficients['initial_capacity']
+        cost_technology_investment = coefficients['cost_technology_investment']
+        cost_technology_running_fixed = coefficients['cost_technology_running_fixed']
+        cost_technology_running_variable = coefficients['cost_technology_running_variable']
 
         def _initialise_optimal_capacity(m, u, n):
             """
             Defines the initial optimal capacity of the REC members.
             """
-            return self._inputs.initial_capacity.loc[u, n], 1000
+            return initial_capacity[member_position[u]][technology_position[n]], 1000
 
         # Linear program
         m = pyo.ConcreteModel()
 
         # Sets
-        m.time = pyo.Set(initialize=self._inputs.demand.index)
-        m.member = pyo.Set(initialize=self._inputs.demand.columns)
-        m.technology = pyo.Set(initialize=['p', 'b'])
+        m.time = pyo.Set(initialize=time)
+        m.member = pyo.Set(initialize=self.inputs.members)
+        m.technology = pyo.Set(initialize=self.inputs.technologies)
 
         # Decision variables
-        m.optimal_capacity = pyo.Var(m.member, m.technology, bounds=_initialise_optimal_capacity)
-        m.electricity_produced = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.electricity_consumed = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.imports_retailer = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.imports_rec = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.exports_retailer = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.exports_rec = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.battery_outflow = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.battery_inflow = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
-        m.battery_soc = pyo.Var(m.time, m.member, within=pyo.NonNegativeReals)
+        self._add_component(m, 'optimal_capacity', pyo.Var(m.member, m.technology, bounds=_initialise_optimal_capacity))
+        self._add_component(m, 'electricity_produced', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'electricity_consumed', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'imports_retailer', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'imports_rec', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'exports_retailer', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'exports_rec', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'battery_outflow', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'battery_inflow', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'battery_soc', pyo.Var(m.time, m.member, within=pyo.NonNegativeReals))
 
         # Auxiliary variables
-        m.annual_investment_costs = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.annual_operational_costs = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.annual_electricity_bills = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.annual_electricity_revenue = pyo.Var(m.member, within=pyo.NonNegativeReals)
-        m.total_costs = pyo.Var(m.member, within=pyo.NonNegativeReals)
+        self._add_component(m, 'annual_investment_costs', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'annual_operational_costs', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'annual_electricity_bills', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'annual_electricity_revenue', pyo.Var(m.member, within=pyo.NonNegativeReals))
+        self._add_component(m, 'total_costs', pyo.Var(m.member, within=pyo.NonNegativeReals))
 
         ####################
         # Objective function
@@ -70,7 +83,7 @@ class Rural(GenericModel):
             """
             Minimises the sum of costs (investment, operation, electricity) taking away the revenue.
             """
-            return pyo.quicksum(m.total_costs[u] for u in m.member) * discount_rate
+            return pyo.quicksum(m.total_costs[u] for u in m.member) * self.discount_factor
 
         #############
         # Constraints
@@ -90,10 +103,11 @@ class Rural(GenericModel):
             """
             Annuity of the initial investments over the lifetime of the REC.
             """
+            j = member_position[u]
             return m.annual_investment_costs[u] == (
                 pyo.quicksum(
-                    (m.optimal_capacity[u, n] - self._inputs.initial_capacity.loc[u, n]) *
-                    self._inputs.cost_technology.loc[u, n] * annuity_factor
+                    (m.optimal_capacity[u, n] - initial_capacity[j][technology_position[n]]) *
+                    cost_technology_investment[j][technology_position[n]] * self.annuity_factor
                     for n in m.technology
                 )
             )
@@ -102,11 +116,13 @@ class Rural(GenericModel):
             """
             Annual operational costs.
             """
+            j = member_position[u]
             return m.annual_operational_costs[u] == (
                 pyo.quicksum(
-                    self._inputs.cost_technology_running_fixed.loc[u, n] * m.optimal_capacity[u, n] +
+                    m.optimal_capacity[u, n] * cost_technology_running_fixed[j][technology_position[n]] +
                     pyo.quicksum(
-                        self._inputs.cost_technology_running_variable * (m.electricity_produced[t, u] + m.electricity_consumed[t, u])
+                        (m.electricity_produced[t, u] + m.electricity_consumed[t, u]) *
+                        cost_technology_running_variable[j][technology_position[n]]
                         for t in m.time
                     )
                     for n in m.technology
@@ -117,10 +133,11 @@ class Rural(GenericModel):
             """
             Annual electricity bills.
             """
+            j = member_position[u]
             return m.annual_electricity_bills[u] == (
                 pyo.quicksum(
-                    m.imports_retailer[t, u] * self._inputs.prices_import_grid_members.loc[t, u] +
-                    m.imports_rec[t, u] * self._inputs.prices_import_local_members.loc[t, u]
+                    m.imports_retailer[t, u] * prices_grid_import[time_position[t]][j] +
+                    m.imports_rec[t, u] * prices_community_import[time_position[t]][j]
                     for t in m.time
                 )
             )
@@ -129,10 +146,11 @@ class Rural(GenericModel):
             """
             Annual electricity revenue.
             """
+            j = member_position[u]
             return m.annual_electricity_revenue[u] == (
                 pyo.quicksum(
-                    m.exports_retailer[t, u] * self._inputs.prices_export_grid_members.loc[t, u] +
-                    m.exports_rec[t, u] * self._inputs.prices_export_local_members.loc[t, u]
+                    m.exports_retailer[t, u] * prices_grid_export[time_position[t]][j] +
+                    m.exports_rec[t, u] * prices_community_export[time_position[t]][j]
                     for t in m.time
                 )
             )
@@ -142,7 +160,8 @@ class Rural(GenericModel):
             Power generated by the different technologies.
             """
             return m.electricity_produced[t, u] == (
-                    self._inputs.generation.loc[t, u] * m.optimal_capacity[u, 'p'] + m.battery_outflow[t, u]
+                    generation[time_position[t]][member_position[u]] * m.optimal_capacity[u, 'p'] +
+                    m.battery_outflow[t, u]
             )
 
         def _technology_consumption(m, t, u):
@@ -155,13 +174,14 @@ class Rural(GenericModel):
             """
             Computes the state of charge of the battery.
             """
-            if t == m.time[1]: # TODO: Are we sure this should not be m.time[0]?
-                return m.battery_soc[t, u] == m.battery_soc[m.time[-1], u]
+            i = time_position[t]
+            if i == 0:
+                return m.battery_soc[t, u] == m.battery_soc[time[-1], u]
             else:
                 return m.battery_soc[t, u] == (
-                    m.battery_soc[t-pd.Timedelta(minutes=frequency), u] +
-                    self._inputs.efficiency_charge * m.battery_inflow[t, u] -
-                    m.battery_outflow[t, u] / self._inputs.efficiency_discharge
+                    m.battery_soc[time[i - 1], u] +
+                    self.inputs.efficiency_charge * m.battery_inflow[t, u] -
+                    m.battery_outflow[t, u] / self.inputs.efficiency_discharge
                 )
 
         def _state_of_charge_limit(m, t, u):
@@ -174,20 +194,20 @@ class Rural(GenericModel):
             """
             Limits the battery inflow.
             """
-            return m.battery_inflow[t, u] <= m.optimal_capacity[u, 'b'] / self._inputs.charge_rate
+            return m.battery_inflow[t, u] <= m.optimal_capacity[u, 'b'] / self.inputs.charge_rate
 
         def _limit_outflow(m, t, u):
             """
             Limits the battery inflow.
             """
-            return m.battery_outflow[t, u] <= m.optimal_capacity[u, 'b'] / self._inputs.discharge_rate
+            return m.battery_outflow[t, u] <= m.optimal_capacity[u, 'b'] / self.inputs.discharge_rate
 
         def _energy_balance(m, t, u):
             """
             Energy balance of the REC.
             """
             return (
-                self._inputs.demand.loc[t, u] +
+                demand[time_position[t]][member_position[u]] +
                 m.exports_retailer[t, u] +
                 m.exports_rec[t, u] +
                 m.electricity_consumed[t, u]
@@ -217,23 +237,29 @@ class Rural(GenericModel):
         # Calling equations
         ###################
 
-        m.objective_eqn = pyo.Objective(rule=_objective_function, sense=pyo.minimize)
-        m._total_costs_eqn = pyo.Constraint(m.member, rule=_total_costs)
-        m._annual_investments_eqn = pyo.Constraint(m.member, rule=_annual_investments)
-        m._annual_operational_costs_eqn = pyo.Constraint(m.member, rule=_annual_operational_costs)
-        m._annual_electricity_bills_eqn = pyo.Constraint(m.member, rule=_annual_electricity_bills)
-        m._annual_electricity_revenue_eqn = pyo.Constraint(m.member, rule=_annual_electricity_revenue)
-        m._technology_generation_eqn = pyo.Constraint(m.time, m.member, rule=_technology_generation)
-        m._technology_consumption_eqn = pyo.Constraint(m.time, m.member, rule=_technology_consumption)
-        m._state_of_charge_eqn = pyo.Constraint(m.time, m.member, rule=_state_of_charge)
-        m._state_of_charge_limit_eqn = pyo.Constraint(m.time, m.member, rule=_state_of_charge_limit)
-        m._limit_inflow_eqn = pyo.Constraint(m.time, m.member, rule=_limit_inflow)
-        m._limit_outflow_eqn = pyo.Constraint(m.time, m.member, rule=_limit_outflow)
-        m._energy_balance_eqn = pyo.Constraint(m.time, m.member, rule=_energy_balance)
-        m._local_exchanges_eqn = pyo.Constraint(m.time, rule=_local_exchanges)
+        self._add_component(m, 'objective_eqn', pyo.Objective(rule=_objective_function, sense=pyo.minimize))
+        self._add_component(m, '_total_costs_eqn', pyo.Constraint(m.member, rule=_total_costs))
+        self._add_component(m, '_annual_investments_eqn', pyo.Constraint(m.member, rule=_annual_investments))
+        self._add_component(m, '_annual_operational_costs_eqn',
+                            pyo.Constraint(m.member, rule=_annual_operational_costs))
+        self._add_component(m, '_annual_electricity_bills_eqn',
+                            pyo.Constraint(m.member, rule=_annual_electricity_bills))
+        self._add_component(m, '_annual_electricity_revenue_eqn',
+                            pyo.Constraint(m.member, rule=_annual_electricity_revenue))
+        self._add_component(m, '_technology_generation_eqn',
+                            pyo.Constraint(m.time, m.member, rule=_technology_generation))
+        self._add_component(m, '_technology_consumption_eqn',
+                            pyo.Constraint(m.time, m.member, rule=_technology_consumption))
+        self._add_component(m, '_state_of_charge_eqn', pyo.Constraint(m.time, m.member, rule=_state_of_charge))
+        self._add_component(m, '_state_of_charge_limit_eqn',
+                            pyo.Constraint(m.time, m.member, rule=_state_of_charge_limit))
+        self._add_component(m, '_limit_inflow_eqn', pyo.Constraint(m.time, m.member, rule=_limit_inflow))
+        self._add_component(m, '_limit_outflow_eqn', pyo.Constraint(m.time, m.member, rule=_limit_outflow))
+        self._add_component(m, '_energy_balance_eqn', pyo.Constraint(m.time, m.member, rule=_energy_balance))
+        self._add_component(m, '_local_exchanges_eqn', pyo.Constraint(m.time, rule=_local_exchanges))
         # m._limit_exports_eqn = pyo.Constraint(m.time, m.member, rule=_limit_exports)
 
         if self._is_debug:
-            m.write('{}/model.lp'.format(self._inputs.output_path), io_options={'symbolic_solver_labels': True})
+            m.write('{}/model.lp'.format(self.inputs.output_path), io_options={'symbolic_solver_labels': True})
 
         return m
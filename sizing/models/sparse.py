@@ -0,0 +1,410 @@
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+import scipy.sparse as sp
+
+from scipy.optimize import linprog
+
+from sizing.utils import unstack_data
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Regularisations of the active set QP solver of HiGHS tried in turn when it fails (it occasionally does on
+# semidefinite problems), starting with its default
+QP_REGULARIZATIONS = [1e-7, 0., 1e-5, 1e-4, 1e-3]
+
+
+class SparseProblem:
+    """
+    Linear program stored in matrix form:
+
+        min  c' x
+        s.t. row_lower <= A x <= row_upper
+             col_lower <=   x <= col_upper
+
+    Variables and constraints are added by families (blocks of consecutive columns and rows) indexed by one or two
+    sets of labels, so that the solution and the duals can be returned with the same shape as the Pyomo models.
+    """
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+        self.variables = dict()
+        self.constraints = dict()
+        self.cost = np.zeros(0)
+        self.col_lower = np.zeros(0)
+        self.col_upper = np.zeros(0)
+        self.row_lower = np.zeros(0)
+        self.row_upper = np.zeros(0)
+        self.matrix = None
+        self.offset = 0.
+        self.objective = None
+        self.solution = None
+        self.row_dual = None
+        self.col_dual = None
+
+        self._triplets = []
+        self._number_rows = 0
+
+    @property
+    def number_variables(self) -> int:
+        return len(self.cost)
+
+    @property
+    def number_constraints(self) -> int:
+        return self._number_rows
+
+    def add_variables(self, name: str, index: pd.Index, columns: pd.Index = None, lower=0., upper=np.inf,
+                      cost=0.) -> np.ndarray:
+        """
+        Adds a family of variables.
+        :param name: name of the family (same as the Pyomo variable).
+        :param index: labels of the first dimension.
+        :param columns: labels of the second dimension (None for one-dimensional families).
+        :param lower: lower bounds (scalar or array broadcastable to the shape of the family).
+        :param upper: upper bounds (scalar or array broadcastable to the shape of the family).
+        :param cost: objective coefficients (scalar or array broadcastable to the shape of the family).
+        :return: positions (columns of the matrix) of the variables, with the shape of the family.
+        """
+        shape = (len(index),) if columns is None else (len(index), len(columns))
+        offset = self.number_variables
+        positions = offset + np.arange(int(np.prod(shape))).reshape(shape)
+
+        self.variables[name] = (offset, index, columns)
+        self.cost = np.concatenate([self.cost, np.broadcast_to(cost, shape).ravel()])
+        self.col_lower = np.concatenate([self.col_lower, np.broadcast_to(lower, shape).ravel()])
+        self.col_upper = np.concatenate([self.col_upper, np.broadcast_to(upper, shape).ravel()])
+
+        return positions
+
+    def add_constraints(self, name: str, index: pd.Index, columns: pd.Index = None, terms: list = (), lower=0.,
+                        upper=0.):
+        """
+        Adds a family of constraints lower <= sum_terms coefficient * variable <= upper.
+
+        Each term is a tuple (positions, coefficients). The positions have the shape of the family, optionally with
+        trailing dimensions which are summed over (e.g. shape (member, time) for a constraint indexed by member that
+        sums over time). The coefficients are broadcast to the shape of the positions.
+        :param name: name of the family (same as the Pyomo constraint).
+        :param index: labels of the first dimension.
+        :param columns: labels of the second dimension (None for one-dimensional families).
+        :param terms: list of tuples (positions, coefficients).
+        :param lower: lower bounds (scalar or array broadcastable to the shape of the family).
+        :param upper: upper bounds (scalar or array broadcastable to the shape of the family).
+        """
+        shape = (len(index),) if columns is None else (len(index), len(columns))
+        offset = self._number_rows
+        rows = offset + np.arange(int(np.prod(shape))).reshape(shape)
+
+        for positions, coefficients in terms:
+            positions = np.asarray(positions)
+            extra_dimensions = positions.ndim - len(shape)
+            row_positions = np.broadcast_to(rows.reshape(shape + (1,) * extra_dimensions), positions.shape)
+            self._triplets.append((
+                row_positions.ravel(),
+                positions.ravel(),
+                np.broadcast_to(np.asarray(coefficients, dtype=float), positions.shape).ravel()
+            ))
+
+        self.constraints[name] = (offset, index, columns)
+        self.row_lower = np.concatenate([self.row_lower, np.broadcast_to(lower, shape).ravel()])
+        self.row_upper = np.concatenate([self.row_upper, np.broadcast_to(upper, shape).ravel()])
+        self._number_rows += rows.size
+
+    def assemble(self) -> sp.csr_matrix:
+        """
+        Assembles the constraint matrix in CSR format (duplicated entries are summed, explicit zeros removed).
+        :return: constraint matrix.
+        """
+        if self._triplets:
+            rows, cols, values = (np.concatenate(i) for i in zip(*self._triplets))
+        else:
+            rows, cols, values = np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+        self.matrix = sp.csr_matrix(
+            (values, (rows, cols)), shape=(self.number_constraints, self.number_variables)
+        )
+        self.matrix.sum_duplicates()
+        self.matrix.eliminate_zeros()
+        self._triplets = []
+
+        return self.matrix
+
+    def solve(self) -> bool:
+        """
+        Solves the problem with HiGHS (through SciPy), storing the solution, the duals of the constraints and the duals
+        of the bounds of the variables (sensitivity of the objective to the bounds, e.g. to the value of fixed
+        variables).
+        :return: True if the problem has been solved to optimality.
+        """
+        if self.matrix is None:
+            self.assemble()
+
+        equality = self.row_lower == self.row_upper
+        upper = ~equality & np.isfinite(self.row_upper)
+        lower = ~equality & np.isfinite(self.row_lower)
+
+        # Rows with lower bounds are passed as -A x <= -lower
+        matrix_inequality = sp.vstack([self.matrix[upper], -self.matrix[lower]], format='csr')
+        bound_inequality = np.concatenate([self.row_upper[upper], -self.row_lower[lower]])
+
+        result = linprog(
+            c=self.cost,
+            A_ub=matrix_inequality if matrix_inequality.shape[0] else None,
+            b_ub=bound_inequality if matrix_inequality.shape[0] else None,
+            A_eq=self.matrix[equality] if equality.any() else None,
+            b_eq=self.row_upper[equality] if equality.any() else None,
+            bounds=np.column_stack([self.col_lower, np.where(np.isfinite(self.col_upper), self.col_upper, None)]),
+            method='highs'
+        )
+        if result.status != 0:
+            self.solution, self.row_dual, self.col_dual, self.objective = None, None, None, None
+            return False
+
+        self.solution = result.x
+        self.objective = result.fun + self.offset
+        self.row_dual = np.zeros(self.number_constraints)
+        if equality.any():
+            self.row_dual[equality] = result.eqlin.marginals
+        marginals_inequality = result.ineqlin.marginals if matrix_inequality.shape[0] else np.zeros(0)
+        self.row_dual[upper] = marginals_inequality[:upper.sum()]
+        self.row_dual[lower] += -marginals_inequality[upper.sum():]
+        self.col_dual = result.lower.marginals + result.upper.marginals
+
+        return True
+
+    def to_highs(self):
+        """
+        Passes the problem to an in-process HiGHS instance (highspy), which can then be modified (e.g. costs, bounds or
+        a quadratic objective) and re-solved from its previous solution.
+        :return: HiGHS instance with the problem loaded.
+        """
+        if highspy is None:
+            raise ImportError('The package highspy is required to solve the problem in-process with HiGHS.')
+        if self.matrix is None:
+            self.assemble()
+
+        matrix = self.matrix.tocsc()
+        lp = highspy.HighsLp()
+        lp.num_col_, lp.num_row_ = self.number_variables, self.number_constraints
+        lp.col_cost_, lp.offset_ = self.cost, self.offset
+        lp.col_lower_, lp.col_upper_ = self.col_lower, self.col_upper
+        lp.row_lower_, lp.row_upper_ = self.row_lower, self.row_upper
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_, lp.a_matrix_.index_, lp.a_matrix_.value_ = matrix.indptr, matrix.indices, matrix.data
+
+        solver = highspy.Highs()
+        solver.setOptionValue('output_flag', False)
+        solver.passModel(lp)
+
+        return solver
+
+    def solve_highs(self, solver) -> bool:
+        """
+        Solves (or re-solves, from its previous solution) the problem loaded in a HiGHS instance created by to_highs and
+        stores its solution and duals. Quadratic problems are retried with other regularisations if the solver fails.
+        :param solver: HiGHS instance.
+        :return: True if the problem has been solved to optimality.
+        """
+        for regularization in QP_REGULARIZATIONS:
+            solver.setOptionValue('qp_regularization_value', regularization)
+            solver.run()
+            if solver.getModelStatus() == highspy.HighsModelStatus.kOptimal or not solver.getModel().hessian_.dim_:
+                break
+            solver.clearSolver()
+        solver.setOptionValue('qp_regularization_value', QP_REGULARIZATIONS[0])
+
+        return self.load_solution(solver)
+
+    @staticmethod
+    def diagonal_hessian(number_variables: int, positions: np.ndarray, values):
+        """
+        Diagonal Hessian of a quadratic objective 1/2 sum_i values_i * x_i^2 over some of the variables, in the format
+        of HiGHS.
+        :param number_variables: number of variables of the problem.
+        :param positions: positions of the variables in the quadratic terms.
+        :param values: coefficients of the quadratic terms (scalar or array).
+        :return: Hessian (highspy.HighsHessian).
+        """
+        matrix = sp.csc_matrix(
+            (np.broadcast_to(values, positions.shape).astype(float), (positions, positions)),
+            shape=(number_variables, number_variables)
+        )
+
+        hessian = highspy.HighsHessian()
+        hessian.dim_ = number_variables
+        hessian.format_ = highspy.HessianFormat.kTriangular
+        hessian.start_, hessian.index_, hessian.value_ = matrix.indptr, matrix.indices, matrix.data
+
+        return hessian
+
+    def load_solution(self, solver) -> bool:
+        """
+        Stores the solution and the duals of a HiGHS instance created by to_highs.
+        :param solver: solved HiGHS instance.
+        :return: True if the problem has been solved to optimality.
+        """
+        if solver.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            self.solution, self.row_dual, self.col_dual, self.objective = None, None, None, None
+            return False
+
+        solution = solver.getSolution()
+        self.solution = np.array(solution.col_value)
+        self.row_dual = np.array(solution.row_dual)
+        self.col_dual = np.array(solution.col_dual)
+        self.objective = solver.getInfo().objective_function_value
+
+        return True
+
+    def to_pyomo(self) -> pyo.ConcreteModel:
+        """
+        Builds a Pyomo model of the problem (one variable x[j] per column, one constraint rows[i] per row, duals
+        imported), so that the problem can be solved by any solver of Pyomo (see load_pyomo).
+        :return: Pyomo model.
+        """
+        from pyomo.core.expr.numeric_expr import LinearExpression
+
+        if self.matrix is None:
+            self.assemble()
+
+        m = pyo.ConcreteModel()
+        m.dual = pyo.Suffix(direction=pyo.Suffix.IMPORT)
+        m.x = pyo.Var(range(self.number_variables), bounds=lambda _, j: (
+            None if np.isinf(self.col_lower[j]) else float(self.col_lower[j]),
+            None if np.isinf(self.col_upper[j]) else float(self.col_upper[j])
+        ))
+        x = [m.x[j] for j in range(self.number_variables)]
+        matrix = self.matrix
+
+        def _row(_, i):
+            start, end = matrix.indptr[i], matrix.indptr[i + 1]
+            body = LinearExpression(constant=0., linear_coefs=matrix.data[start:end].tolist(),
+                                    linear_vars=[x[j] for j in matrix.indices[start:end]])
+            lower = None if np.isinf(self.row_lower[i]) else float(self.row_lower[i])
+            upper = None if np.isinf(self.row_upper[i]) else float(self.row_upper[i])
+            return pyo.Constraint.Skip if lower is None and upper is None else (lower, body, upper)
+
+        m.rows = pyo.Constraint(range(self.number_constraints), rule=_row)
+        columns = np.flatnonzero(self.cost)
+        m.objective = pyo.Objective(expr=LinearExpression(
+            constant=self.offset, linear_coefs=self.cost[columns].tolist(), linear_vars=[x[j] for j in columns]
+        ), sense=pyo.minimize)
+
+        return m
+
+    def load_pyomo(self, m: pyo.ConcreteModel):
+        """
+        Stores the solution and the duals of the Pyomo model of the problem (see to_pyomo) solved by Pyomo.
+        :param m: solved Pyomo model.
+        """
+        self.solution = np.array([0. if v.value is None else v.value for v in m.x.values()])
+        self.row_dual = np.array([m.dual.get(m.rows[i], 0.) if i in m.rows else 0.
+                                  for i in range(self.number_constraints)])
+        self.col_dual = None
+        self.objective = pyo.value(m.objective)
+
+    @classmethod
+    def from_pyomo(cls, model: pyo.ConcreteModel) -> 'SparseProblem':
+        """
+        Compiles a linear Pyomo model into a sparse problem, keeping its families of variables and constraints (same
+        names, labels and orientation of the rows), so that it can be stored and solved without Pyomo.
+        :param model: linear Pyomo model to be minimised.
+        :return: sparse problem.
+        """
+        from pyomo.repn.plugins.standard_form import LinearStandardFormCompiler
+
+        compiled = LinearStandardFormCompiler().write(model, mixed_form=True, set_sense=pyo.minimize)
+        problem = cls()
+
+        # Columns, grouped by family of variables
+        column_position = dict()
+        for variable in model.component_objects(pyo.Var, active=True):
+            data = list(variable.values())
+            index, columns = cls._pyomo_labels(list(variable.keys()))
+            shape = (len(index),) if columns is None else (len(index), len(columns))
+            offset = problem.number_variables
+            problem.add_variables(
+                variable.name, index, columns,
+                lower=np.reshape([v.value if v.fixed else (-np.inf if v.lb is None else v.lb) for v in data], shape),
+                upper=np.reshape([v.value if v.fixed else (np.inf if v.ub is None else v.ub) for v in data], shape)
+            )
+            column_position.update({id(v): offset + k for k, v in enumerate(data)})
+
+        # Rows, grouped by family of constraints (ranged constraints are compiled into two rows, merged here)
+        row_position = dict()
+        for constraint in model.component_objects(pyo.Constraint, active=True):
+            data = [c for c in constraint.values() if c.active]
+            index, columns = cls._pyomo_labels([c.index() for c in data])
+            offset = problem.number_constraints
+            problem.add_constraints(constraint.name, index, columns, lower=-np.inf, upper=np.inf)
+            row_position.update({id(c): offset + k for k, c in enumerate(data)})
+
+        rows = np.array([row_position[id(row.constraint)] for row in compiled.rows], dtype=int)
+        for row, entry, rhs in zip(rows, compiled.rows, compiled.rhs):
+            if entry.bound_type <= 0:
+                problem.row_lower[row] = rhs
+            if entry.bound_type >= 0:
+                problem.row_upper[row] = rhs
+        _, first = np.unique(rows, return_index=True)
+        keep = np.zeros(len(rows), dtype=bool)
+        keep[first] = True
+
+        columns = np.array([column_position[id(v)] for v in compiled.columns], dtype=int)
+        matrix = compiled.A.tocoo()
+        kept = keep[matrix.row]
+        problem._triplets.append((rows[matrix.row[kept]], columns[matrix.col[kept]], matrix.data[kept]))
+
+        cost = sp.coo_matrix(compiled.c)
+        problem.cost[columns[cost.col]] = cost.data
+        problem.offset = float(compiled.c_offset[0])
+        problem.assemble()
+
+        return problem
+
+    @staticmethod
+    def _pyomo_labels(keys: list):
+        """
+        Labels of a family of Pyomo components from its keys: (index, None) for one-dimensional families and
+        (index, columns) for two-dimensional ones indexed by a product of two sets in their order.
+        """
+        if keys and isinstance(keys[0], tuple):
+            if len(keys[0]) != 2:
+                raise NotImplementedError('Only families indexed by one or two sets are supported.')
+            index, columns = pd.unique(pd.Series([k[0] for k in keys])), pd.unique(pd.Series([k[1] for k in keys]))
+            if len(index) * len(columns) != len(keys) or any(
+                    k != (index[i // len(columns)], columns[i % len(columns)]) for i, k in enumerate(keys)
+            ):
+                raise NotImplementedError('Only families indexed by the product of two sets are supported.')
+            return pd.Index(index), pd.Index(columns)
+        return pd.Index(keys), None
+
+    def get_values(self, name: str):
+        """
+        Gets the values of a family of variables in the shape of the Pyomo results.
+        :param name: name of the family of variables.
+        :return: dataframe (two-dimensional families) or series (one-dimensional families).
+        """
+        return self._shape_values(self.solution, *self.variables[name])
+
+    def get_duals(self, name: str):
+        """
+        Gets the duals of a family of constraints in the shape of the Pyomo results.
+        :param name: name of the family of constraints.
+        :return: dataframe (two-dimensional families) or series (one-dimensional families).
+        """
+        return self._shape_values(self.row_dual, *self.constraints[name])
+
+    @staticmethod
+    def _shape_values(values: np.ndarray, offset: int, index: pd.Index, columns: pd.Index):
+        """
+        Shapes a block of values as the Pyomo results (dictionary of values unstacked on the last index).
+        """
+        if columns is None:
+            return pd.Series(values[offset:offset + len(index)], index=index)
+        data = pd.Series(
+            values[offset:offset + len(index) * len(columns)], index=pd.MultiIndex.from_product([index, columns])
+        )
+        return unstack_data(data)
@@ -0,0 +1,204 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from sizing.core import OptimisationInputs, OPTIONAL_MEMBER_TABLES, OPTIONAL_TIME_SERIES
+from sizing.models import MODELS
+from sizing.utils import read_inputs
+
+SCALAR_PARAMETERS = [
+    'interest_rate', 'discount_rate', 'lifetime', 'efficiency_charge', 'efficiency_discharge', 'charge_rate',
+    'discharge_rate'
+]
+THREADS_OPTION = {'cbc': 'threads', 'highs': 'threads', 'appsi_highs': 'threads', 'highs-direct': 'threads',
+                  'cplex': 'threads', 'gurobi': 'Threads'}
+
+# Inputs read once by the parent process and inherited by the workers (fork start method)
+_base_inputs = None
+
+
+def read_variants(variants_path: str) -> list:
+    """
+    Reads the variants of a sweep from a YML file with a "grid" (cartesian product of the lists of values of every
+    parameter) and/or a list of "variants" (dictionaries of overrides).
+    :param variants_path: path to the YML file.
+    :return: list of dictionaries of overrides.
+    """
+    data = read_inputs(variants_path)
+    variants = []
+    grid = data.get('grid') or dict()
+    if grid:
+        names = list(grid)
+        variants += [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    variants += data.get('variants') or []
+
+    return variants
+
+
+def apply_overrides(inputs: OptimisationInputs, overrides: dict) -> OptimisationInputs:
+    """
+    Applies the overrides of a variant to (a copy of) the inputs.
+    :param inputs: base inputs.
+    :param overrides: dictionary with the new values of the parameters of the configuration file, the scaling factors
+    of the input files (e.g. "prices_grid_import: 1.2") and/or the subset of "members".
+    :return: inputs of the variant.
+    """
+    inputs = inputs.slice(members=overrides.get('members'))
+    for name, value in overrides.items():
+        if name == 'members':
+            continue
+        elif name in SCALAR_PARAMETERS:
+            setattr(inputs, name, value)
+        elif name in inputs._mandatory_files + OPTIONAL_TIME_SERIES + OPTIONAL_MEMBER_TABLES:
+            array_name = '{}_array'.format(name)
+            setattr(inputs, array_name, getattr(inputs, array_name) * value)
+        else:
+            raise KeyError('Parameter "{}" cannot be overridden in a sweep.'.format(name))
+
+    return inputs
+
+
+def _run_variant(name: str, overrides: dict, model_name: str, solver: str, threads: int, output_path: str,
+                 input_parameters: str, input_files: str, input_cache: str = None) -> dict:
+    """
+    Builds and solves one variant (in a worker process), catching its failures.
+    :return: row of the summary table.
+    """
+    summary = {'variant': name, 'status': 'optimal', 'error': '', **{k: str(v) for k, v in overrides.items()}}
+    tic = time.time()
+    try:
+        inputs = _base_inputs
+        if inputs is None:
+            inputs = OptimisationInputs(input_parameters, input_files, output_path, input_cache=input_cache)
+        inputs = apply_overrides(inputs, overrides)
+        inputs.output_path = os.path.join(output_path, name)
+        os.makedirs(inputs.output_path, exist_ok=True)
+
+        problem = MODELS[model_name](inputs=inputs, solver=solver)
+        if solver in THREADS_OPTION:
+            problem.solver_options[THREADS_OPTION[solver]] = threads
+        results, _ = problem.solve_model(problem.create_model())
+
+        summary['objective'] = results['total_costs'].sum() * problem.discount_factor
+        for technology, capacity in results['optimal_capacity'].sum().items():
+            summary['capacity_{}'.format(technology)] = capacity
+    except Exception as error:
+        summary['status'], summary['error'] = 'failed', '{}: {}'.format(type(error).__name__, error)
+        with open(os.path.join(output_path, '{}.error'.format(name)), 'w') as outfile:
+            outfile.write(traceback.format_exc())
+    summary['seconds'] = time.time() - tic
+
+    return summary
+
+
+def run_sweep(input_parameters: str, input_files: str, output_path: str, variants: list, model: str = 'central',
+              solver: str = 'cbc', workers: int = None, threads: int = None, input_cache: str = None,
+              is_verbose: bool = False) -> pd.DataFrame:
+    """
+    Runs a sweep of variants of a configuration over a pool of processes, splitting the cores of the machine between
+    the concurrent variants and the threads of each solver. The results of every variant are saved in its own
+    subfolder of the output path and the failures of individual variants do not stop the sweep.
+    :param input_parameters: path to the YML file with the base parameters.
+    :param input_files: path to the input files (csv files).
+    :param output_path: output path for the results.
+    :param variants: list of dictionaries of overrides (see apply_overrides).
+    :param model: name of the model (see sizing.models.MODELS).
+    :param solver: name of the solver.
+    :param workers: number of concurrent variants (by default, as many as cores divided by the solver threads).
+    :param threads: number of threads per solver (by default, the cores left per worker).
+    :param input_cache: directory of the binary sidecars of the input files, memory-mapped by every worker (the csv
+    files are parsed by default).
+    :param is_verbose: flag to print the progress.
+    :return: summary table with the status, objective and capacities of every variant (also saved as summary.csv).
+    """
+    global _base_inputs
+
+    if model not in MODELS:
+        raise KeyError('The model "{}" does not exist. Please, select: {}.'.format(model, ', '.join(MODELS)))
+    os.makedirs(output_path, exist_ok=True)
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    if workers is None:
+        workers = max(1, min(len(variants), cores // (threads or 1)))
+    if threads is None:
+        threads = max(1, cores // workers)
+
+    # With fork, the inputs are read once and shared copy-on-write with the workers
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    if context.get_start_method() == 'fork':
+        _base_inputs = OptimisationInputs(input_parameters, input_files, output_path, input_cache=input_cache)
+
+    names = ['variant_{}'.format(i) for i in range(len(variants))]
+    summaries = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {
+                executor.submit(
+                    _run_variant, name, overrides, model, solver, threads, output_path, input_parameters, input_files,
+                    input_cache
+                ): (name, overrides)
+                for name, overrides in zip(names, variants)
+            }
+            for future, (name, overrides) in futures.items():
+                try:
+                    summary = future.result()
+                except Exception as error:
+                    # The worker itself died (e.g. out of memory)
+                    summary = {'variant': name, 'status': 'failed', 'error': '{}: {}'.format(
+                        type(error).__name__, error
+                    ), **{k: str(v) for k, v in overrides.items()}}
+                summaries.append(summary)
+                if is_verbose:
+                    print(f"{summary['variant']}: {summary['status']} {summary['error']}")
+    finally:
+        _base_inputs = None
+
+    summary = pd.DataFrame(summaries).set_index('variant')
+    summary.to_csv(os.path.join(output_path, 'summary.csv'))
+
+    return summary
+
+
+if __name__ == "__main__":
+
+    # Argument parsing
+    parser = argparse.ArgumentParser(description="Runs a sweep of variants of a configuration in parallel.")
+    parser.add_argument("-ip", "--input_parameters", dest="input_parameters", help="YML file with several options")
+    parser.add_argument("-if", "--input_files", dest="input_files", help="Path to the input files (csv files)")
+    parser.add_argument("-va", "--variants", dest="variants",
+                        help="YML file with a grid and/or a list of variants (overrides of the configuration)")
+    parser.add_argument("-m", "--model", dest="model", help="Type of model to be run", default="central")
+    parser.add_argument("-o", "--output_path", dest="output", help="Output path for the results.")
+    parser.add_argument("-s", "--solver", dest="solver", help="Solver name (cbc, cplex ...)", default="cbc")
+    parser.add_argument("-w", "--workers", dest="workers", type=int, help="Number of variants solved concurrently")
+    parser.add_argument("-t", "--threads", dest="threads", type=int, help="Number of threads per solver")
+    parser.add_argument("--input-cache", dest="input_cache",
+                        help="Folder of the binary sidecars of the input files (memory-mapped instead of parsing the "
+                             "csv files)")
+    parser.add_argument("-v", "--verbose", dest="is_verbose", action="store_true", help="Verbose mode")
+
+    args = parser.parse_args()
+
+    tic = time.time()
+    summary = run_sweep(
+        input_parameters=args.input_parameters,
+        input_files=args.input_files,
+        output_path=args.output,
+        variants=read_variants(args.variants),
+        model=args.model,
+        solver=args.solver,
+        workers=args.workers,
+        threads=args.threads,
+        input_cache=args.input_cache,
+        is_verbose=args.is_verbose
+    )
+    tac = time.time()
+    failed = (summary['status'] != 'optimal').sum()
+    print(f"{len(summary)} variants run in {(tac - tic):.2f} seconds ({failed} failed).")
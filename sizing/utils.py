@@ -1,12 +1,30 @@
+import csv
+import mmap
+import os
+import resource
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
 
+from scipy.cluster.vq import kmeans2
+
 import yaml
 try:
     from yaml import CLoader as Loader, CDumper as Dumper
 except ImportError:
     from yaml import Loader, Dumper
 
+# The parser of pyarrow is multithreaded: on a single core, it reads the input files as fast as the C parser
+try:
+    import pyarrow
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M']
+
 
 class ParsingException(Exception):
     def __init__(self, indexes: list):
@@ -17,20 +35,127 @@ class ParsingException(Exception):
         return "Invalid values at indexes:\n\t" + '\n\t'.join(map(str, self.indexes))
 
 
-def read_data(data_path: str) -> pd.DataFrame:
+def read_data(data_path: str, engine: str = CSV_ENGINE) -> pd.DataFrame:
     """
     Reads CSV file returning an object.
 
     :param data_path: Path to the data to read.
+    :param engine: parser of the csv file (pyarrow if it is available, the C parser of pandas otherwise).
     :return Dataframe with the read data.
     """
-    df = pd.read_csv(data_path, header=0, index_col=0, parse_dates=True, infer_datetime_format=True, dtype=float)
-    null_loc, _ = np.where(df.isna())
+    with open(data_path, newline='') as infile:
+        header = next(csv.reader(infile))
+    # The labels of the index are parsed apart, with the known formats of the timestamps
+    dtype = {column: float for column in header[1:]}
+    if engine != 'pyarrow':
+        dtype[header[0]] = object
+    df = pd.read_csv(data_path, header=0, index_col=0, dtype=dtype, engine=engine)
+    if engine == 'pyarrow':
+        # pyarrow sets the index after the types of the columns and infers the types of the labels (it parses the
+        # timestamps in ISO format itself), which are read as strings, with the same name, as the C parser does
+        if not pd.api.types.is_datetime64_any_dtype(df.index):
+            df.index = df.index.astype(str)
+        df.index.name = header[0] or None
+    df.index = parse_index(df.index)
+
+    null_loc = np.flatnonzero(np.isnan(df.to_numpy()).any(axis=1))
     if len(null_loc) != 0:
         raise ParsingException(indexes=df.index[null_loc])
     return df
 
 
+def parse_index(index: pd.Index) -> pd.Index:
+    """
+    Parses the labels of an index as timestamps, trying the known formats before inferring the format.
+    :param index: labels read from a csv file.
+    :return: datetime index, or the labels unchanged if they are not timestamps (e.g. members).
+    """
+    for datetime_format in DATETIME_FORMATS:
+        try:
+            return pd.DatetimeIndex(pd.to_datetime(index, format=datetime_format), name=index.name)
+        except (ValueError, TypeError):
+            pass
+    try:
+        return pd.DatetimeIndex(pd.to_datetime(index), name=index.name)
+    except (ValueError, TypeError):
+        return index
+
+
+def read_files(paths: dict, reader=read_data, workers: int = None) -> dict:
+    """
+    Reads csv files concurrently on a pool of threads (the parsers release the GIL).
+    :param paths: paths to the csv files by name.
+    :param reader: function reading a csv file into a dataframe (read_data by default).
+    :param workers: number of threads (one per file, up to the number of CPUs, by default).
+    :return: dataframes by name.
+    """
+    if not paths:
+        return {}
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(reader, path) for name, path in paths.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def is_memory_mapped(array: np.ndarray) -> bool:
+    """
+    Checks if an array is (a view of) a memory-mapped file.
+    :param array: array.
+    :return: True if the memory of the array is mapped from a file.
+    """
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def align_data(data, index: pd.Index, columns: pd.Index) -> np.ndarray:
+    """
+    Aligns the data to the given labels returning a contiguous float64 array. Memory-mapped data which are already
+    aligned are not copied.
+    :param data: dataframe (or scalar, for the default value of optional files) to align.
+    :param index: labels of the rows (first axis) of the array.
+    :param columns: labels of the columns (second axis) of the array.
+    :return: array of shape (len(index), len(columns)) with positions following the order of the labels.
+    """
+    if not isinstance(data, pd.DataFrame):
+        return np.full((len(index), len(columns)), data, dtype=float)
+
+    if data.index.equals(index) and data.columns.equals(columns):
+        # Already aligned: memory-mapped inputs are not copied, so that they stay shared between processes
+        values = data.to_numpy(dtype=float)
+        return values if is_memory_mapped(values) else np.ascontiguousarray(values)
+
+    for labels, available in [(index, data.index), (columns, data.columns)]:
+        missing = labels.difference(available)
+        if len(missing) != 0:
+            raise KeyError('Labels not found in the data: {}'.format(list(missing)))
+
+    return np.ascontiguousarray(data.reindex(index=index, columns=columns).to_numpy(dtype=float))
+
+
+def cluster_periods(features: np.ndarray, number_clusters: int, seed: int = 0) -> tuple:
+    """
+    Clusters periods with k-means and selects the medoid (the actual period closest to the centroid) of every cluster.
+    :param features: array of shape (number of periods, number of features).
+    :param number_clusters: number of clusters.
+    :param seed: seed of the initialisation of k-means.
+    :return: cluster of every period and position of the medoid of every (non-empty) cluster.
+    """
+    if number_clusters >= len(features):
+        return np.arange(len(features)), np.arange(len(features))
+
+    centroids, labels = kmeans2(features, number_clusters, minit='++', seed=seed)
+    clusters = np.unique(labels)
+    medoids = np.array([
+        np.flatnonzero(labels == c)[np.argmin(((features[labels == c] - centroids[c])**2).sum(axis=1))]
+        for c in clusters
+    ])
+
+    return np.searchsorted(clusters, labels), medoids
+
+
 def read_inputs(inputs_path: str) -> dict:
     """
     Reads YML file with inputs.
@@ -42,15 +167,26 @@ def read_inputs(inputs_path: str) -> dict:
     return data
 
 
-def set_file_to_object(target_object, path_to_files, file_to_set):
+def set_file_to_object(target_object, path_to_files, file_to_set, reader=read_data):
     """
     Sets a given csv file as an attribute of an object with the same name.
     :param target_object: Object for which the attribute is created.
     :param path_to__files: Path to the csv files.
     :param file_to_set: File to set as an attibute for the given object.
+    :param reader: function reading the csv file into a dataframe (read_data by default).
     """
     file_path = '{}/{}.csv'.format(path_to_files, file_to_set)
-    setattr(target_object, file_to_set, read_data(file_path))
+    setattr(target_object, file_to_set, reader(file_path))
+
+
+def peak_memory() -> float:
+    """
+    Peak resident memory (RSS) of the current process.
+    :return: peak resident memory in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
 
 
 def unstack_data(data):
@@ -60,4 +196,14 @@ def unstack_data(data):
     if type(data.index) == pd.core.indexes.multi.MultiIndex:
         return data.unstack()
     else:
-        return data
\ No newline at end of file
+        return data
+
+
+def save_results(results: dict, output_path: str):
+    """
+    Saves the results in csv files.
+    :param results: dictionary containing the results of the simulation (name of the file -> dataframe or series).
+    :param output_path: path to the folder where the files are saved.
+    """
+    for key, values in results.items():
+        values.to_csv(os.path.join(output_path, '{}.csv'.format(key)))
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs, ADMM, CentralSparse
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+HORIZON = 48
+TOLERANCE = 1e-3
+
+
+@unittest.skipIf(highspy is None, 'highspy is not installed')
+class TestADMM(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+
+    def test_same_solution_as_central(self):
+        central = CentralSparse(inputs=self._inputs('central'))
+        problem = central.create_model()
+        self.assertTrue(problem.solve())
+
+        admm = ADMM(inputs=self._inputs('admm'), workers=2, tolerance=TOLERANCE)
+        results, duals = admm.solve_model(admm.create_model())
+        history = admm.history
+
+        self.assertLessEqual(history['primal_residual'].iloc[-1], TOLERANCE)
+        self.assertLessEqual(history['dual_residual'].iloc[-1], TOLERANCE)
+        self.assertAlmostEqual(
+            results['total_costs'].sum() * admm.discount_factor, problem.objective, delta=1e-4 * problem.objective
+        )
+        self.assertLessEqual(
+            np.abs(results['exports_rec'].sum(axis=1) - results['imports_rec'].sum(axis=1)).max(),
+            TOLERANCE * np.sqrt(HORIZON)
+        )
+
+        # Local prices within the range of the duals of the local exchanges constraint of Central (not unique)
+        prices, central_prices = duals['dual_local_exchanges_eqn'], problem.get_duals('_local_exchanges_eqn')
+        self.assertEqual(prices.shape, (HORIZON,))
+        self.assertTrue((prices >= central_prices.min() - 1e-6).all())
+        self.assertTrue((prices <= central_prices.max() + 1e-6).all())
+        self.assertEqual(results['optimal_capacity'].shape, (23, 2))
+        self.assertEqual(duals['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+
+
+    def test_not_converged(self):
+        admm = ADMM(inputs=self._inputs('admm'), tolerance=0., max_iterations=1)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            admm.solve_model(admm.create_model())
+        self.assertTrue(any('not converged in 1 iterations' in str(warning.message) for warning in caught))
+
+        with self.assertRaises(ValueError):
+            ADMM(inputs=admm.inputs, max_iterations=0)
+
+if __name__ == '__main__':
+    unittest.main()
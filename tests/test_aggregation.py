@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central, CentralDuals, CentralSparse, Rural
+from sizing.models import LPWriter
+
+HORIZON = 96
+
+
+class TestAggregation(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', input_files)
+        for file in os.listdir(input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        # Cheap technologies, so that the storage is used over such a short horizon
+        for file in ['cost_technology_investment', 'cost_technology_running_fixed']:
+            path = os.path.join(input_files, '{}.csv'.format(file))
+            (pd.read_csv(path, index_col=0) / 300).to_csv(path)
+        self.inputs = OptimisationInputs(os.path.join(input_files, 'inputs.yml'), input_files, self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_representative_periods(self):
+        inputs = self.inputs.aggregate(periods=3)
+        self.assertEqual(len(inputs.time), 3 * 24)
+        self.assertTrue(inputs.time.is_monotonic_increasing)
+        self.assertEqual(inputs.time_weight_array.sum(), HORIZON)
+        self.assertEqual(len(inputs.period_sequence), 4)
+        self.assertEqual(inputs.demand_array.shape, (3 * 24, len(self.inputs.members)))
+        for i, t in enumerate(inputs.time):
+            np.testing.assert_array_equal(inputs.demand_array[i], self.inputs.demand_array[self.inputs.time_position[t]])
+
+        # Every period represents itself: no aggregation error
+        inputs = self.inputs.aggregate(periods=4, extreme_periods=False)
+        self.assertEqual(list(inputs.period_sequence), [0, 1, 2, 3])
+        self.assertEqual(max(inputs.aggregation_error.values()), 0.)
+
+        with self.assertRaises(ValueError):
+            self.inputs.aggregate(periods=5)
+
+    @unittest.skipUnless(pyo.SolverFactory('appsi_highs').available(exception_flag=False), 'HiGHS is not available')
+    def test_storage_linked_between_periods(self):
+        inputs = self.inputs.aggregate(periods=4, extreme_periods=False)
+        full = Central(inputs=self.inputs, solver='appsi_highs').create_model()
+        model = Central(inputs=inputs, solver='appsi_highs').create_model()
+        # The first time step of the full model has no charge or discharge, otherwise both are the same problem
+        for m in [full, model]:
+            for u in m.member:
+                m.battery_inflow[inputs.time[0], u].fix(0)
+                m.battery_outflow[inputs.time[0], u].fix(0)
+            pyo.SolverFactory('appsi_highs').solve(m)
+
+        self.assertGreater(pyo.value(sum(model.optimal_capacity[:, 'b'])), 0)
+        self.assertAlmostEqual(
+            pyo.value(model.objective_eqn), pyo.value(full.objective_eqn), delta=1e-6 * pyo.value(full.objective_eqn)
+        )
+
+        # The state of charge rebuilt from the levels between periods stays within the capacity
+        for d in model.period:
+            for u in model.member:
+                steps = inputs.time[d * inputs.period_length:(d + 1) * inputs.period_length]
+                soc = pyo.value(model.battery_soc_inter[d, u]) + np.array(
+                    [pyo.value(model.battery_soc[t, u]) for t in steps]
+                )
+                self.assertGreaterEqual(soc.min(), -1e-6)
+                self.assertLessEqual(soc.max(), pyo.value(model.optimal_capacity[u, 'b']) + 1e-6)
+
+    def test_other_models_refuse_aggregated_inputs(self):
+        inputs = self.inputs.aggregate(periods=4, extreme_periods=False)
+        for model in [CentralDuals, CentralSparse, Rural]:
+            with self.assertRaises(NotImplementedError):
+                model(inputs=inputs).create_model()
+        with self.assertRaises(NotImplementedError):
+            LPWriter(CentralSparse(inputs=inputs))
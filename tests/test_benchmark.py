@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from sizing import OptimisationInputs
+from sizing.benchmark import BENCHMARK_FILE, compare, generate_community, run_benchmark
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_parameters = 'hauts_sarts/input/inputs.yml'
+        self.input_files = 'hauts_sarts/input'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_generate_community(self):
+        hourly = os.path.join(self.directory.name, 'hourly')
+        quarter = os.path.join(self.directory.name, 'quarter')
+        generate_community(self.input_parameters, self.input_files, hourly, 30, 'hourly', 'week')
+        generate_community(self.input_parameters, self.input_files, quarter, 30, '15min', 'week')
+
+        inputs = OptimisationInputs(os.path.join(hourly, 'inputs.yml'), hourly, self.directory.name)
+        self.assertEqual(len(inputs.members), 30)
+        self.assertEqual(len(inputs.time), 168)
+        self.assertEqual(inputs.cost_technology_investment_array.shape, (30, 2))
+        # Members drawn several times are scaled differently
+        demand = inputs.demand_array.sum(axis=0)
+        self.assertEqual(len(set(demand[demand > 0])), (demand > 0).sum())
+
+        # Same community at a finer resolution: same energy per hour, same prices
+        fine = OptimisationInputs(os.path.join(quarter, 'inputs.yml'), quarter, self.directory.name)
+        self.assertEqual(len(fine.time), 4 * 168)
+        self.assertEqual(fine.time[1] - fine.time[0], np.timedelta64(15, 'm'))
+        np.testing.assert_allclose(fine.demand_array.reshape(168, 4, 30).sum(axis=1), inputs.demand_array)
+        np.testing.assert_allclose(fine.generation_array[::4] * 4, inputs.generation_array)
+        np.testing.assert_array_equal(fine.prices_grid_import_array[::4], inputs.prices_grid_import_array)
+
+    def test_compare(self):
+        baseline = {'cases': {
+            'a': {'status': 'optimal', 'solve_seconds': 10., 'build_seconds': 0.01, 'peak_memory_mb': 100.},
+            'b': {'status': 'optimal', 'solve_seconds': 10.}
+        }}
+        results = {'cases': {
+            'a': {'status': 'optimal', 'solve_seconds': 12., 'build_seconds': 0.05, 'peak_memory_mb': 120.},
+            'b': {'status': 'timeout'},
+            'c': {'status': 'optimal', 'solve_seconds': 100.}
+        }}
+        comparison = compare(results, baseline).set_index(['case', 'metric'])
+        # Increase below its threshold, increase of a short duration (noise), increase above its threshold
+        self.assertFalse(comparison.loc[('a', 'solve_seconds'), 'is_regression'])
+        self.assertFalse(comparison.loc[('a', 'build_seconds'), 'is_regression'])
+        self.assertTrue(comparison.loc[('a', 'peak_memory_mb'), 'is_regression'])
+        self.assertTrue(comparison.loc[('b', 'status'), 'is_regression'])
+        self.assertNotIn('c', comparison.index.get_level_values('case'))
+
+        comparison = compare(results, baseline, thresholds={'solve_seconds': 0.1}).set_index(['case', 'metric'])
+        self.assertTrue(comparison.loc[('a', 'solve_seconds'), 'is_regression'])
+
+    @unittest.skipIf(highspy is None, 'highspy is not installed')
+    def test_run_benchmark(self):
+        output_path = os.path.join(self.directory.name, 'benchmark')
+        results = run_benchmark(self.input_parameters, self.input_files, output_path, models=['central'],
+                                members=[3], resolutions=['hourly'], horizons=['week'], solver='highs')
+        case = results['cases']['central-3-hourly-week']
+        self.assertEqual(case['status'], 'optimal', case.get('error'))
+        for metric in ['load_seconds', 'build_seconds', 'solve_seconds', 'post_process_seconds', 'peak_memory_mb',
+                       'objective']:
+            self.assertGreater(case[metric], 0)
+        self.assertEqual(case['variables'], 3 * (9 * 168 + 7))
+        with open(os.path.join(output_path, BENCHMARK_FILE)) as infile:
+            self.assertEqual(json.load(infile)['cases'], results['cases'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs, Benders, CentralSparse
+
+HORIZON = 48
+BLOCK_LENGTH = 12
+
+
+class TestBenders(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        # Cheap technologies, so that the capacities are not trivial over such a short horizon
+        for file in ['cost_technology_investment', 'cost_technology_running_fixed']:
+            path = os.path.join(self.input_files, '{}.csv'.format(file))
+            (pd.read_csv(path, index_col=0) / 300).to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+
+    def _central(self) -> tuple:
+        """
+        Central problem without the sign restriction of the total costs of the members, which is not decomposed.
+        """
+        central = CentralSparse(inputs=self._inputs('central'))
+        problem = central.create_model()
+        offset = problem.variables['total_costs'][0]
+        problem.col_lower[offset:offset + len(central.inputs.members)] = -np.inf
+        self.assertTrue(problem.solve())
+        return central, problem
+
+    def test_exact_decomposition(self):
+        central, problem = self._central()
+        members, technologies = central.inputs.members, central.inputs.technologies
+
+        # The subproblems at the solution of the central problem add up to its objective
+        benders = Benders(inputs=self._inputs('benders'), block_length=BLOCK_LENGTH)
+        blocks = benders.create_model()
+        offset = problem.variables['optimal_capacity'][0]
+        capacity = problem.solution[offset:offset + len(members) * len(technologies)].reshape(len(members), -1)
+        offset = problem.variables['battery_soc'][0]
+        soc = problem.solution[offset:offset + HORIZON * len(members)].reshape(HORIZON, -1)
+        soc = soc[[len(blocks[0]) * b - 1 for b in range(len(blocks))]]
+
+        evaluated = benders._evaluate(None, blocks, capacity, soc)
+        self.assertAlmostEqual(
+            benders._capacity_costs(capacity) + sum(cut[0] for cut in evaluated), problem.objective,
+            delta=1e-6 * problem.objective
+        )
+
+    def test_bounds(self):
+        _, problem = self._central()
+
+        benders = Benders(inputs=self._inputs('benders'), block_length=BLOCK_LENGTH, workers=2, tolerance=1e-3)
+        results, duals = benders.solve_model(benders.create_model())
+        history = benders.history
+
+        self.assertLessEqual(history['lower_bound'].iloc[-1], problem.objective * (1 + 1e-6))
+        self.assertGreaterEqual(history['upper_bound'].iloc[-1], problem.objective * (1 - 1e-6))
+        self.assertLessEqual(history['gap'].iloc[-1], 1e-3)
+        self.assertTrue((history['upper_bound'].diff().dropna() <= 1e-6).all())
+        self.assertTrue(os.path.exists(os.path.join(benders.inputs.output_path, 'benders_history.csv')))
+
+        # Results of the best capacities over the whole horizon
+        self.assertAlmostEqual(
+            results['total_costs'].sum() * benders.discount_factor, history['upper_bound'].iloc[-1],
+            delta=1e-6 * problem.objective
+        )
+        self.assertEqual(results['imports_retailer'].shape, (HORIZON, 23))
+        self.assertEqual(duals['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+
+
+    def test_not_converged(self):
+        benders = Benders(inputs=self._inputs('benders'), block_length=BLOCK_LENGTH, tolerance=0., max_iterations=1)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            benders.solve_model(benders.create_model())
+        self.assertTrue(any('not converged in 1 iterations' in str(warning.message) for warning in caught))
+
+        with self.assertRaises(ValueError):
+            Benders(inputs=benders.inputs, max_iterations=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.models import LPWriter, generic
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+HORIZON = 48
+
+
+def _truncate_inputs(path_inputs: str, path_output: str, horizon: int):
+    """
+    Copies the input files keeping only the first time steps of the time series.
+    """
+    for file in os.listdir(path_inputs):
+        if file.startswith(('demand', 'generation', 'prices')):
+            pd.read_csv(os.path.join(path_inputs, file), index_col=0).iloc[:horizon].to_csv(
+                os.path.join(path_output, file)
+            )
+        else:
+            shutil.copy(os.path.join(path_inputs, file), path_output)
+
+
+@unittest.skipUnless(pyo.SolverFactory('highs').available(exception_flag=False), 'HiGHS is not available')
+class TestCentralSparse(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        _truncate_inputs('hauts_sarts/input', self.directory.name, HORIZON)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(
+            input_parameters=os.path.join(self.directory.name, 'inputs.yml'),
+            input_files=self.directory.name,
+            output_path=output_path
+        )
+
+    def test_same_objective_as_pyomo(self):
+        central = Central(inputs=self._inputs('pyomo'), solver='highs')
+        model = central.create_model()
+        results_pyomo, _ = central.solve_model(model)
+
+        central_sparse = CentralSparse(inputs=self._inputs('sparse'))
+        problem = central_sparse.create_model()
+        results_sparse, duals_sparse = central_sparse.solve_model(problem)
+
+        self.assertEqual(problem.number_variables, model.nvariables())
+        self.assertEqual(problem.number_constraints, model.nconstraints())
+        self.assertAlmostEqual(problem.objective, pyo.value(model.objective_eqn), delta=1e-6 * abs(problem.objective))
+        np.testing.assert_allclose(
+            results_sparse['total_costs'].sum(), results_pyomo['total_costs'].sum(), rtol=1e-6
+        )
+
+        # Same shape as the results of the Pyomo models
+        for name, values in results_pyomo.items():
+            self.assertEqual(values.shape, results_sparse[name].shape)
+            self.assertTrue(values.index.equals(results_sparse[name].index))
+        self.assertEqual(duals_sparse['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+        self.assertEqual(duals_sparse['dual_local_exchanges_eqn'].shape, (HORIZON,))
+
+    def test_other_solver(self):
+        # The sparse problem is passed to the selected solver through Pyomo
+        central_sparse = CentralSparse(inputs=self._inputs('pyomo'), solver='highs')
+        problem = central_sparse.create_model()
+        with mock.patch.object(generic, 'SPARSE_SOLVERS', []), mock.patch.object(
+                problem, 'solve', side_effect=AssertionError('solved with SciPy')):
+            results, duals = central_sparse.solve_model(problem)
+
+        expected = CentralSparse(inputs=self._inputs('sparse')).create_model()
+        expected.solve()
+        self.assertAlmostEqual(problem.objective, expected.objective, delta=1e-6 * abs(expected.objective))
+        self.assertAlmostEqual(results['total_costs'].sum() * central_sparse.discount_factor, problem.objective,
+                               delta=1e-6 * abs(problem.objective))
+        self.assertEqual(duals['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+
+    @unittest.skipIf(highspy is None, 'highspy is not installed')
+    def test_lp_writer_same_problem(self):
+        central_sparse = CentralSparse(inputs=self._inputs('lp'))
+        problem = central_sparse.create_model()
+        problem.solve()
+
+        path = os.path.join(self.directory.name, 'lp', 'model.lp')
+        statistics = LPWriter(central_sparse, block_size=5, compress=True).write(path)
+        self.assertEqual(statistics['rows'], problem.number_constraints)
+        self.assertEqual(statistics['nonzeros'], problem.matrix.nnz)
+
+        solver = highspy.Highs()
+        solver.setOptionValue('output_flag', False)
+        solver.readModel(statistics['path'])
+        solver.run()
+        self.assertEqual(solver.getNumCol(), problem.number_variables)
+        self.assertAlmostEqual(
+            solver.getInfo().objective_function_value, problem.objective, delta=1e-6 * abs(problem.objective)
+        )
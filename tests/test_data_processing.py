@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from scripts.data_processing import (
+    METER_STEPS, IncrementalProfiles, fill_array, fill_nan, join_data, parse_meter, read_datfiles, read_join_datfiles,
+    resample_array, resample_data, sorted_files
+)
+from sizing.utils import read_data
+
+STEPS = 35040
+
+
+class TestDataProcessing(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path_csv = os.path.join(self.directory.name, 'raw')
+        os.makedirs(self.path_csv)
+
+        generator = np.random.default_rng(0)
+        self.meters = generator.uniform(0, 10, (STEPS, 5))
+        self.meters[:7, 0] = np.nan
+        self.meters[-3:, 1] = np.nan
+        self.meters[100:200, 2] = np.nan
+        self.meters[:, 3] = 0
+        for j in range(self.meters.shape[1]):
+            pd.DataFrame(self.meters[:, j]).to_csv(
+                os.path.join(self.path_csv, 'demand_HS_{}.csv'.format(j + 1)), header=False, index=False
+            )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_arrays(self):
+        profiles = pd.DataFrame(self.meters, index=pd.date_range('2020-12-31 23:00:00', periods=STEPS, freq='15T'))
+        expected = resample_data(fill_nan(profiles), new_freq='H')
+        np.testing.assert_allclose(resample_array(fill_array(self.meters), 4), expected.values)
+
+    def test_join_data(self):
+        join_data(self.path_csv, self.directory.name, workers=2, chunk_files=2)
+        data = pd.read_csv(os.path.join(self.directory.name, 'demand.csv'), index_col=0, parse_dates=True)
+
+        # The meter with no demand is dropped
+        self.assertEqual(list(data.columns), ['member_1', 'member_2', 'member_3', 'member_5'])
+        self.assertEqual(len(data), STEPS // 4)
+        self.assertEqual(data.index[0], pd.Timestamp('2020-12-31 23:00:00'))
+        expected = resample_array(fill_array(self.meters[:, [0, 1, 2, 4]]), 4)
+        np.testing.assert_allclose(data.values, expected)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['demand.csv', 'raw'])
+
+    def test_datfiles(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path_datfiles = os.path.join(self.directory.name, 'datfiles')
+        os.makedirs(path_datfiles)
+        for i in [0, 2, 10]:
+            shutil.copy(os.path.join(root, 'hauts_sarts', 'datfiles', 'datscenario{}.dat'.format(i)), path_datfiles)
+        expected = np.column_stack([
+            pd.read_csv(os.path.join(path_datfiles, 'datscenario{}.dat'.format(i)), header=None, sep=' ')[2].values
+            for i in [0, 2, 10]
+        ])
+        np.testing.assert_allclose(
+            read_datfiles([os.path.join(path_datfiles, 'datscenario{}.dat'.format(i)) for i in [0, 2, 10]]), expected
+        )
+
+        # Members and scenarios in the natural order of the files
+        members = ['member_1', 'member_3']
+        read_join_datfiles(path_datfiles, self.directory.name, workers=2, scenario_members=members)
+        production = read_data(os.path.join(self.directory.name, 'production.csv'))
+        demand = read_data(os.path.join(root, 'hauts_sarts', 'input', 'demand.csv'))
+        self.assertTrue(production.index.equals(demand.index))
+        np.testing.assert_allclose(production.values, expected)
+        for i in range(3):
+            scenario = read_data(os.path.join(self.directory.name, 'generation_scenario_{}.csv'.format(i + 1)))
+            self.assertTrue(scenario.index.equals(demand.index))
+            self.assertEqual(list(scenario.columns), members)
+            np.testing.assert_allclose(scenario.values, expected[:, [i, i]])
+
+    def test_incremental(self):
+        output_path = os.path.join(self.directory.name, 'incremental')
+        manifest_path = os.path.join(self.directory.name, 'manifest')
+        output_file = os.path.join(output_path, 'demand.csv')
+
+        def check():
+            join_data(self.path_csv, self.directory.name, workers=1)
+            with open(output_file) as incremental, open(os.path.join(self.directory.name, 'demand.csv')) as full:
+                self.assertEqual(incremental.read(), full.read())
+
+        join_data(self.path_csv, output_path, workers=1, manifest_path=manifest_path)
+        check()
+        store = IncrementalProfiles(manifest_path, 'demand', parse_meter, METER_STEPS, 4)
+        self.assertEqual(store.update(sorted_files(self.path_csv), output_file, workers=1), [])
+
+        # Readings missing at the end of a meter file, then appended
+        path = os.path.join(self.path_csv, 'demand_HS_2.csv')
+        with open(path, 'rb') as infile:
+            lines = infile.read().splitlines(keepends=True)
+        with open(path, 'wb') as outfile:
+            outfile.write(b''.join(lines[:30000]))
+        self.assertEqual(store.update(sorted_files(self.path_csv), output_file, workers=1), [1])
+        check()
+        with open(path, 'wb') as outfile:
+            outfile.write(b''.join(lines))
+        join_data(self.path_csv, output_path, workers=1, manifest_path=manifest_path)
+        check()
+
+        # New meter
+        with open(os.path.join(self.path_csv, 'demand_HS_6.csv'), 'wb') as outfile:
+            outfile.write(b''.join(lines))
+        join_data(self.path_csv, output_path, workers=1, manifest_path=manifest_path)
+        check()
+
+
+    def test_incremental_datfiles(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path_datfiles = os.path.join(self.directory.name, 'datfiles')
+        os.makedirs(path_datfiles)
+        for i in [0, 2]:
+            shutil.copy(os.path.join(root, 'hauts_sarts', 'datfiles', 'datscenario{}.dat'.format(i)), path_datfiles)
+        output_path = os.path.join(self.directory.name, 'incremental')
+        manifest_path = os.path.join(self.directory.name, 'manifest')
+        manifest_file = os.path.join(manifest_path, 'production.manifest.json')
+        read_join_datfiles(path_datfiles, output_path, workers=1, scenario_members=['member_1'],
+                           manifest_path=manifest_path)
+
+        # New labels of the scenario files: all of them are written again
+        members = ['member_1', 'member_3']
+        read_join_datfiles(path_datfiles, output_path, workers=1, scenario_members=members, manifest_path=manifest_path)
+        for i in range(2):
+            scenario = read_data(os.path.join(output_path, 'generation_scenario_{}.csv'.format(i + 1)))
+            self.assertEqual(list(scenario.columns), members)
+
+        # A truncated datfile fails the update and invalidates the manifest, so that the next update is a full one
+        path = os.path.join(path_datfiles, 'datscenario2.dat')
+        with open(path, 'rb') as infile:
+            lines = infile.read().splitlines(keepends=True)
+        with open(path, 'wb') as outfile:
+            outfile.write(b''.join(lines[:-24]))
+        with self.assertRaises(ValueError):
+            read_join_datfiles(path_datfiles, output_path, workers=1, scenario_members=members,
+                               manifest_path=manifest_path)
+        self.assertFalse(os.path.exists(manifest_file))
+
+        with open(path, 'wb') as outfile:
+            outfile.write(b''.join(lines))
+        read_join_datfiles(path_datfiles, output_path, workers=1, scenario_members=members, manifest_path=manifest_path)
+        self.assertTrue(os.path.exists(manifest_file))
+        read_join_datfiles(path_datfiles, self.directory.name, workers=1, scenario_members=members)
+        for file in ['production.csv', 'generation_scenario_1.csv', 'generation_scenario_2.csv']:
+            with open(os.path.join(output_path, file)) as incremental, \
+                    open(os.path.join(self.directory.name, file)) as full:
+                self.assertEqual(incremental.read(), full.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.models import generic
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+HORIZON = 48
+
+
+@unittest.skipIf(highspy is None, 'highspy is not installed')
+class TestDirectSolver(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+
+    def test_same_solution_as_sparse(self):
+        central = Central(inputs=self._inputs('direct'), solver='highs-direct')
+        results, duals = central.solve_model(central.create_model())
+
+        sparse = CentralSparse(inputs=self._inputs('sparse'))
+        expected_results, expected_duals = sparse.solve_model(sparse.create_model())
+
+        np.testing.assert_allclose(results['total_costs'].sum(), expected_results['total_costs'].sum(), rtol=1e-6)
+        for name in ['optimal_capacity', 'imports_retailer']:
+            pd.testing.assert_frame_equal(results[name], expected_results[name], atol=1e-6)
+        self.assertEqual(sorted(duals), sorted(expected_duals))
+        np.testing.assert_allclose(duals['dual_energy_balance_eqn'], expected_duals['dual_energy_balance_eqn'],
+                                   atol=1e-6)
+        self.assertTrue(os.path.isfile(os.path.join(self.directory.name, 'direct', 'optimal_capacity.csv')))
+
+    def test_fallback(self):
+        central = Central(inputs=self._inputs('fallback'), solver='highs-direct')
+        model = central.create_model()
+        with mock.patch.object(generic, 'highspy', None), mock.patch.object(generic, 'FALLBACK_SOLVER', 'highs'), \
+                warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            results, _ = central.solve_model(model)
+        self.assertIn('highspy', str(caught[0].message))
+        # Solved through Pyomo: the solution is loaded in the model
+        self.assertAlmostEqual(results['total_costs'].sum() * central.discount_factor, pyo.value(model.objective_eqn),
+                               delta=1e-6 * pyo.value(model.objective_eqn))
+
+
+if __name__ == '__main__':
+    unittest.main()
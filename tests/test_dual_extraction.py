@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.utils import unstack_data
+from tests.test_central_sparse import _truncate_inputs
+
+HORIZON = 48
+
+
+@unittest.skipUnless(pyo.SolverFactory('highs').available(exception_flag=False), 'HiGHS is not available')
+class TestDualExtraction(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        _truncate_inputs('hauts_sarts/input', self.directory.name, HORIZON)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, duals: list = None) -> OptimisationInputs:
+        inputs = OptimisationInputs(
+            os.path.join(self.directory.name, 'inputs.yml'), self.directory.name, self.directory.name
+        )
+        inputs.duals = duals
+        return inputs
+
+    def test_all_families(self):
+        central = Central(inputs=self._inputs(), solver='highs')
+        m = central.create_model()
+        central._check_termination(pyo.SolverFactory('highs').solve(m))
+        _, duals = central._extract_results(m)
+
+        # Same duals as the element-wise extraction
+        for constraint in m.component_objects(pyo.Constraint, active=True):
+            indices = [i for i in constraint]
+            index = pd.MultiIndex.from_tuples(indices) if type(indices[0]) == tuple else indices
+            dual_values = pd.Series(index=index, dtype=float)
+            for i in constraint:
+                dual_values[i] = m.dual[constraint[i]]
+            pd.testing.assert_frame_equal(
+                pd.DataFrame(duals['dual{}'.format(constraint.name)]), pd.DataFrame(unstack_data(dual_values))
+            )
+
+    def test_selected_families(self):
+        central = Central(inputs=self._inputs(['energy_balance_eqn', '_local_exchanges_eqn']), solver='highs')
+        m = central.create_model()
+        central._check_termination(pyo.SolverFactory('highs').solve(m))
+        _, duals = central._extract_results(m)
+        self.assertEqual(sorted(duals), ['dual_energy_balance_eqn', 'dual_local_exchanges_eqn'])
+        self.assertEqual(duals['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+
+        # No dual imported from the solver
+        central = Central(inputs=self._inputs([]), solver='highs')
+        m = central.create_model()
+        self.assertIsNone(m.component('dual'))
+        central._check_termination(pyo.SolverFactory('highs').solve(m))
+        self.assertEqual(central._extract_results(m)[1], dict())
+
+        sparse = CentralSparse(inputs=self._inputs(['local_exchanges_eqn']))
+        problem = sparse.create_model()
+        self.assertTrue(problem.solve())
+        self.assertEqual(list(sparse._extract_results(problem)[1]), ['dual_local_exchanges_eqn'])
+
+
+if __name__ == '__main__':
+    unittest.main()
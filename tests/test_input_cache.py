@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs
+from sizing.core.input_cache import InputCache
+from sizing.utils import read_data
+
+
+class TestInputCache(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        self.cache_path = os.path.join(self.directory.name, 'cache')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sidecars(self):
+        path = os.path.join(self.input_files, 'demand.csv')
+        cache = InputCache(self.cache_path)
+        pd.testing.assert_frame_equal(cache.read(path), read_data(path))
+        data = cache.read(path)
+        pd.testing.assert_frame_equal(data, read_data(path))
+        self.assertEqual((len(cache.hits), len(cache.misses)), (1, 1))
+        self.assertFalse(data.to_numpy().flags.writeable)
+
+        # Touched but unchanged: still valid (same hash)
+        os.utime(path, ns=(0, 0))
+        cache.read(path)
+        self.assertEqual((len(cache.hits), len(cache.misses)), (2, 1))
+
+        # Changed: rebuilt
+        changed = read_data(path) * 2
+        changed.to_csv(path)
+        pd.testing.assert_frame_equal(cache.read(path), read_data(path))
+        self.assertEqual((len(cache.hits), len(cache.misses)), (2, 2))
+
+    def test_inputs(self):
+        input_parameters = os.path.join(self.input_files, 'inputs.yml')
+        inputs = OptimisationInputs(input_parameters, self.input_files, self.directory.name)
+        OptimisationInputs(input_parameters, self.input_files, self.directory.name, input_cache=self.cache_path)
+        cached = OptimisationInputs(input_parameters, self.input_files, self.directory.name,
+                                    input_cache=self.cache_path)
+        self.assertEqual(len(cached.input_cache.misses), 0)
+
+        pd.testing.assert_index_equal(cached.time, inputs.time)
+        pd.testing.assert_index_equal(cached.members, inputs.members)
+        for name in ['demand', 'generation', 'prices_grid_import', 'cost_technology_investment']:
+            np.testing.assert_array_equal(getattr(cached, '{}_array'.format(name)),
+                                          getattr(inputs, '{}_array'.format(name)))
+        # The aligned arrays are the memory-mapped sidecars themselves
+        self.assertFalse(cached.demand_array.flags.writeable)
+
+
+if __name__ == '__main__':
+    unittest.main()
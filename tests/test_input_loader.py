@@ -0,0 +1,91 @@
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs
+from sizing.utils import ParsingException, read_data, read_files
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestInputLoader(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read_files(self):
+        paths = {os.path.basename(path): path for path in glob.glob(os.path.join(self.input_files, '*.csv'))}
+        data = read_files(paths, workers=4)
+        self.assertEqual(list(data), list(paths))
+        for name, path in paths.items():
+            pd.testing.assert_frame_equal(data[name], read_data(path))
+
+        # Both formats of the timestamps give the same time steps
+        demand = data['demand.csv']
+        self.assertIsInstance(demand.index, pd.DatetimeIndex)
+        self.assertTrue(data['prices_community_import.csv'].index.equals(demand.index))
+        self.assertEqual(list(data['cost_technology_investment.csv'].columns), ['p', 'b'])
+
+    def test_day_first(self):
+        path = os.path.join(self.directory.name, 'prices.csv')
+        with open(path, 'w') as outfile:
+            outfile.write(',member_1\n01/02/2021 00:00,1.0\n02/02/2021 00:00,2.0\n')
+        data = read_data(path)
+        self.assertEqual(list(data.index), [pd.Timestamp('2021-02-01'), pd.Timestamp('2021-02-02')])
+
+    def test_invalid_values(self):
+        path = os.path.join(self.directory.name, 'demand.csv')
+        with open(path, 'w') as outfile:
+            outfile.write(',member_1,member_2\n2021-01-01 00:00:00,1.0,\n2021-01-01 01:00:00,1.0,2.0\n'
+                          '2021-01-01 02:00:00,,\n')
+        with self.assertRaises(ParsingException) as context:
+            read_data(path)
+        self.assertEqual(list(context.exception.indexes),
+                         [pd.Timestamp('2021-01-01 00:00'), pd.Timestamp('2021-01-01 02:00')])
+
+    def test_inputs(self):
+        input_parameters = os.path.join(self.input_files, 'inputs.yml')
+        os.remove(os.path.join(self.input_files, 'prices_grid_export.csv'))
+        inputs = OptimisationInputs(input_parameters, self.input_files, self.directory.name)
+        self.assertGreater(inputs.load_seconds, 0)
+        self.assertEqual(inputs.prices_grid_export, 0)
+        np.testing.assert_array_equal(inputs.demand_array, read_data(os.path.join(self.input_files, 'demand.csv')))
+
+        os.remove(os.path.join(self.input_files, 'generation.csv'))
+        with self.assertRaises(FileNotFoundError):
+            OptimisationInputs(input_parameters, self.input_files, self.directory.name)
+
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_pyarrow(self):
+        # Same dataframes as the C parser, whatever the format of the labels of the index
+        path = os.path.join(self.directory.name, 'prices.csv')
+        with open(path, 'w') as outfile:
+            outfile.write(',member_1\n01/02/2021 00:00,1.0\n02/02/2021 00:00,2.0\n')
+        paths = glob.glob(os.path.join(self.input_files, '*.csv')) + [path]
+        for path in paths:
+            pd.testing.assert_frame_equal(read_data(path, engine='pyarrow'), read_data(path, engine='c'))
+
+        path = os.path.join(self.directory.name, 'demand.csv')
+        with open(path, 'w') as outfile:
+            outfile.write(',member_1\n2021-01-01 00:00:00,1.0\n2021-01-01 01:00:00,\n')
+        with self.assertRaises(ParsingException) as context:
+            read_data(path, engine='pyarrow')
+        self.assertEqual(list(context.exception.indexes), [pd.Timestamp('2021-01-01 01:00')])
+
+if __name__ == '__main__':
+    unittest.main()
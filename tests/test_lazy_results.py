@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.models.generic import RESULT_VARIABLES
+from sizing.models.results import LazyResults
+from sizing.utils import unstack_data
+from tests.test_central_sparse import _truncate_inputs
+
+HORIZON = 48
+OUTPUTS = ['optimal_capacity', 'total_costs']
+
+
+@unittest.skipUnless(pyo.SolverFactory('highs').available(exception_flag=False), 'HiGHS is not available')
+class TestLazyResults(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        os.makedirs(self.input_files)
+        _truncate_inputs('hauts_sarts/input', self.input_files, HORIZON)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str, outputs: list = None) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        inputs = OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+        inputs.outputs = outputs
+        return inputs
+
+    def test_pyomo_results(self):
+        central = Central(inputs=self._inputs('pyomo', OUTPUTS), solver='highs')
+        m = central.create_model()
+        results, _ = central.solve_model(m)
+
+        # Only the selected outputs are saved
+        self.assertIsInstance(results, LazyResults)
+        self.assertEqual(list(results), OUTPUTS)
+        files = [name[:-4] for name in os.listdir(central.inputs.output_path)]
+        self.assertEqual(sorted(name for name in files if name in RESULT_VARIABLES), OUTPUTS)
+
+        # Same values as the dictionaries of values of the variables
+        for name in RESULT_VARIABLES:
+            expected = unstack_data(pd.Series(getattr(m, name).get_values()))
+            pd.testing.assert_frame_equal(pd.DataFrame(results[name]), pd.DataFrame(expected))
+
+        results = LazyResults(m, OUTPUTS)
+        results.release()
+        self.assertEqual(results.array('total_costs').shape, (23,))
+        self.assertEqual(results['optimal_capacity'].shape, (23, 2))
+        with self.assertRaises(KeyError):
+            results['imports_retailer']
+
+    def test_sparse_results(self):
+        central = CentralSparse(inputs=self._inputs('sparse'))
+        problem = central.create_model()
+        results, _ = central.solve_model(problem)
+
+        self.assertEqual(list(results), RESULT_VARIABLES)
+        for name in RESULT_VARIABLES:
+            pd.testing.assert_frame_equal(pd.DataFrame(results[name]), pd.DataFrame(problem.get_values(name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
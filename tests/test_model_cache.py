@@ -0,0 +1,102 @@
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.__main__ import solve_cached
+from sizing.core import ModelCache
+from sizing.models import SparseProblem
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+HORIZON = 24
+
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        self.input_parameters = os.path.join(self.input_files, 'inputs.yml')
+        self.cache = ModelCache(os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_depends_on_inputs_and_model(self):
+        key = ModelCache.key(self.input_parameters, self.input_files, Central)
+        self.assertEqual(key, ModelCache.key(self.input_parameters, self.input_files, Central))
+        self.assertNotEqual(key, ModelCache.key(self.input_parameters, self.input_files, CentralSparse))
+
+        demand = pd.read_csv(os.path.join(self.input_files, 'demand.csv'), index_col=0)
+        (demand * 2).to_csv(os.path.join(self.input_files, 'demand.csv'))
+        self.assertNotEqual(key, ModelCache.key(self.input_parameters, self.input_files, Central))
+
+    def test_store_load_and_evict(self):
+        inputs = OptimisationInputs(self.input_parameters, self.input_files, self.directory.name)
+        problem = CentralSparse(inputs=inputs).create_model()
+        self.cache.store('a', problem)
+        loaded = self.cache.load('a')
+        self.assertEqual((loaded.matrix != problem.matrix).nnz, 0)
+        self.assertTrue(loaded.variables['battery_soc'][1].equals(inputs.time))
+        self.assertIsNone(self.cache.load('b'))
+
+        # The least recently used entry is evicted when the cache is full
+        size = os.path.getsize(self.cache._path('a')) / 1024**2
+        self.cache.max_size = 2.5 * size
+        self.cache.store('b', problem)
+        os.utime(self.cache._path('a'), (0, 0))
+        self.cache.store('c', problem)
+        self.assertIsNone(self.cache.load('a'))
+        self.assertIsNotNone(self.cache.load('b'))
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.load('c'))
+
+    def test_pyomo_model_in_matrix_form(self):
+        inputs = OptimisationInputs(self.input_parameters, self.input_files, self.directory.name)
+        model = Central(inputs=inputs).create_model()
+        problem = SparseProblem.from_pyomo(model)
+        sparse = CentralSparse(inputs=inputs).create_model()
+
+        self.assertEqual(problem.matrix.shape, sparse.matrix.shape)
+        self.assertEqual(problem.matrix.nnz, sparse.matrix.nnz)
+        self.assertTrue(problem.solve() and sparse.solve())
+        self.assertAlmostEqual(problem.objective, sparse.objective, delta=1e-6 * abs(sparse.objective))
+        np.testing.assert_allclose(
+            problem.get_duals('_energy_balance_eqn').values, sparse.get_duals('_energy_balance_eqn').values,
+            atol=1e-6
+        )
+
+    @unittest.skipIf(highspy is None, 'highspy is not installed')
+    def test_solve_cached_with_selected_solver(self):
+        inputs = OptimisationInputs(self.input_parameters, self.input_files, self.directory.name)
+        self.cache.store('a', CentralSparse(inputs=inputs).create_model())
+        expected = self.cache.load('a')
+        self.assertTrue(expected.solve())
+
+        for solver in ['highs-direct', 'portfolio']:
+            problem = self.cache.load('a')
+            args = argparse.Namespace(solver=solver, model='central_sparse', output=self.directory.name,
+                                      portfolio_history=None, portfolio_racers=None)
+            winner = solve_cached(problem, args)
+            self.assertEqual(winner is None, solver != 'portfolio')
+            self.assertAlmostEqual(problem.objective, expected.objective, delta=1e-6 * abs(expected.objective))
+
+
+if __name__ == '__main__':
+    unittest.main()
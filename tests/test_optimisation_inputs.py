@@ -0,0 +1,47 @@
+import os
+import unittest
+
+import numpy as np
+
+from sizing import OptimisationInputs
+
+
+class TestOptimisationInputs(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.inputs = OptimisationInputs(
+            input_parameters='hauts_sarts/input/inputs.yml',
+            input_files='hauts_sarts/input',
+            output_path='hauts_sarts/output'
+        )
+
+    def test_arrays_aligned_with_dataframes(self):
+        for file in ['demand', 'generation', 'prices_grid_import', 'prices_community_export']:
+            array = getattr(self.inputs, '{}_array'.format(file))
+            self.assertEqual(array.shape, (len(self.inputs.time), len(self.inputs.members)))
+            self.assertEqual(array.dtype, np.float64)
+            self.assertTrue(array.flags['C_CONTIGUOUS'])
+            np.testing.assert_array_equal(
+                array, getattr(self.inputs, file).loc[self.inputs.time, self.inputs.members].values
+            )
+
+        # Generation has more members than demand: the extra columns are dropped
+        self.assertEqual(self.inputs.generation.shape[1], 25)
+        self.assertEqual(self.inputs.generation_array.shape[1], 23)
+
+    def test_positions(self):
+        t, u, n = self.inputs.time[100], 'member_11', 'b'
+        i, j, k = self.inputs.time_position[t], self.inputs.member_position[u], self.inputs.technology_position[n]
+        self.assertEqual(self.inputs.demand_array[i, j], self.inputs.demand.loc[t, u])
+        self.assertEqual(
+            self.inputs.cost_technology_investment_array[j, k], self.inputs.cost_technology_investment.loc[u, n]
+        )
+
+    def test_default_files(self):
+        # Variable running costs are not given for Hauts-Sarts and default to zero
+        self.assertEqual(
+            self.inputs.cost_technology_running_variable_array.shape,
+            (len(self.inputs.members), len(self.inputs.technologies))
+        )
+        self.assertFalse(self.inputs.cost_technology_running_variable_array.any())
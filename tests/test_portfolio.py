@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import warnings
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.models import generic, portfolio
+from sizing.models.portfolio import PRUNE_AFTER, PortfolioHistory
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+HORIZON = 48
+
+
+@unittest.skipIf(highspy is None, 'highspy is not installed')
+class TestPortfolio(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        self.history = os.path.join(self.directory.name, 'history.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+
+    def test_race(self):
+        # A configuration through Pyomo, racing with the in-process configurations
+        configurations = {'highs-pyomo': ('highs', {}), **portfolio.PORTFOLIO}
+        with mock.patch.dict(portfolio.PORTFOLIO, configurations, clear=True):
+            central = Central(inputs=self._inputs('portfolio'), solver='portfolio', portfolio_history=self.history,
+                              portfolio_racers=3)
+            results, duals = central.solve_model(central.create_model())
+
+        sparse = CentralSparse(inputs=self._inputs('sparse'))
+        expected_results, _ = sparse.solve_model(sparse.create_model())
+        np.testing.assert_allclose(results['total_costs'].sum(), expected_results['total_costs'].sum(), rtol=1e-6)
+        pd.testing.assert_frame_equal(results['optimal_capacity'], expected_results['optimal_capacity'], atol=1e-4)
+        self.assertIn('dual_energy_balance_eqn', duals)
+
+        # The winner is recorded by class of instances
+        with open(self.history) as infile:
+            history = json.load(infile)
+        self.assertEqual(list(history), ['Central-14'])
+        statistics = history['Central-14']
+        self.assertEqual(sorted(statistics), ['highs-ipm', 'highs-pyomo', 'highs-simplex'])
+        self.assertEqual(sum(entry['wins'] for entry in statistics.values()), 1)
+        self.assertEqual(statistics[central.portfolio_winner]['wins'], 1)
+
+    def test_terminate(self):
+        # The solution of the fast configuration is kept without waiting for the slow one, which is terminated
+        slow = ('highs-direct', {'solver': 'simplex'})
+        run_configuration = portfolio._run_configuration
+
+        def _run_configuration(problem, model, configuration, *args):
+            if configuration is slow:
+                time.sleep(60)
+            run_configuration(problem, model, configuration, *args)
+
+        central = CentralSparse(inputs=self._inputs('terminate'), solver='portfolio', portfolio_history=self.history)
+        model = central.create_model()
+        with mock.patch.dict(portfolio.PORTFOLIO, {'slow': slow, 'fast': ('highs-direct', {'solver': 'ipm'})},
+                             clear=True), mock.patch.object(portfolio, '_run_configuration', _run_configuration):
+            tic = time.perf_counter()
+            central.solve_model(model)
+        self.assertEqual(central.portfolio_winner, 'fast')
+        self.assertLess(time.perf_counter() - tic, 30.)
+
+    def test_history(self):
+        history = PortfolioHistory(self.history)
+        names = ['a', 'b', 'c']
+        self.assertEqual(history.rank('Central-14', names), names)
+        for _ in range(PRUNE_AFTER):
+            history.record('Central-14', ['a', 'b'], 'b', 1.)
+        # Saved and reloaded: the winner ranks first, the configuration which always lost is pruned
+        history = PortfolioHistory(self.history)
+        self.assertEqual(history.rank('Central-14', names), ['b', 'c'])
+        self.assertEqual(history.classes['Central-14']['b']['win_seconds'], PRUNE_AFTER)
+        # Other instances are not affected
+        self.assertEqual(history.rank('Central-20', names), names)
+
+    def test_fallback(self):
+        central = Central(inputs=self._inputs('fallback'), solver='portfolio')
+        model = central.create_model()
+        with mock.patch.object(generic, 'available_configurations', return_value=[]), \
+                mock.patch.object(generic, 'FALLBACK_SOLVER', 'highs'), \
+                warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            central.solve_model(model)
+        self.assertIn('No solver of the portfolio', str(caught[0].message))
+        self.assertIsNone(central.portfolio_winner)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs, CentralSparse, ProgressiveHedging
+
+HORIZON = 48
+PROBABILITIES = [0.2, 0.5, 0.3]
+SCALING = [(0.8, 1.2), (1., 1.), (1.2, 0.7)]
+
+
+class TestProgressiveHedging(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        # Cheap technologies, so that the capacities are not trivial over such a short horizon
+        for file in ['cost_technology_investment', 'cost_technology_running_fixed']:
+            path = os.path.join(self.input_files, '{}.csv'.format(file))
+            (pd.read_csv(path, index_col=0) / 300).to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str, scaling: list = None) -> OptimisationInputs:
+        """
+        Stochastic inputs with the demand and the generation scaled in every scenario.
+        """
+        input_parameters = os.path.join(self.input_files, 'inputs.yml')
+        if scaling is not None:
+            for file, position in [('demand', 0), ('generation', 1)]:
+                data = pd.read_csv(os.path.join(self.input_files, '{}.csv'.format(file)), index_col=0)
+                for scenario, factors in enumerate(scaling):
+                    path = os.path.join(self.input_files, '{}_scenario_{}.csv'.format(file, scenario + 1))
+                    (data * factors[position]).to_csv(path)
+            input_parameters = os.path.join(self.input_files, 'inputs_{}.yml'.format(name))
+            shutil.copy(os.path.join(self.input_files, 'inputs.yml'), input_parameters)
+            with open(input_parameters, 'a') as file:
+                file.write('\nstochastic: {}\n'.format(PROBABILITIES))
+
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(input_parameters, self.input_files, output_path)
+
+    def test_identical_scenarios(self):
+        central = CentralSparse(inputs=self._inputs('central'))
+        problem = central.create_model()
+        self.assertTrue(problem.solve())
+
+        # Identical scenarios agree from the first iteration, on the deterministic solution
+        progressive_hedging = ProgressiveHedging(inputs=self._inputs('identical', [(1., 1.)] * len(PROBABILITIES)))
+        results, duals = progressive_hedging.solve_model(progressive_hedging.create_model())
+
+        self.assertEqual(len(progressive_hedging.history), 1)
+        self.assertAlmostEqual(
+            results['total_costs'].sum() * progressive_hedging.discount_factor, problem.objective,
+            delta=1e-6 * problem.objective
+        )
+        self.assertEqual(results['imports_retailer'].shape, (HORIZON, 23))
+        self.assertEqual(duals['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+
+    def test_stochastic(self):
+        progressive_hedging = ProgressiveHedging(inputs=self._inputs('stochastic', SCALING), workers=2)
+        results, _ = progressive_hedging.solve_model(progressive_hedging.create_model())
+        history = progressive_hedging.history
+        output_path = progressive_hedging.inputs.output_path
+
+        self.assertLessEqual(history['deviation'].iloc[-1], 1e-3)
+        self.assertTrue(os.path.exists(os.path.join(output_path, 'progressive_hedging_history.csv')))
+
+        # Same capacities in every scenario, whose expected cost is above the wait-and-see cost
+        capacities = [
+            pd.read_csv(os.path.join(output_path, 'scenario_{}'.format(s), 'optimal_capacity.csv'), index_col=0)
+            for s in range(1, len(PROBABILITIES) + 1)
+        ]
+        for capacity in capacities[1:]:
+            np.testing.assert_allclose(capacity.values, capacities[0].values)
+        np.testing.assert_allclose(results['optimal_capacity'].values, capacities[0].values)
+        expected_cost = results['total_costs'].sum() * progressive_hedging.discount_factor
+        self.assertGreaterEqual(expected_cost, history['expected_cost'].iloc[0] * (1 - 1e-6))
+
+
+    def test_not_converged(self):
+        progressive_hedging = ProgressiveHedging(inputs=self._inputs('not_converged', SCALING), tolerance=0.,
+                                                 max_iterations=1)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            progressive_hedging.solve_model(progressive_hedging.create_model())
+        self.assertTrue(any('not converged in 1 iterations' in str(warning.message) for warning in caught))
+
+        with self.assertRaises(ValueError):
+            ProgressiveHedging(inputs=progressive_hedging.inputs, max_iterations=0)
+
+if __name__ == '__main__':
+    unittest.main()
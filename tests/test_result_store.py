@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs, CentralSparse
+from sizing.core import RESULT_STORE_FILE, ResultStore
+from sizing.core.result_store import CHUNK_COLUMNS
+from tests.test_central_sparse import _truncate_inputs
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+HORIZON = 48
+
+
+@unittest.skipIf(h5py is None, 'h5py is not available')
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        os.makedirs(self.input_files)
+        _truncate_inputs('hauts_sarts/input', self.input_files, HORIZON)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _solve(self, name: str, results_format: str, dtype: str = 'float64') -> tuple:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        inputs = OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+        inputs.results_format, inputs.results_dtype = results_format, dtype
+        central = CentralSparse(inputs=inputs)
+        return central.solve_model(central.create_model())
+
+    def test_store(self):
+        results, duals = self._solve('hdf5', 'hdf5')
+        output_path = os.path.join(self.directory.name, 'hdf5')
+        self.assertEqual(os.listdir(output_path), [RESULT_STORE_FILE])
+
+        with ResultStore(os.path.join(output_path, RESULT_STORE_FILE)) as store:
+            self.assertEqual(sorted(store.names()), sorted(list(results) + list(duals)))
+            for name in results:
+                values = store.read(name)
+                if isinstance(values, pd.DataFrame):
+                    pd.testing.assert_frame_equal(values, results[name], check_names=False, check_freq=False)
+                else:
+                    pd.testing.assert_series_equal(values, results[name], check_names=False, check_freq=False)
+
+            # Range of time steps and subset of members, in the order requested
+            imports = results['imports_retailer']
+            time, members = imports.index, list(imports.columns[[5, 2, 7]])
+            part = store.read('imports_retailer', start=time[10], end=time[20], members=members)
+            pd.testing.assert_frame_equal(part, imports.loc[time[10]:time[20], members], check_names=False,
+                                          check_freq=False)
+            # Repeated members
+            members = list(imports.columns[[3, 1, 3]])
+            part = store.read('imports_retailer', members=members)
+            pd.testing.assert_frame_equal(part, imports[members], check_names=False, check_freq=False)
+
+        with ResultStore(os.path.join(output_path, RESULT_STORE_FILE), mode='a') as store:
+            store.set_metadata(solver='highs', solve_seconds=1.5)
+        with ResultStore(os.path.join(output_path, RESULT_STORE_FILE)) as store:
+            self.assertEqual(store.metadata['solver'], 'highs')
+            self.assertEqual(store.metadata['solve_seconds'], 1.5)
+
+    def test_float32(self):
+        results, _ = self._solve('float32', 'hdf5', 'float32')
+        with ResultStore(os.path.join(self.directory.name, 'float32', RESULT_STORE_FILE)) as store:
+            values = store.read('electricity_produced')
+        self.assertEqual(values.dtypes.unique().tolist(), [np.float32])
+        np.testing.assert_allclose(values.values, results['electricity_produced'].values, rtol=1e-6, atol=1e-3)
+
+        # The csv files remain available
+        self._solve('csv', 'csv')
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'csv', 'electricity_produced.csv')))
+
+
+    def test_column_chunks(self):
+        values = pd.DataFrame(np.arange(10 * 3 * CHUNK_COLUMNS, dtype=float).reshape(10, -1))
+        with ResultStore(os.path.join(self.directory.name, RESULT_STORE_FILE), mode='w') as store:
+            store.write('values', values)
+            self.assertEqual(store._file['values/values'].chunks, (10, CHUNK_COLUMNS))
+            pd.testing.assert_frame_equal(store.read('values', members=[70, 5]), values[[70, 5]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central, RollingHorizon
+
+HORIZON = 96
+
+
+@unittest.skipUnless(pyo.SolverFactory('appsi_highs').available(exception_flag=False), 'HiGHS is not available')
+class TestRollingHorizon(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        # Known capacities, with batteries
+        path = os.path.join(self.input_files, 'initial_capacity.csv')
+        capacity = pd.read_csv(path, index_col=0)
+        capacity['p'] += 20
+        capacity['b'] = 10
+        capacity.to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self, name: str) -> OptimisationInputs:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        return OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+
+    def test_close_to_monolithic_problem(self):
+        central = Central(inputs=self._inputs('central'), solver='appsi_highs')
+        model = central.create_model()
+        for capacity in model.optimal_capacity.values():
+            capacity.fix(capacity.lb)
+        results_central, _ = central.solve_model(model)
+
+        for workers in [1, 2]:
+            rolling_horizon = RollingHorizon(
+                inputs=self._inputs('rolling_{}'.format(workers)), solver='appsi_highs', window=24, look_ahead=12,
+                workers=workers
+            )
+            windows = rolling_horizon.create_model()
+            self.assertEqual(len(windows), 4)
+            results, duals = rolling_horizon.solve_model(windows)
+
+            # Same results as the monolithic problem
+            for name, values in results_central.items():
+                self.assertEqual(values.shape, results[name].shape)
+                self.assertTrue(values.index.equals(results[name].index))
+            self.assertEqual(duals['dual_energy_balance_eqn'].shape, (HORIZON, 23))
+            self.assertTrue(os.path.exists(os.path.join(rolling_horizon.inputs.output_path, 'imports_retailer.csv')))
+
+            total_costs = results['total_costs'].sum()
+            self.assertAlmostEqual(
+                total_costs, results_central['total_costs'].sum(), delta=0.01 * results_central['total_costs'].sum()
+            )
+            if workers == 1:
+                # The look-ahead can only be worse than the perfect foresight of the whole horizon
+                self.assertGreaterEqual(total_costs, results_central['total_costs'].sum() - 1e-6)
@@ -0,0 +1,64 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sizing import OptimisationInputs
+from sizing.utils import is_memory_mapped
+
+
+class TestSlicedInputs(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        input_parameters = os.path.join(self.input_files, 'inputs.yml')
+        self.inputs = OptimisationInputs(input_parameters, self.input_files, self.directory.name)
+        self.cached = OptimisationInputs(input_parameters, self.input_files, self.directory.name,
+                                         input_cache=os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_slice(self):
+        members = list(self.inputs.members[[4, 1]])
+        sliced = self.cached.slice(members=members)
+        expected = self.inputs.slice(members=members)
+        for name in ['demand', 'generation', 'prices_grid_import', 'cost_technology_investment']:
+            np.testing.assert_array_equal(getattr(sliced, '{}_array'.format(name)),
+                                          getattr(expected, '{}_array'.format(name)))
+
+        # Only the members kept are loaded in memory
+        self.assertTrue(is_memory_mapped(self.cached.demand_array))
+        self.assertFalse(is_memory_mapped(sliced.demand_array))
+        self.assertEqual(sliced.demand_array.nbytes * len(self.inputs.members),
+                         self.inputs.demand_array.nbytes * len(members))
+
+        # The dataframes are sliced with the arrays and no longer refer to the memory-mapped files
+        self.assertEqual(list(sliced.demand.columns), members)
+        self.assertEqual(list(sliced.cost_technology_investment.index), members)
+        self.assertNotIn('source', sliced.demand.attrs)
+        time = list(self.inputs.time[:10])
+        sliced = sliced.slice(time=time)
+        self.assertEqual(list(sliced.demand.index), time)
+        np.testing.assert_array_equal(sliced.demand.to_numpy(), sliced.demand_array)
+        pickle.loads(pickle.dumps(sliced))
+
+    def test_pickle(self):
+        # The memory-mapped data are sent as references to their input files
+        self.assertLess(len(pickle.dumps(self.cached)), len(pickle.dumps(self.inputs)) / 10)
+
+        inputs = pickle.loads(pickle.dumps(self.cached))
+        self.assertTrue(is_memory_mapped(inputs.demand_array))
+        np.testing.assert_array_equal(inputs.demand_array, self.inputs.demand_array)
+        np.testing.assert_array_equal(inputs.generation_array, self.inputs.generation_array)
+        self.assertEqual(inputs.demand.attrs['source'], self.cached.demand.attrs['source'])
+
+
+if __name__ == '__main__':
+    unittest.main()
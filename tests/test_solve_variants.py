@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+
+from sizing import OptimisationInputs, Central
+
+HORIZON = 48
+
+
+@unittest.skipUnless(pyo.SolverFactory('appsi_highs').available(exception_flag=False), 'HiGHS is not available')
+class TestSolveVariants(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _inputs(self) -> OptimisationInputs:
+        return OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, self.directory.name)
+
+    def test_same_results_as_rebuilding(self):
+        inputs = self._inputs()
+        overrides = [
+            {},
+            {'prices_grid_import': inputs.prices_grid_import_array * 2},
+            {'interest_rate': 0.1, 'cost_technology_investment': 0., 'cost_technology_running_fixed': 0.},
+            {'discount_rate': 0.2}
+        ]
+        central = Central(inputs=inputs, solver='highs')
+        variants = central.solve_variants(central.create_model(mutable=True), overrides)
+        self.assertEqual(len(variants), len(overrides))
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'variant_3', 'total_costs.csv')))
+
+        for override, (results, _) in zip(overrides, variants):
+            inputs = self._inputs()
+            for name, value in override.items():
+                if name.endswith('rate'):
+                    setattr(inputs, name, value)
+                else:
+                    array = getattr(inputs, '{}_array'.format(name))
+                    setattr(inputs, '{}_array'.format(name), np.broadcast_to(value, array.shape).copy())
+            central = Central(inputs=inputs, solver='appsi_highs')
+            model = central.create_model()
+            pyo.SolverFactory('appsi_highs').solve(model)
+
+            self.assertAlmostEqual(
+                results['total_costs'].sum() * central.discount_factor, pyo.value(model.objective_eqn),
+                delta=1e-6 * abs(pyo.value(model.objective_eqn))
+            )
+            np.testing.assert_allclose(
+                results['optimal_capacity'].values,
+                pd.Series(model.optimal_capacity.get_values()).unstack().values, atol=1e-6
+            )
+
+    def test_unknown_parameter(self):
+        central = Central(inputs=self._inputs(), solver='highs')
+        with self.assertRaises(KeyError):
+            central.solve_variants(central.create_model(mutable=True), [{'demand': 0.}])
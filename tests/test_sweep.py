@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sizing import OptimisationInputs
+from sizing.sweep import apply_overrides, run_sweep
+
+HORIZON = 24
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+        self.input_parameters = os.path.join(self.input_files, 'inputs.yml')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_apply_overrides(self):
+        inputs = OptimisationInputs(self.input_parameters, self.input_files, self.directory.name)
+        variant = apply_overrides(
+            inputs, {'members': ['member_3', 'member_1'], 'prices_grid_import': 2, 'lifetime': 10}
+        )
+        self.assertEqual(list(variant.members), ['member_3', 'member_1'])
+        self.assertEqual(variant.member_position['member_1'], 1)
+        np.testing.assert_array_equal(
+            variant.prices_grid_import_array, 2 * inputs.prices_grid_import_array[:, [1, 0]]
+        )
+        self.assertEqual(variant.initial_capacity_array.shape, (2, 2))
+        self.assertEqual((variant.lifetime, inputs.lifetime == 10), (10, False))
+
+    def test_failures_do_not_stop_the_sweep(self):
+        output_path = os.path.join(self.directory.name, 'sweep')
+        summary = run_sweep(
+            self.input_parameters, self.input_files, output_path,
+            variants=[{'interest_rate': 0.1}, {'members': ['nobody']}, {'members': ['member_1']}],
+            model='central_sparse', solver='highs', workers=2
+        )
+        self.assertEqual(list(summary['status']), ['optimal', 'failed', 'optimal'])
+        self.assertTrue(os.path.exists(os.path.join(output_path, 'summary.csv')))
+        self.assertTrue(os.path.exists(os.path.join(output_path, 'variant_2', 'total_costs.csv')))
+        self.assertLess(summary.loc['variant_2', 'objective'], summary.loc['variant_0', 'objective'])
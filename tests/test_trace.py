@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+import pandas as pd
+
+from sizing import OptimisationInputs, Central, CentralSparse
+from sizing.core import TRACE_FILE, Trace, trace
+from sizing.core.trace import MEMORY_PROFILE_FILE
+from sizing.models.generic import model_size
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+HORIZON = 48
+
+
+@unittest.skipIf(highspy is None, 'highspy is not installed')
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        # Set the working directory to the root.
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_files = os.path.join(self.directory.name, 'input')
+        shutil.copytree('hauts_sarts/input', self.input_files)
+        for file in os.listdir(self.input_files):
+            if file.startswith(('demand', 'generation', 'prices')):
+                path = os.path.join(self.input_files, file)
+                pd.read_csv(path, index_col=0).iloc[:HORIZON].to_csv(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _run(self, model_class, name: str, memory: bool = False) -> dict:
+        output_path = os.path.join(self.directory.name, name)
+        os.makedirs(output_path)
+        with Trace(memory=memory, model=name) as run_trace:
+            with trace.stage('read_inputs'):
+                inputs = OptimisationInputs(os.path.join(self.input_files, 'inputs.yml'), self.input_files, output_path)
+            problem = model_class(inputs=inputs, solver='highs')
+            with trace.stage('create_model'):
+                model = problem.create_model()
+            trace.set_model_size(**model_size(model, nonzeros=trace.is_accounting_memory()))
+            with trace.stage('solve'):
+                problem.solve_model(model)
+        run_trace.write(os.path.join(output_path, TRACE_FILE))
+        self.assertFalse(trace.is_active())
+
+        with open(os.path.join(output_path, TRACE_FILE)) as infile:
+            return json.load(infile)
+
+    def test_sparse(self):
+        data = self._run(CentralSparse, 'central_sparse')
+        stages = {stage['name']: stage for stage in data['stages']}
+        for name in ['read_inputs/load_files/demand', 'read_inputs/align_arrays', 'create_model/variables',
+                     'create_model/_energy_balance_eqn', 'create_model/assemble', 'solve/solver_run',
+                     'solve/extract_results', 'solve/save_results']:
+            self.assertIn(name, stages)
+        for name in ['create_model', 'solve']:
+            self.assertGreater(stages[name]['wall_seconds'], 0)
+            self.assertGreater(stages[name]['peak_memory_mb'], 0)
+        # A stage ends before its enclosing stage
+        self.assertLess(list(stages).index('solve/solver_run'), list(stages).index('solve'))
+
+        self.assertEqual(data['metadata'], {'model': 'central_sparse'})
+        self.assertEqual(data['model_size']['variables'], 10097)
+        self.assertEqual(data['model_size']['constraints'], 7891)
+        self.assertGreater(data['model_size']['nonzeros'], data['model_size']['constraints'])
+
+    def test_pyomo(self):
+        data = self._run(Central, 'central')
+        names = [stage['name'] for stage in data['stages']]
+        self.assertIn('create_model/objective_eqn', names)
+        self.assertIn('create_model/_energy_balance_eqn', names)
+        self.assertIn('solve/solver_run', names)
+        self.assertEqual(data['model_size']['constraints'], 7891)
+        # The nonzeros of a Pyomo model are only counted with the memory profile
+        self.assertNotIn('nonzeros', data['model_size'])
+        self.assertNotIn('allocated_mb', data['stages'][0])
+
+    def test_memory_profile(self):
+        self._run(Central, 'central', memory=True)
+        self.assertFalse(tracemalloc.is_tracing())
+        profile = pd.read_csv(os.path.join(self.directory.name, 'central', MEMORY_PROFILE_FILE), index_col=0)
+
+        # Every variable and constraint family, the duals and the results, ranked by the memory they hold
+        for name in ['create_model/electricity_produced', 'create_model/_energy_balance_eqn', 'solve/dual',
+                     'solve/extract_results/electricity_produced', 'solve/extract_results/dual_energy_balance_eqn']:
+            self.assertGreater(profile.loc[name, 'allocated_mb'], 0)
+        self.assertNotIn('create_model', profile.index)
+        self.assertTrue(profile['allocated_mb'].is_monotonic_decreasing)
+        # A family of constraints over the time steps and the members holds more than one over the members
+        self.assertGreater(profile.loc['create_model/_energy_balance_eqn', 'allocated_mb'],
+                           profile.loc['create_model/_total_costs_eqn', 'allocated_mb'])
+
+
+if __name__ == '__main__':
+    unittest.main()